@@ -97,57 +97,158 @@
 import streamlit as st
 import os
 import sys
-from logger import logging
-from exception import CustomException
 from dotenv import load_dotenv
+# Load environment variables first: the logger and the components read their settings at import time
+load_dotenv()
+from logger import logging, setup_logging
+from exception import CustomException, InvalidYouTubeURLError
 from components.transcript_retriever import TranscriptRetriever
+from components.cache import TranscriptCache
 from components.preprocessor import Preprocessor
-from components.qa_engine import QAEngine
-
-# Load environment variables
-load_dotenv()
+from components.session import VideoSession
+from components.main import MAX_CONCURRENCY, PIPELINE, build_engine, build_pipeline, build_planner
+from components.metrics import registry, bind
+
+# Streamlit reruns this script on every interaction; only the first call sets up the log writer
+setup_logging()
+
+# Planner, engine and pipeline settings (QA_*) are read in components.main, shared with the CLI and batch mode
+
+# Streamlit-side caches, shared by all sessions of this server process
+APP_CACHE_TTL_SECONDS = int(os.getenv("APP_CACHE_TTL_SECONDS", "3600"))
+APP_CACHE_MAX_ENTRIES = int(os.getenv("APP_CACHE_MAX_ENTRIES", "64"))
+# Serve Prometheus metrics (/metrics, /metrics.json) on this port when set
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+@st.cache_resource
+def start_metrics_exporter(port):
+    return registry.serve(port)
+
+@st.cache_resource
+def cache_counters():
+    # Incremented only inside cached functions, i.e. on a miss; lets the UI tell hits from misses
+    return {"transcript_fetches": 0, "plans": 0}
+
+@st.cache_resource
+def get_planner():
+    return build_planner()
+
+@st.cache_resource
+def get_pipeline():
+    # The cached transcript is already cleaned, so the pipeline only chunks, maps and reduces
+    return build_pipeline(get_planner())
+
+@st.cache_resource
+def get_engine(api_key):
+    # One engine (and one genai.configure) per process; its ResponseCache holds the per-chunk map outputs
+    logging.info("Creating shared QAEngine for the Streamlit app")
+    return build_engine(api_key)
+
+@st.cache_data(ttl=APP_CACHE_TTL_SECONDS, max_entries=APP_CACHE_MAX_ENTRIES, show_spinner=False)
+def load_transcript(video_id):
+    """
+    Fetched and cleaned transcript segments of one video.
+    """
+    cache_counters()["transcript_fetches"] += 1
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    retriever = TranscriptRetriever(url, cache=TranscriptCache())
+    return Preprocessor().clean_segments(retriever.fetch_segments(url))
+
+@st.cache_data(ttl=APP_CACHE_TTL_SECONDS, max_entries=APP_CACHE_MAX_ENTRIES, show_spinner=False)
+def plan_question(video_id, question, _segments):
+    # _segments is not hashed by Streamlit; video_id already identifies it
+    cache_counters()["plans"] += 1
+    return get_planner().plan(_segments, question)
+
+def video_id_for(video_url):
+    if not TranscriptRetriever.is_valid_youtube_url(video_url):
+        raise InvalidYouTubeURLError("Not a valid YouTube URL")
+    return TranscriptRetriever(video_url).fetch_uid_yt(video_url)
+
+def get_summary(video_url, question, dry_run=False, on_progress=None, cache_info=None):
+    """
+    Returns the plan description for a dry run, otherwise a generator that yields the answer as it is written.
+    cache_info (a dict) is filled with what was served from the caches.
+    """
+    cache_info = {} if cache_info is None else cache_info
+    counters = cache_counters()
+    video_id = video_id_for(video_url)
+    # Label this run's metrics spans, including the map calls that run while the answer streams
+    bind(video_id=video_id)
+
+    # Steps 1-2: Retrieve and preprocess the transcript (cached per video)
+    fetches = counters["transcript_fetches"]
+    cleaned = load_transcript(video_id)
+    cache_info["transcript"] = counters["transcript_fetches"] == fetches
+
+    pipelined = PIPELINE and not dry_run and get_pipeline().applies(cleaned, question)
+    if not pipelined:
+        # Step 3: Plan how to answer (cached per video and question; chunks are reused across questions)
+        plans = counters["plans"]
+        plan = plan_question(video_id, question, cleaned)
+        cache_info["plan"] = counters["plans"] == plans
+        if dry_run:
+            return plan.describe()
 
-def get_summary(video_url, question):
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not found in environment or .env file.")
+    engine = get_engine(api_key)
+    cache_info["llm_stats_before"] = dict(engine.cache.stats)
+    cache_info["engine"] = engine
+
+    # Step 4: Execute; the map step runs when the stream is first read
+    if pipelined:
+        # Chunking, map calls and reduce merges overlap instead of running one after another
+        cache_info["pipelined"] = True
+        return get_pipeline().stream(cleaned, engine, question, on_progress=on_progress)
+    return get_planner().execute_stream(plan, engine, max_concurrency=MAX_CONCURRENCY, on_progress=on_progress)
+
+def get_answers(video_url, questions, dry_run=False, on_progress=None, cache_info=None):
+    """
+    Several questions about one video in one pass: each chunk is sent once with every question that needs it,
+    then each question is reduced on its own. Returns the plan descriptions for a dry run, otherwise the answers.
+    """
+    cache_info = {} if cache_info is None else cache_info
+    counters = cache_counters()
+    video_id = video_id_for(video_url)
+    bind(video_id=video_id)
+
+    fetches = counters["transcript_fetches"]
+    cleaned = load_transcript(video_id)
+    cache_info["transcript"] = counters["transcript_fetches"] == fetches
+
+    plans_before = counters["plans"]
+    plans = [plan_question(video_id, question, cleaned) for question in questions]
+    cache_info["plan"] = counters["plans"] == plans_before
+    if dry_run:
+        return [plan.describe() for plan in plans]
 
-    # Step 1: Retrieve transcript
-    retriever = TranscriptRetriever(video_url)
-    raw_transcript = retriever.fetch_transcript(video_url)
-
-    # Step 2: Preprocess transcript
-    preprocessor = Preprocessor()
-    cleaned = preprocessor.clean_transcript(raw_transcript)
-
-    def determine_chunk_size(transcript):
-        length = len(transcript)
-        if length < 2000:
-            return length
-        elif length < 10000:
-            return 3000
-        elif length < 40000:
-            return 8000
-        else:
-            return 12000
-
-    chunk_size = determine_chunk_size(cleaned)
-    chunks = preprocessor.chunk_transcript(cleaned, chunk_size=chunk_size)
-
-    engine = QAEngine(api_key=api_key)
-
-    # --------- ALWAYS use map-reduce for any question (summary or specific) ---------
-    per_chunk_answers = [engine.answer_question(chunk, question if question else "Summarize this transcript section.") for chunk in chunks]
-    combined_text = "\n\n".join(per_chunk_answers)
-    reduce_prompt = (
-        f"Given these answers (from different parts of the video) to the question: '{question if question else 'Summarize the video'}', "
-        f"combine everything into ONE comprehensive, concise answer—removing repetition and contradictions, and giving the user the best possible response:\n\n"
-        f"{combined_text}"
-    )
-    final_answer = engine.summarize_transcript(reduce_prompt)
-    return final_answer
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY not found in environment or .env file.")
+    engine = get_engine(api_key)
+    cache_info["llm_stats_before"] = dict(engine.cache.stats)
+    cache_info["engine"] = engine
+    session = VideoSession(cleaned, get_planner(), engine, max_concurrency=MAX_CONCURRENCY)
+    return session.answer_plans(plans, on_progress=on_progress)
+
+def describe_cache_use(cache_info):
+    parts = [
+        f"transcript {'cached' if cache_info.get('transcript') else 'fetched'}",
+        "pipelined (no plan)" if cache_info.get("pipelined") else
+        f"plan {'cached' if cache_info.get('plan') else 'computed'}",
+    ]
+    engine = cache_info.get("engine")
+    if engine is not None:
+        before, after = cache_info["llm_stats_before"], engine.cache.stats
+        hits = sum(after[key] - before[key] for key in ("memory_hits", "disk_hits"))
+        parts.append(f"LLM responses from cache: {hits}, new LLM calls: {after['misses'] - before['misses']}")
+    return "Cache: " + " | ".join(parts)
 
 # --- Streamlit UI ---
+if METRICS_PORT:
+    start_metrics_exporter(METRICS_PORT)
 st.set_page_config(page_title="YouTube Transcript Q&A & Summarizer")
 ICON_PATH = "yt_logo.png"
 st.image(ICON_PATH, width=100)
@@ -157,22 +258,62 @@ st.markdown("Enter YouTube video link and choose an action:")
 
 video_url = st.text_input("YouTube Video Link", placeholder="Paste the URL here...")
 
-option = st.radio("Select Action:", ("Summarize Video", "Ask a Question"))
+option = st.radio("Select Action:", ("Summarize Video", "Ask a Question", "Ask Several Questions"))
 
 question = ""
+questions = []
 if option == "Ask a Question":
     question = st.text_input("Enter your question about this video:")
+elif option == "Ask Several Questions":
+    lines = st.text_area("Enter your questions, one per line (they share one pass over the transcript):")
+    questions = [line.strip() for line in lines.splitlines() if line.strip()]
 
-if st.button("Go") and video_url:
-    with st.spinner("Processing..."):
-        try:
-            output_text = get_summary(video_url, question)
-        except Exception as e:
-            output_text = f"Error: {str(e)}"
+dry_run = st.checkbox("Dry run (only show the execution plan and estimated LLM calls)")
 
-        st.subheader("Output:")
+if st.button("Go") and video_url:
+    progress_bar = st.empty()
+
+    def show_progress(done, total):
+        progress_bar.progress(done / total, text=f"Answered {done}/{total} transcript chunks")
+
+    cache_info = {}
+    output_text = ""
+    try:
+        if len(questions) > 1:
+            with st.spinner("Answering all questions in one pass over the transcript..."):
+                results = get_answers(video_url, questions, dry_run=dry_run, on_progress=show_progress,
+                                      cache_info=cache_info)
+            st.subheader("Output:")
+            sections = []
+            for number, (asked, result) in enumerate(zip(questions, results), 1):
+                st.markdown(f"**{number}. {asked}**")
+                if dry_run:
+                    st.code(result, language=None)
+                else:
+                    st.write(result)
+                sections.append(f"{number}. {asked}\n\n{result}")
+            output_text = "\n\n".join(sections)
+        else:
+            question = questions[0] if questions else question
+            with st.spinner("Fetching and preparing transcript..."):
+                result = get_summary(video_url, question, dry_run=dry_run, on_progress=show_progress,
+                                     cache_info=cache_info)
+
+            st.subheader("Output:")
+            if dry_run:
+                output_text = result
+                st.code(output_text, language=None)
+            else:
+                # Renders the final answer token by token as the model writes it
+                output_text = st.write_stream(result)
+        caption = describe_cache_use(cache_info)
+        st.caption(caption)
+        logging.info("%s", caption)
+    except Exception as e:
+        output_text = f"Error: {str(e)}"
         st.write(output_text)
 
+    if output_text:
         st.download_button(
             label="Download Output",
             data=output_text,
@@ -180,4 +321,4 @@ if st.button("Go") and video_url:
             mime="text/plain"
         )
 
-st.markdown("Created by **Siddham Jain** (Student of Shiv Nadar IOE).")
+st.markdown("Created by **Siddham Jain** (Student of Shiv Nadar IOE).")
\ No newline at end of file
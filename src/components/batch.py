@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from dotenv import load_dotenv
+# Before the logger and component imports, which read LOG_* / QA_* at import time
+load_dotenv()
+from logger import logging, setup_logging
+from exception import CustomException, InvalidYouTubeURLError, LLM_APIError, TranscriptNotFoundError
+from components.transcript_retriever import TranscriptRetriever
+from components.cache import TranscriptCache
+from components.preprocessor import Preprocessor
+from components.planner import ExecutionPlanner, count_fallbacks
+from components.main import build_engine, build_planner
+from components.metrics import registry, trace
+
+
+def read_urls(source):
+    """
+    Reads one URL per line from a file path, or from stdin when source is "-".
+    Blank lines and lines starting with # are ignored.
+    """
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.strip().startswith("#")]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class BatchRunner:
+    """
+    Summarizes (or answers one question about) many videos with a bounded worker pool.
+    - URLs are deduplicated by video ID.
+    - Each finished video is appended to a JSONL file right away; that file is also the checkpoint,
+      so a rerun skips every video already in it.
+    - Transcripts and LLM responses go through the persistent caches, so a video interrupted
+      half-way does not pay again for the work it had already done.
+    - Per-video failures are recorded in the output instead of stopping the batch.
+    - While a video is in its LLM phase, the transcripts of the next `prefetch` videos are already downloading
+      (one pooled retriever for the whole batch).
+    """
+
+    def __init__(self, output_path, engine, planner=None, question="", max_workers=2, map_concurrency=4,
+                 transcript_cache=None, retry_failed=False, retriever=None, prefetch=2):
+        self.output_path = output_path
+        self.engine = engine
+        self.planner = planner or ExecutionPlanner()
+        self.question = question
+        self.max_workers = max(1, max_workers)
+        self.map_concurrency = map_concurrency
+        self.transcript_cache = transcript_cache
+        self.retry_failed = retry_failed
+        self.retriever = retriever or TranscriptRetriever(cache=transcript_cache)
+        self.prefetch = max(0, prefetch)
+        self.preprocessor = Preprocessor()
+        self._write_lock = threading.Lock()
+
+    def load_checkpoint(self):
+        """
+        Returns the video IDs of the successful records in the output file, plus the failed ones
+        when retry_failed is off.
+        """
+        done = set()
+        if not os.path.exists(self.output_path):
+            return done
+        with open(self.output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; that video simply runs again
+                    continue
+                if record.get("question", "") != self.question:
+                    continue
+                if record.get("status") == "ok" or not self.retry_failed:
+                    done.add(record.get("video_id") or record.get("url"))
+        return done
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._write_lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def dedupe(self, urls):
+        """
+        Returns [(video_id, url)] with one entry per video; invalid URLs are recorded as failures.
+        """
+        jobs = {}
+        invalid = []
+        for url in urls:
+            try:
+                video_id = self.retriever.fetch_uid_yt(url)
+                if not TranscriptRetriever.is_valid_youtube_url(url) or not video_id:
+                    raise InvalidYouTubeURLError("Not a valid YouTube URL")
+            except InvalidYouTubeURLError as e:
+                invalid.append((url, e))
+                continue
+            jobs.setdefault(video_id, url)
+        return list(jobs.items()), invalid
+
+    def process(self, video_id, url, upcoming=()):
+        """
+        Runs fetch -> clean -> plan -> map-reduce for one video and returns its result record.
+        upcoming: URLs whose transcripts are prefetched while this video is answered.
+        """
+        start_time = time.perf_counter()
+        record = {"video_id": video_id, "url": url, "question": self.question}
+        # Spans of this video (retrieve, clean, chunk, map, reduce) are labelled with its ID
+        with trace(video_id=video_id):
+            try:
+                raw_segments = self.retriever.fetch_segments(url)
+                if upcoming:
+                    self.retriever.prefetch(upcoming)
+                cleaned = self.preprocessor.clean_segments(raw_segments)
+                plan = self.planner.plan(cleaned, self.question)
+                answer = self.planner.execute(plan, self.engine, max_concurrency=self.map_concurrency)
+                # A fallback text (final or for any chunk) means the LLM was not reachable: not done, so a rerun
+                # (with --retry-failed) asks again instead of keeping the incomplete answer
+                failed = plan.fallback_answers + count_fallbacks([answer])
+                if failed:
+                    raise LLM_APIError(f"{failed} LLM call(s) returned the fallback answer")
+                record.update(status="ok", answer=answer, strategy=plan.strategy, llm_calls=plan.estimated_calls)
+            except (TranscriptNotFoundError, InvalidYouTubeURLError, CustomException) as e:
+                logging.warning("Batch: video %s failed: %s", video_id, e)
+                record.update(status="error", error_type=type(e).__name__, error=str(e))
+            except Exception as e:
+                # Anything else (a bad response, a bug) fails this video only, not the rest of the batch
+                logging.error("Batch: video %s failed unexpectedly: %s", video_id, e, exc_info=True)
+                record.update(status="error", error_type=type(e).__name__, error=str(e))
+        record["seconds"] = round(time.perf_counter() - start_time, 3)
+        record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        return record
+
+    def run(self, urls):
+        """
+        Processes every URL not already in the checkpoint and returns run statistics.
+        """
+        start_time = time.perf_counter()
+        jobs, invalid = self.dedupe(urls)
+        done = self.load_checkpoint()
+        stats = {"total": len(jobs) + len(invalid), "ok": 0, "failed": 0, "skipped": 0}
+
+        for url, error in invalid:
+            if url in done:
+                stats["skipped"] += 1
+                continue
+            self._write({"video_id": None, "url": url, "question": self.question, "status": "error",
+                         "error_type": type(error).__name__, "error": str(error)})
+            stats["failed"] += 1
+
+        pending = [(video_id, url) for video_id, url in jobs if video_id not in done]
+        stats["skipped"] += len(jobs) - len(pending)
+        logging.info("Batch: %d video(s) to process, %d already done.", len(pending), stats["skipped"])
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch")
+        try:
+            # Videos start in order, so while video i is answered the next max_workers - 1 are running already;
+            # the prefetch window starts after them
+            futures = {pool.submit(self.process, video_id, url,
+                                   [url for _, url in pending[i + self.max_workers:i + self.max_workers + self.prefetch]]):
+                       video_id for i, (video_id, url) in enumerate(pending)}
+            for future in as_completed(futures):
+                record = future.result()
+                self._write(record)
+                stats["ok" if record["status"] == "ok" else "failed"] += 1
+                print(f"[{stats['ok'] + stats['failed']}/{len(pending) + len(invalid)}] "
+                      f"{record['video_id']}: {record['status']} ({record['seconds']}s)", flush=True)
+        except KeyboardInterrupt:
+            logging.info("Batch interrupted; finished videos are checkpointed.")
+            print("\n[INFO] Interrupted. Rerun the same command to resume.")
+            stats["interrupted"] = True
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.retriever.close()
+
+        elapsed = time.perf_counter() - start_time
+        stats["seconds"] = round(elapsed, 2)
+        processed = stats["ok"] + stats["failed"]
+        stats["videos_per_min"] = round(processed / elapsed * 60, 2) if elapsed > 0 else 0.0
+        return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize many YouTube videos into a JSONL file (resumable).")
+    parser.add_argument("urls", help="File with one YouTube URL per line, or - for stdin.")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL results / checkpoint file.")
+    parser.add_argument("-q", "--question", default="", help="Question to ask about every video (default: summary).")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.getenv("BATCH_WORKERS", "2")),
+                        help="Videos processed at the same time.")
+    parser.add_argument("--map-concurrency", type=int, default=int(os.getenv("QA_MAX_CONCURRENCY", "4")),
+                        help="Parallel chunk calls per video.")
+    parser.add_argument("--prefetch", type=int, default=int(os.getenv("BATCH_PREFETCH", "2")),
+                        help="Transcripts downloaded ahead while earlier videos are being answered (0 = off).")
+    parser.add_argument("--retry-failed", action="store_true", help="Run videos that failed in an earlier run again.")
+    parser.add_argument("--metrics-out", default=os.getenv("METRICS_EXPORT_PATH"),
+                        help="Write per-stage metrics and spans here (*.json for JSON, Prometheus text otherwise).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        logging.error("GEMINI_API_KEY not found — set it in .env or environment.")
+        print("[ERROR] GEMINI_API_KEY not found.")
+        sys.exit(1)
+
+    runner = BatchRunner(
+        args.output,
+        engine=build_engine(api_key),
+        planner=build_planner(),
+        question=args.question,
+        max_workers=args.workers,
+        map_concurrency=args.map_concurrency,
+        transcript_cache=TranscriptCache(),
+        retry_failed=args.retry_failed,
+        prefetch=args.prefetch,
+    )
+    stats = runner.run(read_urls(args.urls))
+    if args.metrics_out:
+        registry.write(args.metrics_out)
+    print(f"\n=== BATCH SUMMARY ===\n"
+          f"Videos: {stats['total']} | OK: {stats['ok']} | Failed: {stats['failed']} | Skipped (already done): {stats['skipped']}\n"
+          f"Time: {stats['seconds']}s | Throughput: {stats['videos_per_min']} videos/min")
+
+
+if __name__ == "__main__":
+    main()
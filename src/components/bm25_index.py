@@ -0,0 +1,101 @@
+import re
+import time
+import numpy as np
+from logger import logging
+from exception import CustomException
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Very common words carry no ranking signal and only inflate the postings
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have how i if in into is it its
+me my of on or so that the their them then there these they this to was we were what when
+where which who why will with you your about video transcript can
+""".split())
+
+
+def tokenize(text):
+    """
+    Lowercases text and returns its word tokens without stopwords.
+    """
+    return [tok for tok in TOKEN_PATTERN.findall(text.lower()) if tok not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over transcript chunks, built with NumPy.
+    - Postings are stored term-major (CSR style) so scoring a question touches only its own terms.
+    - top_k returns chunk indices in transcript order so the reduce step reads them chronologically.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        try:
+            self.chunks = list(chunks)
+            self.k1 = k1
+            self.b = b
+            start_time = time.perf_counter()
+            self._build()
+            duration = (time.perf_counter() - start_time) * 1000
+            logging.info("BM25 index built | Chunks: %s | Terms: %s | Time: %.1fms", len(self.chunks), len(self.vocabulary), duration)
+        except Exception as e:
+            logging.error("Exception while building BM25 index: %s", e)
+            raise CustomException(e)
+
+    def _build(self):
+        doc_tokens = [tokenize(chunk) for chunk in self.chunks]
+        n_docs = len(doc_tokens)
+        self.doc_lengths = np.array([len(tokens) for tokens in doc_tokens], dtype=np.float64)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if n_docs and self.doc_lengths.sum() else 1.0
+
+        vocabulary = {}
+        term_ids = np.fromiter(
+            (vocabulary.setdefault(tok, len(vocabulary)) for tokens in doc_tokens for tok in tokens),
+            dtype=np.int64,
+            count=int(self.doc_lengths.sum()),
+        )
+        self.vocabulary = vocabulary
+        if term_ids.size == 0:
+            self.term_ptr = np.zeros(1, dtype=np.int64)
+            self.post_docs = np.zeros(0, dtype=np.int64)
+            self.post_tf = np.zeros(0, dtype=np.float64)
+            self.idf = np.zeros(0, dtype=np.float64)
+            return
+        doc_ids = np.repeat(np.arange(n_docs, dtype=np.int64), self.doc_lengths.astype(np.int64))
+        n_terms = len(vocabulary)
+
+        # One (term, doc) key per token; unique keys in sorted order give term-major postings with counts
+        pair_keys, tf = np.unique(term_ids * n_docs + doc_ids, return_counts=True)
+        post_terms = pair_keys // n_docs
+        self.post_docs = pair_keys % n_docs
+        self.post_tf = tf.astype(np.float64)
+        doc_freq = np.bincount(post_terms, minlength=n_terms)
+        self.term_ptr = np.concatenate(([0], np.cumsum(doc_freq)))
+        self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def scores(self, query):
+        """
+        Returns a BM25 score per chunk for the query.
+        """
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        term_ids = {self.vocabulary[tok] for tok in tokenize(query) if tok in self.vocabulary}
+        for term_id in term_ids:
+            lo, hi = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            docs = self.post_docs[lo:hi]
+            tf = self.post_tf[lo:hi]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, query, k=3):
+        """
+        Returns indices of the k best matching chunks (in transcript order).
+        Falls back to every chunk when nothing in the question matches the transcript vocabulary.
+        """
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        if matched.size == 0:
+            logging.warning("BM25 found no matching terms for question; using every chunk.")
+            return list(range(len(self.chunks)))
+        k = min(k, matched.size)
+        best = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return sorted(best.tolist())
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from logger import logging
+from exception import CustomException
+
+DEFAULT_CACHE_DIR = os.path.join(os.getcwd(), "cache")
+
+
+class SQLiteCache:
+    """
+    Small key -> text store on top of SQLite.
+    - Entries expire after ttl_seconds (None keeps them forever).
+    - Least recently used entries are evicted once max_entries / max_bytes is exceeded.
+    - Every operation opens its own connection in WAL mode, so several threads and
+      processes (CLI, Streamlit workers, batch jobs) can share one file safely.
+    """
+
+    def __init__(self, path, ttl_seconds=None, max_entries=1000, max_bytes=None, table="cache"):
+        if not table.isidentifier():
+            raise CustomException(f"Invalid cache table name: {table}")
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.table = table
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None on a miss / expired entry.
+        """
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """
+        Same as get, but returns (value, created_at), so callers can keep the entry's original age.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self._is_expired(created_at, now):
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            return value, created_at
+
+    def set(self, key, value):
+        """
+        Stores value under key and evicts least recently used entries if the store is over budget.
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries is not None:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        if self.max_bytes is not None:
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC").fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    total -= size
+
+    def delete(self, key):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class TranscriptCache:
+    """
+    Persistent transcript store keyed by YouTube video ID.
+    Keeps the raw transcript entries (text/start/duration) so callers can rebuild either the
+    joined text or timestamped segments without another network round trip.
+    """
+
+    def __init__(self, path=None, ttl_seconds=7 * 24 * 3600, max_entries=5000, max_bytes=None):
+        path = path or os.getenv("TRANSCRIPT_CACHE_PATH") or os.path.join(DEFAULT_CACHE_DIR, "transcripts.sqlite3")
+        self.store = SQLiteCache(path, ttl_seconds=ttl_seconds, max_entries=max_entries,
+                                 max_bytes=max_bytes, table="transcripts")
+
+    def get(self, video_id):
+        """
+        Returns the list of transcript entries for video_id, or None if it is not cached.
+        """
+        try:
+            value = self.store.get(video_id)
+        except sqlite3.Error as e:
+            logging.warning("Transcript cache read failed for %s: %s", video_id, e)
+            return None
+        if value is None:
+            logging.info("Transcript cache miss -> %s", video_id)
+            return None
+        logging.info("Transcript cache hit -> %s", video_id)
+        return json.loads(value)
+
+    def set(self, video_id, entries):
+        """
+        Stores transcript entries for video_id. Cache write failures are logged, never raised.
+        """
+        try:
+            self.store.set(video_id, json.dumps(list(entries)))
+        except sqlite3.Error as e:
+            logging.warning("Transcript cache write failed for %s: %s", video_id, e)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for LLM responses.
+    - Key is a SHA-256 of model name + prompt, so only byte-identical requests share an answer.
+    - An in-memory LRU tier sits in front of an optional persistent SQLite tier.
+    - hits / misses counters are kept per tier for monitoring.
+    Any object with the same get(model, prompt) / set(model, prompt, text) methods can be plugged
+    into QAEngine instead.
+    """
+
+    def __init__(self, path=None, ttl_seconds=24 * 3600, memory_entries=256, max_entries=20000, persistent=True):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self.store = None
+        if persistent:
+            path = path or os.getenv("LLM_CACHE_PATH") or os.path.join(DEFAULT_CACHE_DIR, "llm_responses.sqlite3")
+            self.store = SQLiteCache(path, ttl_seconds=ttl_seconds, max_entries=max_entries, table="responses")
+
+    @staticmethod
+    def make_key(model, prompt):
+        return hashlib.sha256(f"{model}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, text, created_at=None):
+        with self._lock:
+            self._memory[key] = (text, time.time() if created_at is None else created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, model, prompt):
+        """
+        Returns the cached response text for (model, prompt), or None.
+        """
+        key = self.make_key(model, prompt)
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                text, created_at = item
+                if self.ttl_seconds is None or time.time() - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return text
+                del self._memory[key]
+        if self.store is not None:
+            try:
+                entry = self.store.get_entry(key)
+            except sqlite3.Error as e:
+                logging.warning("Response cache read failed: %s", e)
+                entry = None
+            if entry is not None:
+                text, created_at = entry
+                self._count("disk_hits")
+                # Promoted with its original age, so it expires from memory when it does on disk
+                self._remember(key, text, created_at)
+                return text
+        self._count("misses")
+        return None
+
+    def set(self, model, prompt, text):
+        """
+        Stores a successful response. Empty responses are ignored.
+        """
+        if not text or not text.strip():
+            return
+        key = self.make_key(model, prompt)
+        self._remember(key, text)
+        self._count("writes")
+        if self.store is not None:
+            try:
+                self.store.set(key, text)
+            except sqlite3.Error as e:
+                logging.warning("Response cache write failed: %s", e)
+
+    def hit_rate(self):
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
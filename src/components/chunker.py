@@ -0,0 +1,178 @@
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+from logger import logging
+from exception import CustomException
+
+# Rough average for English text with Gemini-style tokenizers
+CHARS_PER_TOKEN = 4
+
+# A sentence is everything up to and including its closing punctuation (or the end of the text)
+SENTENCE_PATTERN = re.compile(r"[^.!?]*(?:[.!?]+|$)")
+
+
+def sentence_key(sentence):
+    """
+    Hash of a sentence ignoring case and spacing; the same spoken sentence gets the same key wherever it occurs.
+    """
+    return zlib.crc32(" ".join(sentence.lower().split()).encode("utf-8"))
+
+
+def estimate_tokens(text):
+    """
+    Fast local token estimate (~4 chars per token), good enough for packing decisions.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class Chunk:
+    """
+    A piece of the transcript: its text, [start, end) character offsets in the source and token count.
+    Chunks cut from a SegmentStore also carry the [start_time, end_time] seconds they cover.
+    """
+    text: str
+    start: int
+    end: int
+    tokens: int
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+
+class TokenChunker:
+    """
+    Packs whole sentences greedily into chunks of at most max_tokens tokens.
+    - Token counting uses estimate_tokens unless an exact tokenizer (text -> int) is given.
+    - Sentences longer than the budget (common in unpunctuated auto captions) are split at spaces.
+    - overlap_tokens repeats the tail sentences of a chunk at the start of the next one.
+    - cut_before (a set of sentence_key values) starts a new chunk at each of those sentences, wherever they occur.
+      Cutting where repeated passages begin makes every repeat of a passage chunk the same way.
+    """
+
+    def __init__(self, max_tokens=4000, overlap_tokens=0, tokenizer=None, cut_before=None):
+        if max_tokens < 1:
+            raise CustomException("max_tokens must be greater than zero.")
+        if overlap_tokens < 0 or overlap_tokens >= max_tokens:
+            raise CustomException("overlap_tokens must be between 0 and max_tokens.")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = tokenizer or estimate_tokens
+        self.cut_before = cut_before or set()
+
+    def _pieces(self, text):
+        """
+        Yields (start, end, tokens) spans of sentences, each within the token budget.
+        """
+        for match in SENTENCE_PATTERN.finditer(text):
+            start, end = match.span()
+            while start < end:
+                piece_end = end
+                tokens = self.count_tokens(text[start:piece_end])
+                # Oversized sentence: cut at a space, shrinking until it fits the budget
+                while tokens > self.max_tokens:
+                    limit = min(piece_end - 1, start + self.max_tokens * CHARS_PER_TOKEN)
+                    space = text.rfind(" ", start + 1, limit)
+                    piece_end = space if space > start else max(limit, start + 1)
+                    tokens = self.count_tokens(text[start:piece_end])
+                yield start, piece_end, tokens
+                start = piece_end
+
+    def chunk(self, text):
+        """
+        Splits text into a list of Chunk objects.
+        """
+        try:
+            if not isinstance(text, str):
+                logging.error("Input to TokenChunker.chunk is not a string.")
+                raise CustomException("Input must be a string for chunking transcript.")
+
+            chunks = [chunk for chunk in self._pack(text)[0] if chunk.text]
+            logging.info("Transcript packed into %s chunk(s) of at most %s tokens.", len(chunks), self.max_tokens)
+            return chunks
+        except CustomException:
+            raise
+        except Exception as e:
+            logging.error("Exception during TokenChunker.chunk: %s", e)
+            raise CustomException(e)
+
+    def _pack(self, text):
+        chunks = []
+        current = []  # (start, end, tokens) pieces of the chunk being filled
+        current_tokens = 0
+        for piece in self._pieces(text):
+            if current and (current_tokens + piece[2] > self.max_tokens or
+                            (self.cut_before and sentence_key(text[piece[0]:piece[1]]) in self.cut_before)):
+                chunks.append(self._make_chunk(text, current))
+                current = self._overlap_tail(current, piece[2])
+                current_tokens = sum(p[2] for p in current)
+            current.append(piece)
+            current_tokens += piece[2]
+        last_start = current[0][0] if current else len(text)
+        if current:
+            chunks.append(self._make_chunk(text, current))
+        # Also report where the last chunk's raw text (before stripping) begins, for iter_chunks
+        return chunks, last_start
+
+    def iter_chunks(self, pieces):
+        """
+        Streaming chunk: consumes text pieces (e.g. Preprocessor.iter_clean output) and yields Chunk objects
+        as soon as they are complete, with offsets into the concatenated text.
+        """
+        buffer = ""
+        base = 0  # offset of buffer[0] in the full text
+        for piece in pieces:
+            buffer += piece
+            # Re-pack only once the buffer holds about two chunks, then keep the last (maybe incomplete) one
+            if len(buffer) < 2 * self.max_tokens * CHARS_PER_TOKEN:
+                continue
+            packed, keep = self._pack(buffer)
+            for chunk in packed[:-1]:
+                if chunk.text:
+                    yield Chunk(chunk.text, chunk.start + base, chunk.end + base, chunk.tokens)
+            if packed:
+                buffer = buffer[keep:]
+                base += keep
+        for chunk in self._pack(buffer)[0]:
+            if chunk.text:
+                yield Chunk(chunk.text, chunk.start + base, chunk.end + base, chunk.tokens)
+
+    def chunk_segments(self, store):
+        """
+        Chunks the text of a SegmentStore and stamps every chunk with the seconds it covers.
+        """
+        chunks = self.chunk(store.text)
+        for chunk in chunks:
+            chunk.start_time, chunk.end_time = store.time_span(chunk.start, chunk.end)
+        return chunks
+
+    def chunk_texts(self, text):
+        """
+        Same as chunk, but returns only the chunk strings.
+        """
+        return [chunk.text for chunk in self.chunk(text)]
+
+    def _overlap_tail(self, pieces, next_tokens):
+        # Keep trailing pieces worth up to overlap_tokens, leaving room for the next piece
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+        tail = []
+        used = 0
+        for piece in reversed(pieces):
+            if used + piece[2] > budget:
+                break
+            tail.insert(0, piece)
+            used += piece[2]
+        return tail
+
+    @staticmethod
+    def _make_chunk(text, pieces):
+        start, end = pieces[0][0], pieces[-1][1]
+        raw = text[start:end]
+        stripped = raw.strip()
+        lead = len(raw) - len(raw.lstrip())
+        return Chunk(
+            text=stripped,
+            start=start + lead,
+            end=start + lead + len(stripped),
+            tokens=sum(p[2] for p in pieces),
+        )
@@ -0,0 +1,130 @@
+import re
+import time
+import numpy as np
+from logger import logging
+from exception import CustomException
+from components.bm25_index import tokenize
+from components.chunker import SENTENCE_PATTERN, estimate_tokens
+
+TEXTRANK = "textrank"
+TFIDF = "tfidf"
+# Spoken filler that says nothing about the content
+FILLER = frozenset("uh um uhm hmm yeah okay ok like just really actually basically gonna kind sort know mean right".split())
+# Unpunctuated auto captions come as one endless "sentence"; score them in windows of this many words
+WINDOW_WORDS = 25
+WORD_SPAN = re.compile(r"\S+")
+
+
+class ExtractiveCompressor:
+    """
+    Shrinks a chunk locally before it is sent to the LLM by keeping its most informative sentences:
+    - sentences are TF-IDF vectors (NumPy matrix, stopwords and filler removed);
+    - "tfidf" scores each sentence by cosine similarity to the chunk centroid,
+      "textrank" by PageRank over the sentence similarity graph;
+    - the best sentences are kept, in their original order, until ratio of the chunk's tokens is reached.
+    """
+
+    def __init__(self, ratio=0.6, method=TEXTRANK, damping=0.85, iterations=30):
+        if not 0 < ratio <= 1:
+            raise CustomException("Compression ratio must be in (0, 1].")
+        if method not in (TEXTRANK, TFIDF):
+            raise CustomException(f"Unknown compression method: {method}")
+        self.ratio = ratio
+        self.method = method
+        self.damping = damping
+        self.iterations = iterations
+
+    @staticmethod
+    def _sentences(text):
+        spans = []
+        for match in SENTENCE_PATTERN.finditer(text):
+            start, end = match.span()
+            if not text[start:end].strip():
+                continue
+            words = list(WORD_SPAN.finditer(text, start, end))
+            if len(words) <= 2 * WINDOW_WORDS:
+                spans.append((start, end))
+                continue
+            for i in range(0, len(words), WINDOW_WORDS):
+                window = words[i:i + WINDOW_WORDS]
+                spans.append((window[0].start(), end if i + WINDOW_WORDS >= len(words) else words[i + WINDOW_WORDS].start()))
+        return spans
+
+    @staticmethod
+    def _tfidf(sentences):
+        vocabulary = {}
+        rows, cols = [], []
+        for row, sentence in enumerate(sentences):
+            for term in tokenize(sentence):
+                if term not in FILLER:
+                    rows.append(row)
+                    cols.append(vocabulary.setdefault(term, len(vocabulary)))
+        matrix = np.zeros((len(sentences), max(1, len(vocabulary))))
+        np.add.at(matrix, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), 1.0)
+        df = (matrix > 0).sum(axis=0)
+        matrix *= np.log((1 + len(sentences)) / (1 + df)) + 1
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    def _textrank(self, vectors):
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, 0.0)
+        out_weight = similarity.sum(axis=1, keepdims=True)
+        n = len(vectors)
+        # Sentences without any similar sentence link to all others evenly
+        transition = np.divide(similarity, out_weight, out=np.full_like(similarity, 1.0 / max(1, n - 1)),
+                               where=out_weight > 0)
+        scores = np.full(n, 1.0 / n)
+        for _ in range(self.iterations):
+            updated = (1 - self.damping) / n + self.damping * (transition.T @ scores)
+            if np.abs(updated - scores).sum() < 1e-6:
+                scores = updated
+                break
+            scores = updated
+        return scores
+
+    def scores(self, sentences):
+        """
+        One score per sentence, higher is more central; sentences of only filler and stopwords score 0.
+        """
+        vectors = self._tfidf(sentences)
+        if self.method == TFIDF:
+            scores = vectors @ vectors.mean(axis=0)
+        else:
+            scores = self._textrank(vectors)
+        scores[~vectors.any(axis=1)] = 0.0
+        return scores
+
+    def compress(self, text):
+        """
+        Returns text reduced to about ratio of its tokens; sentence order and wording are unchanged.
+        """
+        if self.ratio >= 1:
+            return text
+        spans = self._sentences(text)
+        if len(spans) < 3:
+            return text
+        sentences = [text[start:end].strip() for start, end in spans]
+        tokens = np.array([estimate_tokens(sentence) for sentence in sentences])
+        budget = self.ratio * tokens.sum()
+        scores = self.scores(sentences)
+        keep, used = [], 0
+        # Best first (stable sort: earlier sentences win ties); a sentence that does not fit leaves room for shorter ones
+        for i in np.argsort(-scores, kind="stable"):
+            if not keep or (scores[i] > 0 and used + tokens[i] <= budget):
+                keep.append(i)
+                used += tokens[i]
+        return " ".join(sentences[i] for i in sorted(keep))
+
+    def compress_many(self, texts):
+        """
+        Compresses each text; logs the overall token reduction.
+        """
+        start_time = time.perf_counter()
+        texts = list(texts)
+        compressed = [self.compress(text) for text in texts]
+        before = sum(estimate_tokens(text) for text in texts)
+        after = sum(estimate_tokens(text) for text in compressed)
+        logging.info("Compressed %s chunk(s) | Tokens: %s -> %s | Method: %s | Time: %.1fms", len(texts), before,
+                     after, self.method, (time.perf_counter() - start_time) * 1000)
+        return compressed
@@ -0,0 +1,120 @@
+import re
+import zlib
+import numpy as np
+from logger import logging
+from components.chunker import SENTENCE_PATTERN, estimate_tokens, sentence_key
+
+WORD_RE = re.compile(r"\w+")
+# Multiplier for combining word hashes into shingle hashes (64-bit, odd)
+_SHINGLE_PRIME = np.uint64(0x100000001B3)
+_EMPTY = np.uint64(np.iinfo(np.uint64).max)
+
+
+def repeat_starts(text, min_run_tokens, max_gap=8, min_chars=20, count_tokens=estimate_tokens):
+    """
+    sentence_key values of the sentences where repeated passages (runs of sentences seen earlier in the text,
+    allowing up to max_gap changed sentences) of at least min_run_tokens tokens begin. Passed to TokenChunker as
+    cut_before, so the first occurrence and every repeat of such a passage are cut at the same sentence.
+    """
+    seen = set()
+    starts = set()
+    run_key, run_tokens, gap = None, 0, 0
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group()
+        if len(sentence.strip()) < min_chars:
+            continue
+        key = sentence_key(sentence)
+        if key in seen:
+            if run_key is None:
+                run_key, run_tokens = key, 0
+            run_tokens += count_tokens(sentence)
+            gap = 0
+        elif run_key is not None:
+            gap += 1
+            if gap > max_gap:
+                if run_tokens >= min_run_tokens:
+                    starts.add(run_key)
+                run_key, gap = None, 0
+        seen.add(key)
+    if run_key is not None and run_tokens >= min_run_tokens:
+        starts.add(run_key)
+    return starts
+
+
+class MinHashDeduper:
+    """
+    Finds near-duplicate texts (repeated choruses, recap segments, looped livestream parts) with MinHash:
+    each text becomes the set of its shingle_size-word shingles, and num_perm hashed minima estimate the
+    Jaccard similarity between two sets. Texts whose estimate reaches threshold are grouped under the
+    earliest one. Shingling, hashing and the pairwise comparison are NumPy array operations.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, shingle_size=5, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # h -> a*h + b (mod 2^64) with odd a: one cheap hash permutation per column
+        self.a = rng.integers(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, text):
+        words = WORD_RE.findall(text.lower())
+        if not words:
+            return np.empty(0, dtype=np.uint64)
+        ids = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+        size = min(self.shingle_size, len(ids))
+        count = len(ids) - size + 1
+        hashes = ids[:count].copy()
+        for offset in range(1, size):
+            hashes = hashes * _SHINGLE_PRIME + ids[offset:offset + count]
+        return np.unique(hashes)
+
+    def signature(self, text):
+        shingles = self._shingles(text)
+        if not len(shingles):
+            return np.full(self.num_perm, _EMPTY, dtype=np.uint64)
+        # (shingles, num_perm) hash matrix; uint64 arithmetic wraps, which is the mod 2^64 we want
+        return (shingles[:, None] * self.a + self.b).min(axis=0)
+
+    def signatures(self, texts):
+        return np.vstack([self.signature(text) for text in texts]) if texts else np.empty((0, self.num_perm),
+                                                                                           dtype=np.uint64)
+
+    def similarity(self, text_a, text_b):
+        """
+        Estimated Jaccard similarity of the two texts' shingle sets.
+        """
+        return float(np.mean(self.signature(text_a) == self.signature(text_b)))
+
+    def match(self, signature, signatures):
+        """
+        Row of signatures (earlier texts) that signature nearly duplicates, the first one if several, or None.
+        For deduplicating texts one at a time as they arrive.
+        """
+        if not len(signatures) or (signature == _EMPTY).all():
+            return None
+        similar = np.flatnonzero((signatures == signature).mean(axis=1) >= self.threshold)
+        return int(similar[0]) if len(similar) else None
+
+    def duplicate_of(self, texts):
+        """
+        For each text, the index of the text it duplicates (the earliest one of its group), or its own index.
+        """
+        texts = list(texts)
+        representatives = list(range(len(texts)))
+        if len(texts) < 2:
+            return representatives
+        signatures = self.signatures(texts)
+        empty = (signatures == _EMPTY).all(axis=1)
+        for i in range(len(texts) - 1):
+            if representatives[i] != i or empty[i]:
+                continue
+            similar = (signatures[i + 1:] == signatures[i]).mean(axis=1) >= self.threshold
+            for j in np.flatnonzero(similar & ~empty[i + 1:]) + i + 1:
+                if representatives[j] == j:
+                    representatives[j] = i
+        skipped = sum(1 for i, rep in enumerate(representatives) if rep != i)
+        if skipped:
+            logging.info("Near-duplicate texts: %s of %s share an earlier text's answer", skipped, len(texts))
+        return representatives
@@ -0,0 +1,40 @@
+# Run from src/: python -m components.internalTesting.bench_batch [--jobs 24 --chunk-tokens 300 --latency-ms 400]
+import argparse
+import sys
+import time
+from components.internalTesting.fakes import FakeGenerativeModel, WORDS
+from components.llm_backend import GenerativeModelBackend
+from components.qa_engine import QAEngine
+from components.rate_limiter import RateLimiter, CircuitBreaker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM requests and wall time saved by packing small jobs.")
+    parser.add_argument("--jobs", type=int, default=24)
+    parser.add_argument("--chunk-tokens", type=int, default=300, help="Size of every job's chunk.")
+    parser.add_argument("--batch-max-tokens", type=int, default=16000)
+    parser.add_argument("--batch-max-jobs", type=int, default=8)
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="Share of answers missing from batched replies.")
+    parser.add_argument("--latency-ms", type=float, default=400, help="Median fake LLM latency (per request).")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    words = args.chunk_tokens * 4 // 6
+    jobs = [(" ".join(WORDS[(i + j) % len(WORDS)] for j in range(words)) + ".", f"What does part {i} say?")
+            for i in range(args.jobs)]
+    for batch_max_tokens in (None, args.batch_max_tokens):
+        model = FakeGenerativeModel(latency_ms=args.latency_ms, latency_sigma=0.2, batch_miss_rate=args.miss_rate)
+        engine = QAEngine(backend=GenerativeModelBackend(model, "fake-model"), batch_max_tokens=batch_max_tokens,
+                          batch_job_max_tokens=args.chunk_tokens * 2, batch_max_jobs=args.batch_max_jobs,
+                          limiter=RateLimiter(requests_per_minute=None, tokens_per_minute=None),
+                          breaker=CircuitBreaker(failure_threshold=1000))
+        start = time.perf_counter()
+        engine.answer_jobs(jobs, max_concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        label = f"batched<= {batch_max_tokens} tokens" if batch_max_tokens else "one request per job"
+        print(f"{label:<26} requests={model.calls:<4} time={elapsed * 1000:.0f}ms stats={engine.batch_stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Run from src/: python -m components.internalTesting.bench_chunker
+import random
+import time
+from components.preprocessor import Preprocessor
+from components.chunker import TokenChunker
+
+WORDS = ("so today we are going to talk about gradient descent and why the learning rate "
+         "matters a lot when you train neural networks on real data sets").split()
+
+
+def synthetic_transcript(hours, words_per_minute=150, seed=0):
+    # Auto captions rarely have punctuation, so only every ~25 words ends a sentence
+    rng = random.Random(seed)
+    words = []
+    for i in range(int(hours * 60 * words_per_minute)):
+        word = rng.choice(WORDS)
+        words.append(word + "." if i % 25 == 24 else word)
+    return " ".join(words)
+
+
+def legacy_chunk_size(transcript):
+    # The character tiers main.py/app.py used before TokenChunker
+    length = len(transcript)
+    if length < 2000:
+        return length
+    elif length < 10000:
+        return 3000
+    elif length < 40000:
+        return 8000
+    else:
+        return 12000
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+if __name__ == "__main__":
+    preprocessor = Preprocessor()
+    chunker = TokenChunker(max_tokens=4000)
+    print(f"{'hours':>6} {'chars':>10} | {'legacy chunks':>13} {'legacy ms':>10} | {'token chunks':>12} {'token ms':>9}")
+    for hours in (0.1, 0.5, 1, 2, 5, 10):
+        text = synthetic_transcript(hours)
+        legacy, legacy_time = timed(lambda: preprocessor.chunk_transcript(text, chunk_size=legacy_chunk_size(text)))
+        packed, token_time = timed(lambda: chunker.chunk(text))
+        print(f"{hours:>6} {len(text):>10} | {len(legacy):>13} {legacy_time * 1000:>10.1f} | "
+              f"{len(packed):>12} {token_time * 1000:>9.1f}")
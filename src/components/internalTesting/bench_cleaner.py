@@ -0,0 +1,63 @@
+# Run from src/: python -m components.internalTesting.bench_cleaner
+import random
+import re
+import time
+import tracemalloc
+from components.preprocessor import Preprocessor
+from components.chunker import TokenChunker
+
+WORDS = ("so today we are going to talk about gradient descent and why the learning rate "
+         "matters a lot when you train neural networks on real data sets").split()
+NOISE = ["[Music]", "[Applause]", "[Laughter]", "00:01", "12:45", "1:02:03"]
+
+
+def synthetic_segments(hours, seed=0):
+    # Caption entries are ~2-3s each with ~6 words; some carry annotations or timestamps
+    rng = random.Random(seed)
+    segments = []
+    for _ in range(int(hours * 3600 / 2.5)):
+        words = [rng.choice(WORDS) for _ in range(6)]
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), rng.choice(NOISE))
+        segments.append(" ".join(words))
+    return segments
+
+
+def legacy_clean(patterns, text):
+    # One re.sub pass per pattern plus a split/join pass, as clean_transcript used to do
+    for pattern in patterns:
+        text = re.sub(pattern, "", text)
+    return ' '.join(text.split())
+
+
+def measure(fn, repeat=5):
+    # Best of repeat runs for time, then one run under tracemalloc (which slows everything down) for peak memory
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(elapsed), peak
+
+
+if __name__ == "__main__":
+    pre = Preprocessor()
+    chunker = TokenChunker(max_tokens=4000)
+    segments = synthetic_segments(10)
+    print(f"Synthetic 10h transcript: {len(segments)} segments, {sum(map(len, segments)) / 1e6:.1f}M chars")
+
+    legacy, t_legacy, m_legacy = measure(lambda: legacy_clean(pre.remove_patterns, " ".join(segments)))
+    compiled, t_compiled, m_compiled = measure(lambda: pre.clean_transcript(" ".join(segments)))
+    streamed, t_stream, m_stream = measure(lambda: list(chunker.iter_chunks(pre.iter_clean(segments))))
+
+    assert compiled == legacy, "clean_transcript output differs from legacy output"
+    assert " ".join(c.text for c in streamed).split() == legacy.split(), "streamed chunks lost text"
+
+    print(f"{'variant':<34} {'time ms':>9} {'peak MB':>9}")
+    print(f"{'legacy multi-pass (join + clean)':<34} {t_legacy * 1000:>9.1f} {m_legacy / 1e6:>9.1f}")
+    print(f"{'clean_transcript (join + clean)':<34} {t_compiled * 1000:>9.1f} {m_compiled / 1e6:>9.1f}")
+    print(f"{'streaming clean -> chunk':<34} {t_stream * 1000:>9.1f} {m_stream / 1e6:>9.1f}")
@@ -0,0 +1,36 @@
+# Run from src/: python -m components.internalTesting.bench_compress [--hours 1,3 --ratios 0.4,0.6]
+import argparse
+import sys
+import time
+from components.internalTesting.fakes import FakeTranscriptSource
+from components.preprocessor import Preprocessor
+from components.chunker import TokenChunker, estimate_tokens
+from components.compressor import ExtractiveCompressor, TEXTRANK, TFIDF
+from components.segments import SegmentStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Token reduction and time of local extractive chunk compression.")
+    parser.add_argument("--hours", type=lambda value: [float(v) for v in value.split(",")], default=[1, 3])
+    parser.add_argument("--ratios", type=lambda value: [float(v) for v in value.split(",")], default=[0.4, 0.6])
+    parser.add_argument("--chunk-tokens", type=int, default=4000)
+    args = parser.parse_args(argv)
+
+    source = FakeTranscriptSource()
+    for hours in args.hours:
+        store = SegmentStore.from_entries(source.get_transcript(FakeTranscriptSource.video_id(hours * 60)))
+        chunks = TokenChunker(max_tokens=args.chunk_tokens).chunk_texts(Preprocessor().clean_segments(store).text)
+        before = sum(estimate_tokens(chunk) for chunk in chunks)
+        for method in (TFIDF, TEXTRANK):
+            for ratio in args.ratios:
+                start = time.perf_counter()
+                compressed = ExtractiveCompressor(ratio=ratio, method=method).compress_many(chunks)
+                seconds = time.perf_counter() - start
+                after = sum(estimate_tokens(chunk) for chunk in compressed)
+                print(f"{hours:>4}h {method:<8} ratio={ratio:<4} chunks={len(chunks):<3} tokens {before} -> {after} "
+                      f"({1 - after / before:.0%} fewer) | {seconds * 1000 / hours:.1f}ms per transcript hour", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# Run from src/: python -m components.internalTesting.bench_dedup [--minutes 600 --unique-share 0.25]
+import argparse
+import random
+import sys
+import time
+from components.internalTesting.fakes import WORDS
+from components.planner import ExecutionPlanner
+
+
+def repetitive_transcript(minutes, unique_share, noise=0.01, seed=0):
+    """
+    About minutes * 150 words, like a looped livestream or a re-uploaded stream: unique_share of it is new
+    content and the rest replays that content from random points, with a small share of words changed
+    like auto captions do.
+    """
+    rng = random.Random(seed)
+    total = int(minutes * 150)
+    unique = [rng.choice(WORDS) + ("." if rng.random() < 0.1 else "") for _ in range(max(1, int(total * unique_share)))]
+    words = list(unique)
+    while len(words) < total:
+        replay = unique[rng.randrange(len(unique)):][:total - len(words)]
+        words.extend(rng.choice(WORDS) if rng.random() < noise else word for word in replay)
+    return " ".join(words)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Map calls and tokens saved by near-duplicate chunk detection.")
+    parser.add_argument("--minutes", type=int, default=600)
+    parser.add_argument("--unique-share", type=float, default=0.25, help="Share of blocks that are new content.")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--chunk-tokens", type=int, default=1500)
+    args = parser.parse_args(argv)
+
+    transcript = repetitive_transcript(args.minutes, args.unique_share)
+    settings = dict(single_shot_max_tokens=0, chunk_tokens=args.chunk_tokens, chunk_memo_entries=0)
+    baseline = ExecutionPlanner(**settings).plan(transcript)
+    start = time.perf_counter()
+    plan = ExecutionPlanner(dedup_threshold=args.threshold, **settings).plan(transcript)
+    plan_ms = (time.perf_counter() - start) * 1000
+    print(f"chunks={len(plan.chunks)} map_calls {baseline.map_calls} -> {plan.map_calls} "
+          f"({1 - plan.map_calls / baseline.map_calls:.0%} fewer) | input tokens "
+          f"{baseline.estimated_input_tokens} -> {plan.estimated_input_tokens} | plan with dedup {plan_ms:.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
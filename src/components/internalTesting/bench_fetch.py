@@ -0,0 +1,65 @@
+# Run from src/: python -m components.internalTesting.bench_fetch [--videos 40 --latency-ms 150 --workers 8]
+import argparse
+import sys
+import time
+from components.internalTesting import fake_transcript_server
+from components.internalTesting.fakes import FakeTranscriptSource
+from components.transcript_retriever import TranscriptRetriever, HTTPTranscriptSource
+
+
+def timed(server, run):
+    connections = server.connections
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start, server.connections - connections
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcript download time: serial vs pooled and parallel vs prefetch.")
+    parser.add_argument("--videos", type=int, default=40)
+    parser.add_argument("--minutes", type=int, default=30, help="Length of each fake video.")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Server time per transcript.")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel fetches.")
+    parser.add_argument("--llm-ms", type=float, default=300, help="Simulated LLM phase per video (prefetch run).")
+    args = parser.parse_args(argv)
+
+    server = fake_transcript_server.serve(FakeTranscriptSource(latency_ms=args.latency_ms))
+    url = f"http://127.0.0.1:{server.server_port}"
+    videos = [FakeTranscriptSource.url(args.minutes + i) for i in range(args.videos)]
+
+    def serial_fresh():
+        # The old behaviour: one retriever (and one connection) per video, one video after another
+        for video in videos:
+            TranscriptRetriever(video, source=HTTPTranscriptSource(url)).fetch_segments(video)
+
+    def pooled_parallel():
+        with TranscriptRetriever(source=HTTPTranscriptSource(url), max_workers=args.workers) as retriever:
+            retriever.fetch_many(videos)
+
+    def answer(retriever, prefetch):
+        for i, video in enumerate(videos):
+            retriever.fetch_segments(video)
+            if prefetch:
+                retriever.prefetch(videos[i + 1:i + 1 + prefetch])
+            time.sleep(args.llm_ms / 1000)
+
+    def serial_with_llm():
+        with TranscriptRetriever(source=HTTPTranscriptSource(url)) as retriever:
+            answer(retriever, 0)
+
+    def prefetch_with_llm():
+        with TranscriptRetriever(source=HTTPTranscriptSource(url), max_workers=2) as retriever:
+            answer(retriever, 2)
+
+    for label, run in (("serial, connection per video", serial_fresh),
+                       (f"pooled, {args.workers} in parallel", pooled_parallel),
+                       (f"fetch + {args.llm_ms:.0f}ms LLM, no prefetch", serial_with_llm),
+                       (f"fetch + {args.llm_ms:.0f}ms LLM, prefetch 2", prefetch_with_llm)):
+        elapsed, connections = timed(server, run)
+        print(f"{label:<34} videos={args.videos} time={elapsed * 1000:.0f}ms connections={connections}", flush=True)
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# Run from src/: python -m components.internalTesting.bench_import [--modules components.qa_engine,...] [--output imports.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+DEFAULT_MODULES = ["components.qa_engine", "components.planner", "components.main"]
+# Heavy optional SDKs that should only be imported when a backend actually needs them
+HEAVY_MODULES = ["google.generativeai", "google.genai"]
+
+
+def measure(module, repeat):
+    """
+    Imports module in repeat fresh interpreters and returns its cumulative import times (ms, from -X importtime)
+    and the heavy modules it pulled in.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    probe = f"import sys, json, {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    samples = []
+    loaded = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True,
+                                env=env, check=True)
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                samples.append(int(parts[1]) / 1000)
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    values = np.array(samples)
+    return {
+        "repeat": repeat,
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "min_ms": round(float(values.min()), 1),
+        "max_ms": round(float(values.max()), 1),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import time of pipeline modules, one fresh interpreter per run.")
+    parser.add_argument("--modules", type=lambda value: value.split(","), default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report here.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = {}
+    for module in args.modules:
+        report[module] = measure(module, args.repeat)
+        stats = report[module]
+        print(f"{module:<28} p50={stats['p50_ms']:.1f}ms min={stats['min_ms']:.1f}ms "
+              f"heavy={','.join(stats['heavy_modules_loaded']) or '-'}", flush=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
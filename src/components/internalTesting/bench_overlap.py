@@ -0,0 +1,84 @@
+# Run from src/: python -m components.internalTesting.bench_overlap [--durations 60,180,600 --latency-ms 200]
+import argparse
+import sys
+import time
+from components.internalTesting.bench_pipeline import build_engine
+from components.internalTesting.fakes import FakeTranscriptSource
+from components.transcript_retriever import TranscriptRetriever
+from components.preprocessor import Preprocessor
+from components.planner import ExecutionPlanner
+from components.pipeline import StreamingPipeline
+
+
+def timed_calls(engine):
+    """
+    Records the duration of every map call made through engine (wraps answer_question on the instance).
+    """
+    durations = []
+    answer_question = engine.answer_question
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return answer_question(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    engine.answer_question = timed
+    return durations
+
+
+def staged(segments, question, engine, planner, concurrency):
+    cleaned = Preprocessor().clean_segments(segments)
+    plan = planner.plan(cleaned, question)
+    return "".join(planner.execute_stream(plan, engine, max_concurrency=concurrency))
+
+
+def pipelined(segments, question, engine, planner, concurrency):
+    pipeline = StreamingPipeline(planner, max_concurrency=concurrency, preprocessor=Preprocessor())
+    return pipeline.run(segments, engine, question)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end latency: staged execution vs the overlapping pipeline.")
+    parser.add_argument("--durations", type=lambda value: [int(v) for v in value.split(",")], default=[60, 180, 600])
+    parser.add_argument("--latency-ms", type=float, default=200, help="Median fake LLM latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of the fake LLM latency.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--chunk-tokens", type=int, default=4000)
+    parser.add_argument("--reduce-fan-in", type=int, default=8)
+    parser.add_argument("--compress-ratio", type=float, default=None)
+    parser.add_argument("--question", default="")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    args.error_rate = args.rate_limit_rate = 0.0
+    args.max_retries = 3
+
+    source = FakeTranscriptSource(seed=args.seed)
+    planner = ExecutionPlanner(chunk_tokens=args.chunk_tokens, reduce_fan_in=args.reduce_fan_in,
+                               single_shot_max_tokens=args.chunk_tokens, compress_ratio=args.compress_ratio,
+                               chunk_memo_entries=0)
+    for minutes in args.durations:
+        url = FakeTranscriptSource.url(minutes)
+        segments = TranscriptRetriever(url, source=source).fetch_segments(url)
+        results = {}
+        for name, run in (("staged", staged), ("pipelined", pipelined)):
+            walls, bounds = [], []
+            for _ in range(args.repeat):
+                # A fresh engine per run, so no response comes from its cache
+                engine = build_engine(args)
+                durations = timed_calls(engine)
+                start = time.perf_counter()
+                run(segments, args.question, engine, planner, args.concurrency)
+                walls.append(time.perf_counter() - start)
+                bounds.append(max(durations, default=0.0))
+            results[name] = (sum(walls) / len(walls), sum(bounds) / len(bounds))
+        (staged_s, slowest_map), (pipelined_s, _) = results["staged"], results["pipelined"]
+        print(f"{minutes:>5}m staged={staged_s * 1000:.0f}ms pipelined={pipelined_s * 1000:.0f}ms "
+              f"({1 - pipelined_s / staged_s:.0%} faster) | slowest map call={slowest_map * 1000:.0f}ms", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# Run from src/: python -m components.internalTesting.bench_pipeline --output bench.json [--baseline old.json]
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from components.internalTesting.fakes import FakeGenerativeModel, FakeTranscriptSource
+from components.transcript_retriever import TranscriptRetriever
+from components.preprocessor import Preprocessor
+from components.planner import ExecutionPlanner, SINGLE_SHOT, SUMMARY_CHUNK_PROMPT
+from components.llm_backend import GenerativeModelBackend
+from components.qa_engine import QAEngine
+from components.rate_limiter import RateLimiter, CircuitBreaker, metrics
+
+STAGES = ("fetch", "clean", "chunk", "map", "reduce", "total")
+
+
+def build_engine(args):
+    # No quota buckets (the fake has no quota) but the limiter still honours 429 retry-after pauses
+    model = FakeGenerativeModel(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                                error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    return QAEngine(backend=GenerativeModelBackend(model, "fake-model"), max_retries=args.max_retries,
+                    base_delay=0.01, max_delay=0.5,
+                    limiter=RateLimiter(requests_per_minute=None, tokens_per_minute=None),
+                    breaker=CircuitBreaker(failure_threshold=1000))
+
+
+def run_once(url, question, engine, planner, source, concurrency):
+    """
+    Runs the whole pipeline for one video and returns the seconds spent per stage.
+    """
+    timings = {}
+    start = mark = time.perf_counter()
+
+    def lap(stage):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = now - mark
+        mark = now
+
+    segments = TranscriptRetriever(url, source=source).fetch_segments(url)
+    lap("fetch")
+    cleaned = Preprocessor().clean_segments(segments)
+    lap("clean")
+    plan = planner.plan(cleaned, question)
+    lap("chunk")
+    if plan.strategy == SINGLE_SHOT:
+        answers = [engine.answer_question(plan.chunks[0], question or "Summarize the video.", final=True)]
+    else:
+        answers = plan.fan_out(engine.answer_many([plan.chunks[idx] for idx in plan.map_chunks],
+                                                  question or SUMMARY_CHUNK_PROMPT, max_concurrency=concurrency))
+    lap("map")
+    planner.reduce(answers, question, engine, max_concurrency=concurrency)
+    lap("reduce")
+    timings["total"] = time.perf_counter() - start
+    return timings, plan
+
+
+def summarize(samples):
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def run_benchmark(args):
+    source = FakeTranscriptSource(latency_ms=args.fetch_latency_ms, seed=args.seed)
+    planner = ExecutionPlanner(single_shot_max_tokens=args.single_shot_max_tokens, chunk_tokens=args.chunk_tokens,
+                               reduce_fan_in=args.reduce_fan_in, chunk_memo_entries=0)
+    engine = build_engine(args)
+    results = {}
+    wall_start = time.perf_counter()
+    videos = 0
+    for minutes in args.durations:
+        samples = {stage: [] for stage in STAGES}
+        calls_before = engine.model.calls
+        for _ in range(args.repeat):
+            timings, plan = run_once(FakeTranscriptSource.url(minutes), args.question, engine, planner, source,
+                                     args.concurrency)
+            for stage in STAGES:
+                samples[stage].append(timings[stage])
+            videos += 1
+        total = sum(samples["total"])
+        results[f"{minutes}m"] = {
+            "strategy": plan.strategy,
+            "chunks": len(plan.chunks),
+            "llm_calls_per_run": (engine.model.calls - calls_before) / args.repeat,
+            "stages": {stage: summarize(samples[stage]) for stage in STAGES},
+            "transcript_minutes_per_second": round(minutes * args.repeat / total, 2) if total else None,
+        }
+        print(f"{minutes:>6}m {plan.strategy:<13} chunks={len(plan.chunks):<4} "
+              + " ".join(f"{stage}={results[f'{minutes}m']['stages'][stage]['p50_ms']:.1f}ms" for stage in STAGES),
+              flush=True)
+    wall = time.perf_counter() - wall_start
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": results,
+        "throughput": {
+            "videos_per_minute": round(videos / wall * 60, 2),
+            "llm_calls_per_second": round(engine.model.calls / wall, 2),
+            "llm_failures": engine.model.failures,
+        },
+        "retry_metrics": metrics(),
+    }
+
+
+def compare(report, baseline, tolerance=0.2, min_delta_ms=2.0):
+    """
+    Returns a list of regressions: stages whose p50 or p95 grew by more than tolerance (and min_delta_ms)
+    compared with the baseline report. Durations or stages missing from either report are skipped.
+    """
+    regressions = []
+    for duration, result in report["results"].items():
+        base = baseline.get("results", {}).get(duration)
+        if base is None:
+            continue
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats is None:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                old, new = base_stats[key], stats[key]
+                if new - old > min_delta_ms and new > old * (1 + tolerance):
+                    regressions.append(f"{duration} {stage} {key}: {old:.1f} -> {new:.1f} ms (+{(new / old - 1) * 100:.0f}%)"
+                                       if old else f"{duration} {stage} {key}: {old:.1f} -> {new:.1f} ms")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark (fake LLM and transcripts).")
+    parser.add_argument("--durations", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[1, 10, 60, 180, 600], help="Comma separated video lengths in minutes.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per video length.")
+    parser.add_argument("--question", default="", help="Question to ask (default: summary).")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Median fake LLM latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of the fake LLM latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls failing with 503.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls failing with 429.")
+    parser.add_argument("--fetch-latency-ms", type=float, default=0, help="Fake transcript fetch latency.")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chunk-tokens", type=int, default=4000)
+    parser.add_argument("--single-shot-max-tokens", type=int, default=100_000)
+    parser.add_argument("--reduce-fan-in", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here.")
+    parser.add_argument("--baseline", help="Earlier JSON report; exit with status 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs baseline (0.2 = 20%%).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    print(json.dumps(report["throughput"]))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), tolerance=args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# Run from src/: python -m components.internalTesting.bench_segments
+import gc
+import random
+import tracemalloc
+from components.segments import SegmentStore
+
+WORDS = ("so today we are going to talk about gradient descent and why the learning rate "
+         "matters a lot when you train neural networks on real data sets").split()
+
+
+def synthetic_entries(hours, seed=0):
+    # Caption entries as youtube-transcript-api returns them: ~2.5s and ~6 words each
+    rng = random.Random(seed)
+    return [
+        {'text': " ".join(rng.choice(WORDS) for _ in range(6)), 'start': i * 2.5, 'duration': 2.5 + rng.random()}
+        for i in range(int(hours * 3600 / 2.5))
+    ]
+
+
+def retained_bytes(build):
+    # Memory still held by the built object once temporary allocations are gone
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+if __name__ == "__main__":
+    print(f"{'hours':>6} {'segments':>9} | {'list of dicts MB':>16} {'SegmentStore MB':>16} {'ratio':>6}")
+    for hours in (1, 5, 10):
+        # Build from plain tuples so neither side shares string objects with the other
+        rows = [(e['text'], e['start'], e['duration']) for e in synthetic_entries(hours)]
+        dicts, dict_bytes = retained_bytes(
+            lambda: [{'text': "".join(t), 'start': s, 'duration': d} for t, s, d in rows])
+        del dicts
+        store, store_bytes = retained_bytes(
+            lambda: SegmentStore([t for t, _, _ in rows], [s for _, s, _ in rows], [d for _, _, d in rows]))
+        print(f"{hours:>6} {len(rows):>9} | {dict_bytes / 1e6:>16.2f} {store_bytes / 1e6:>16.2f} "
+              f"{dict_bytes / store_bytes:>6.1f}x")
@@ -0,0 +1,71 @@
+# Run from src/: python -m components.internalTesting.fake_llm_server --port 8088 [--latency-ms 50 --rate-limit-rate 0.05]
+# then point the app at it: QA_MAP_MODEL=http://127.0.0.1:8088/generate
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from components.internalTesting.fakes import FakeGenerativeModel
+
+
+def serve(model=None, port=0, host="127.0.0.1"):
+    """
+    Serves the HTTPBackend contract (POST /generate {"model", "prompt"} -> {"text"}) from a daemon thread,
+    answering with a FakeGenerativeModel: same latency, error and 429 behaviour, reported as HTTP statuses
+    (429 with a Retry-After header). Returns the server; its URL is f"http://{host}:{server.server_port}/generate".
+    """
+    model = model or FakeGenerativeModel()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/generate":
+                self.send_error(404)
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                status, headers, body = 200, {}, {"text": model.generate_content(request["prompt"]).text}
+            except (KeyError, ValueError) as e:
+                status, headers, body = 400, {}, {"error": f"Bad request: {e}"}
+            except Exception as e:
+                status = getattr(e, "code", None) or 500
+                headers = {"Retry-After": str(model.retry_after)} if status == 429 else {}
+                body = {"error": str(e)}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in LLM served over HTTP (for HTTPBackend).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    model = FakeGenerativeModel(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                                error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    server = serve(model, port=args.port, host=args.host)
+    print(f"Fake LLM listening on http://{args.host}:{server.server_port}/generate (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Run from src/: python -m components.internalTesting.fake_transcript_server --port 8089 [--latency-ms 200]
+# then point the app at it: QA_TRANSCRIPT_SOURCE=http://127.0.0.1:8089
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+from components.internalTesting.fakes import FakeTranscriptSource
+
+
+def serve(source=None, languages=("en",), port=0, host="127.0.0.1"):
+    """
+    Serves the HTTPTranscriptSource contract (GET /transcripts/<id> -> {"languages"},
+    GET /transcripts/<id>/<code> -> {"entries"}) from a daemon thread, with FakeTranscriptSource transcripts in
+    every one of languages. Video IDs starting with "missing" get 404. Connections are kept alive (HTTP/1.1);
+    server.connections counts the ones opened and server.requests the requests served.
+    Returns the server; its URL is f"http://{host}:{server.server_port}".
+    """
+    source = source or FakeTranscriptSource()
+    languages = list(languages)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with lock:
+                server.connections += 1
+
+        def do_GET(self):
+            with lock:
+                server.requests += 1
+            parts = [unquote(part) for part in self.path.strip("/").split("/")]
+            if len(parts) not in (2, 3) or parts[0] != "transcripts" or parts[1].startswith("missing"):
+                status, body = 404, {"error": "Not found"}
+            elif len(parts) == 2:
+                status, body = 200, {"languages": languages}
+            elif parts[2] in languages:
+                status, body = 200, {"entries": source.get_transcript(parts[1])}
+            else:
+                status, body = 404, {"error": f"No {parts[2]} transcript"}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.connections = server.requests = 0
+    threading.Thread(target=server.serve_forever, name="fake-transcript-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in transcript server (for HTTPTranscriptSource).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Time to produce each transcript.")
+    parser.add_argument("--languages", default="en", help="Comma separated languages every video has.")
+    args = parser.parse_args(argv)
+    server = serve(FakeTranscriptSource(latency_ms=args.latency_ms), languages=args.languages.split(","),
+                   port=args.port, host=args.host)
+    print(f"Fake transcripts on http://{args.host}:{server.server_port}/transcripts/<video_id> (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
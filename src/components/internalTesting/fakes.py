@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+
+# Question ids of a batched prompt (qa_engine.build_batch_prompt)
+BATCH_JOB_ID = re.compile(r'^"(j\d+)" \(about chunk', re.MULTILINE)
+
+WORDS = ("so today we are going to talk about gradient descent and why the learning rate "
+         "matters a lot when you train neural networks on real data sets").split()
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Offline stand-in for genai.GenerativeModel with a deterministic (seeded) behaviour:
+    - latency is log-normal around latency_ms (median), spread by latency_sigma;
+    - error_rate of calls raise ServiceUnavailable, rate_limit_rate raise ResourceExhausted (429)
+      with a "retry in Ns" hint, like the real API;
+    - the answer text depends only on the prompt, so response caches behave as with the real model;
+    - batched prompts get a JSON object with one answer per question id, leaving out batch_miss_rate of them.
+    Use it with `QAEngine(backend=GenerativeModelBackend(FakeGenerativeModel(...), name))`, or over HTTP
+    through fake_llm_server.
+    """
+
+    def __init__(self, latency_ms=50, latency_sigma=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=0.05, answer_words=60, batch_miss_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.answer_words = answer_words
+        self.batch_miss_rate = batch_miss_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def _draw(self):
+        # One locked draw per call keeps runs reproducible for a given call order
+        with self.lock:
+            self.calls += 1
+            latency = self.latency_ms / 1000 * math.exp(self.rng.gauss(0, self.latency_sigma)) if self.latency_ms else 0.0
+            roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            error = google_exceptions.ResourceExhausted(f"Quota exceeded. Please retry in {self.retry_after}s.")
+        elif roll < self.rate_limit_rate + self.error_rate:
+            error = google_exceptions.ServiceUnavailable("The model is overloaded.")
+        else:
+            error = None
+        if error is not None:
+            with self.lock:
+                self.failures += 1
+        return latency, error
+
+    def _answer(self, prompt):
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        rng = random.Random(digest)
+        job_ids = BATCH_JOB_ID.findall(prompt)
+        if job_ids:
+            return json.dumps({job_id: " ".join(rng.choice(WORDS) for _ in range(self.answer_words)) + "."
+                               for job_id in job_ids if rng.random() >= self.batch_miss_rate})
+        return " ".join(rng.choice(WORDS) for _ in range(self.answer_words)) + "."
+
+    def generate_content(self, prompt, stream=False):
+        latency, error = self._draw()
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        text = self._answer(prompt)
+        if stream:
+            words = text.split(" ")
+            return [FakeResponse(" ".join(words[i:i + 8]) + " ") for i in range(0, len(words), 8)]
+        return FakeResponse(text)
+
+    async def generate_content_async(self, prompt):
+        latency, error = self._draw()
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return FakeResponse(self._answer(prompt))
+
+
+class FakeTranscriptSource:
+    """
+    Offline stand-in for YouTubeTranscriptApi (pass as TranscriptRetriever(source=...)).
+    The video ID decides the length: "fake-90m" is a 90 minute transcript, "fake-10h" a 10 hour one.
+    Entries look like auto captions: ~2.5s, ~6 words, occasional [Music] and timestamps.
+    """
+
+    def __init__(self, latency_ms=0, seconds_per_entry=2.5, seed=0):
+        self.latency_ms = latency_ms
+        self.seconds_per_entry = seconds_per_entry
+        self.seed = seed
+
+    @staticmethod
+    def video_id(minutes):
+        return f"fake-{int(minutes)}m"
+
+    @staticmethod
+    def url(minutes):
+        return f"https://www.youtube.com/watch?v={FakeTranscriptSource.video_id(minutes)}"
+
+    @staticmethod
+    def minutes(video_id):
+        value = video_id.rsplit("-", 1)[-1]
+        return float(value[:-1]) * 60 if value.endswith("h") else float(value.rstrip("m"))
+
+    def get_transcript(self, video_id):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        rng = random.Random(f"{self.seed}:{video_id}")
+        entries = []
+        for i in range(int(self.minutes(video_id) * 60 / self.seconds_per_entry)):
+            words = [rng.choice(WORDS) for _ in range(6)]
+            if rng.random() < 0.05:
+                words.insert(rng.randrange(len(words)), rng.choice(["[Music]", "[Applause]", "12:45"]))
+            if rng.random() < 0.2:
+                words[-1] += "."
+            entries.append({'text': " ".join(words), 'start': i * self.seconds_per_entry,
+                            'duration': self.seconds_per_entry})
+        return entries
@@ -0,0 +1,121 @@
+# Run from src/: python -m components.internalTesting.load_test [--clients 32 --videos 4 --latency-ms 100]
+# or against a running service: python -m components.internalTesting.load_test --target http://127.0.0.1:8080
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from components.internalTesting import fake_llm_server
+from components.internalTesting.fakes import FakeGenerativeModel, FakeTranscriptSource
+from components.llm_backend import HTTPBackend
+from components.planner import ExecutionPlanner
+from components.qa_engine import QAEngine
+from components.rate_limiter import RateLimiter, CircuitBreaker
+from components.server import SummaryService, make_server
+
+
+def start_service(args):
+    """
+    Starts the fake LLM over HTTP and the service in-process against it; returns (base URL, fake model, stop).
+    """
+    model = FakeGenerativeModel(latency_ms=args.latency_ms, latency_sigma=0.3, seed=args.seed)
+    llm_server = fake_llm_server.serve(model)
+    engine = QAEngine(backend=HTTPBackend(f"http://127.0.0.1:{llm_server.server_port}/generate", "fake-model"),
+                      base_delay=0.01, max_delay=0.5,
+                      limiter=RateLimiter(requests_per_minute=None, tokens_per_minute=None),
+                      breaker=CircuitBreaker(failure_threshold=1000))
+    planner = ExecutionPlanner(chunk_tokens=args.chunk_tokens, single_shot_max_tokens=args.chunk_tokens)
+    service = SummaryService(planner, engine, source=FakeTranscriptSource(latency_ms=args.fetch_ms, seed=args.seed),
+                             workers=args.workers, queue_size=args.queue_size,
+                             map_concurrency=args.map_concurrency).start()
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, name="service", daemon=True).start()
+
+    def stop():
+        service.shutdown(drain_seconds=5)
+        server.shutdown()
+        llm_server.shutdown()
+
+    return f"http://127.0.0.1:{server.server_port}", model, stop
+
+
+def ask(base, video_id, question, stats, lock):
+    """
+    Submits one job (retrying on 503 after Retry-After) and reads its streamed answer; returns the latency.
+    """
+    start = time.perf_counter()
+    body = json.dumps({"video_id": video_id, "question": question}).encode("utf-8")
+    while True:
+        request = urllib.request.Request(f"{base}/jobs", data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                job = json.loads(response.read())
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            with lock:
+                stats["rejected"] += 1
+            time.sleep(float(e.headers.get("Retry-After", 1)))
+    with urllib.request.urlopen(f"{base}/jobs/{job['job_id']}/stream", timeout=300) as response:
+        answer = response.read().decode("utf-8")
+    with lock:
+        stats["coalesced"] += job["coalesced"]
+        stats["errors"] += "[ERROR]" in answer
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent clients against the summarization service.")
+    parser.add_argument("--target", help="Base URL of a running service (default: start one against the fake LLM).")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=2, help="Requests per client.")
+    parser.add_argument("--videos", type=int, default=4, help="Distinct videos the clients ask about.")
+    parser.add_argument("--minutes", type=int, default=60, help="Length of the fake videos.")
+    parser.add_argument("--question", default="")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Median fake LLM latency.")
+    parser.add_argument("--fetch-ms", type=float, default=200, help="Fake transcript download time.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--map-concurrency", type=int, default=8)
+    parser.add_argument("--chunk-tokens", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    model, stop = None, None
+    base = args.target.rstrip("/") if args.target else None
+    if base is None:
+        base, model, stop = start_service(args)
+    rng = random.Random(args.seed)
+    # Fake video IDs give the transcript length; distinct lengths make distinct videos
+    videos = [FakeTranscriptSource.video_id(args.minutes + i) for i in range(args.videos)]
+    picks = [[rng.choice(videos) for _ in range(args.requests)] for _ in range(args.clients)]
+    stats, lock = {"rejected": 0, "coalesced": 0, "errors": 0}, threading.Lock()
+
+    def client(video_ids):
+        return [ask(base, video_id, args.question, stats, lock) for video_id in video_ids]
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            latencies = np.array([latency for result in pool.map(client, picks) for latency in result]) * 1000
+    finally:
+        if stop is not None:
+            stop()
+    elapsed = time.perf_counter() - start
+    print(f"requests={len(latencies)} clients={args.clients} videos={args.videos} time={elapsed:.2f}s "
+          f"throughput={len(latencies) / elapsed:.1f} req/s")
+    print(f"latency p50={np.percentile(latencies, 50):.0f}ms p95={np.percentile(latencies, 95):.0f}ms "
+          f"max={latencies.max():.0f}ms")
+    print(f"coalesced={stats['coalesced']} rejected(503)={stats['rejected']} errors={stats['errors']}"
+          + (f" llm_calls={model.calls}" if model else ""))
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
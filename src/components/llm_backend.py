@@ -0,0 +1,113 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+from logger import logging
+from exception import CustomException
+
+DEFAULT_MODEL = 'gemini-2.5-flash'
+
+
+class LLMBackend:
+    """
+    What QAEngine needs from a model: generate(prompt) -> text.
+    name identifies the model in response cache keys, spans and logs.
+    stream() and generate_async() fall back to generate() unless a backend has something better.
+    """
+
+    name = "llm"
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        yield self.generate(prompt)
+
+    async def generate_async(self, prompt):
+        return await asyncio.to_thread(self.generate, prompt)
+
+
+class GenerativeModelBackend(LLMBackend):
+    """
+    Backend over any object with the genai.GenerativeModel interface
+    (generate_content, generate_content_async), e.g. the offline FakeGenerativeModel.
+    """
+
+    def __init__(self, model, name):
+        self.model = model
+        self.name = name
+
+    @staticmethod
+    def _response_text(response):
+        if hasattr(response, "text"):
+            return response.text
+        return response.candidates[0]['content']['parts'][0]['text']  # fallback for other model, dig into the nested structure of the raw API response object:
+
+    def generate(self, prompt):
+        return self._response_text(self.model.generate_content(prompt))
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except (AttributeError, ValueError):
+                # Chunks without text parts (e.g. only safety metadata) are skipped
+                continue
+            if text:
+                yield text
+
+    async def generate_async(self, prompt):
+        return self._response_text(await self.model.generate_content_async(prompt))
+
+
+class GeminiBackend(GenerativeModelBackend):
+    """
+    Google Gemini through google-generativeai. The SDK is imported here rather than at module level:
+    it takes about a second to import, which CLI startup, test collection and non-Gemini backends should not pay.
+    """
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        try:
+            model = genai.GenerativeModel(model_name)
+        except Exception as e:
+            logging.error("Failed to initialize Gemini model: %s", e)
+            raise CustomException(f"Model initialization failed: {e}")
+        super().__init__(model, model_name)
+
+
+class HTTPBackend(LLMBackend):
+    """
+    Model behind a minimal JSON endpoint: POST url {"model": name, "prompt": prompt} -> {"text": answer}.
+    Used with the local stand-in server (components.internalTesting.fake_llm_server) for tests and load tests,
+    or any self-hosted model wrapped in the same contract. HTTP errors are raised as urllib HTTPError, whose
+    status code and Retry-After header drive the engine's retry and rate limiting like a Gemini API error.
+    """
+
+    def __init__(self, url, model_name=None, timeout=120):
+        self.url = url
+        self.name = model_name or url
+        self.timeout = timeout
+
+    def generate(self, prompt):
+        body = json.dumps({"model": self.name, "prompt": prompt}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        if "text" not in data:
+            raise CustomException(f"HTTP backend {self.url} returned no text: {data.get('error', data)}")
+        return data["text"]
+
+
+def create_backend(model=DEFAULT_MODEL, api_key=None):
+    """
+    Backend for a model spec: an LLMBackend is returned as is, an http(s):// URL gives an HTTPBackend
+    (an optional "#name" suffix names the model), anything else is a Gemini model name.
+    """
+    if isinstance(model, LLMBackend):
+        return model
+    if model.startswith(("http://", "https://")):
+        url, _, name = model.partition("#")
+        return HTTPBackend(url, model_name=name or None)
+    return GeminiBackend(api_key, model)
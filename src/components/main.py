@@ -1,110 +1,209 @@
+import argparse
 import os
 import sys
-from logger import logging
-from exception import CustomException
 from dotenv import load_dotenv
+# .env is loaded first: the logger, the components and this module read their settings at import time
+load_dotenv()
+from logger import logging, setup_logging
+from exception import CustomException, InvalidYouTubeURLError
 from components.transcript_retriever import TranscriptRetriever
+from components.cache import TranscriptCache, ResponseCache
 from components.preprocessor import Preprocessor
-from components.qa_engine import QAEngine
-
-def determine_chunk_size(transcript: str) -> int:
-    length = len(transcript)
-    if length < 2000:
-        return length  # No chunking 
-    elif length < 10000:
-        return 3000
-    elif length < 40000:
-        return 8000
-    else:
-        return 12000  
-
-def is_broad_question(question: str) -> bool:
-    if not question.strip():
-        return True
-    broad_keywords = [
-        "summary", "summarize", "main idea", "what is this video about", "overview",
-        "overall", "topic", "objective", "agenda", "explain the video", "what happened",
-        "components", "describe", "main points", "highlights", "structure", "key points"
-    ]
-    q_lower = question.lower()
-    return any(kw in q_lower for kw in broad_keywords)
+from components.qa_engine import QAEngine, DEFAULT_MODEL
+from components.planner import ExecutionPlanner
+from components.pipeline import StreamingPipeline
+from components.session import VideoSession
+from components.metrics import registry, bind
+
+# Map and reduce models (the engine reads the same settings); the planner sizes its prompts for them
+MAP_MODEL = os.getenv("QA_MAP_MODEL") or DEFAULT_MODEL
+REDUCE_MODEL = os.getenv("QA_REDUCE_MODEL") or MAP_MODEL
+# Number of chunk calls sent to the LLM at the same time during the map step
+MAX_CONCURRENCY = int(os.getenv("QA_MAX_CONCURRENCY", "4"))
+# Number of best matching chunks sent to the LLM for specific (non-broad) questions
+TOP_K_CHUNKS = int(os.getenv("QA_TOP_K_CHUNKS", "3"))
+# Token budget per chunk and how many tokens consecutive chunks share
+CHUNK_TOKENS = int(os.getenv("QA_CHUNK_TOKENS", "4000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("QA_CHUNK_OVERLAP_TOKENS", "0"))
+# Latency budget: transcripts up to this many tokens are answered in one call
+SINGLE_SHOT_MAX_TOKENS = int(os.getenv("QA_SINGLE_SHOT_MAX_TOKENS", "100000"))
+# Cost budget: upper bound on LLM calls per question (0 = no limit)
+MAX_LLM_CALLS = int(os.getenv("QA_MAX_LLM_CALLS", "0")) or None
+# Tree reduce: how many partial answers one reduce call merges
+REDUCE_FAN_IN = int(os.getenv("QA_REDUCE_FAN_IN", "8"))
+# Near-duplicate chunks at or above this MinHash similarity reuse one answer (0 = off)
+DEDUP_THRESHOLD = float(os.getenv("QA_DEDUP_THRESHOLD", "0.85"))
+# Summaries only: keep this share of each chunk's tokens (its most informative sentences) before the map call
+COMPRESS_RATIO = float(os.getenv("QA_COMPRESS_RATIO", "0")) or None
+COMPRESS_METHOD = os.getenv("QA_COMPRESS_METHOD", "textrank")
+# Map jobs whose chunk has at most QA_BATCH_JOB_MAX_TOKENS tokens are packed into shared requests of up to
+# QA_BATCH_MAX_TOKENS tokens that answer in JSON (0 = one request per job)
+BATCH_MAX_TOKENS = int(os.getenv("QA_BATCH_MAX_TOKENS", "16000")) or None
+BATCH_JOB_MAX_TOKENS = int(os.getenv("QA_BATCH_JOB_MAX_TOKENS", "2000"))
+# Summaries of long videos: chunk, map and reduce as overlapping stages (0 = one stage after another)
+PIPELINE = os.getenv("QA_PIPELINE", "1") != "0"
+# Chunks the pipeline keeps ready for the map workers (0 = twice QA_MAX_CONCURRENCY)
+PIPELINE_QUEUE_SIZE = int(os.getenv("QA_PIPELINE_QUEUE_SIZE", "0")) or None
+
+def build_planner():
+    return ExecutionPlanner(
+        model_name=MAP_MODEL,
+        reduce_model_name=REDUCE_MODEL,
+        chunk_tokens=CHUNK_TOKENS,
+        overlap_tokens=CHUNK_OVERLAP_TOKENS,
+        top_k=TOP_K_CHUNKS,
+        single_shot_max_tokens=SINGLE_SHOT_MAX_TOKENS,
+        max_calls=MAX_LLM_CALLS,
+        reduce_fan_in=REDUCE_FAN_IN,
+        dedup_threshold=DEDUP_THRESHOLD,
+        compress_ratio=COMPRESS_RATIO,
+        compress_method=COMPRESS_METHOD,
+    )
+
+def build_engine(api_key):
+    return QAEngine(api_key=api_key, cache=ResponseCache(), batch_max_tokens=BATCH_MAX_TOKENS,
+                    batch_job_max_tokens=BATCH_JOB_MAX_TOKENS)
+
+def build_pipeline(planner, preprocessor=None):
+    return StreamingPipeline(planner, max_concurrency=MAX_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE,
+                             preprocessor=preprocessor)
+
+def print_progress(done, total):
+    end = "\n" if done == total else ""
+    print(f"\r    chunks answered: {done}/{total}", end=end, flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize or ask questions about a YouTube video.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only print the execution plan (strategy, estimated calls and tokens).")
+    parser.add_argument("--metrics-out", default=os.getenv("METRICS_EXPORT_PATH"),
+                        help="Write per-stage metrics and spans here (*.json for JSON, Prometheus text otherwise).")
+    parser.add_argument("-q", "--question", action="append", dest="questions", metavar="QUESTION",
+                        help="Question to ask instead of the prompt; repeat for several questions, which share one "
+                             "pass over the transcript (\"\" asks for a summary).")
+    return parser.parse_args(argv)
+
+def require_api_key():
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        logging.error("GEMINI_API_KEY not found — set it in .env or environment.")
+        print("[ERROR] GEMINI_API_KEY not found.")
+        sys.exit(1)
+    return api_key
+
+def run_session(args, raw_segments, questions):
+    """
+    Several questions about one video: every chunk is sent once with all questions that need it,
+    then each question gets its own reduce.
+    """
+    try:
+        cleaned_segments = Preprocessor().clean_segments(raw_segments)
+    except Exception as e:
+        logging.error("Preprocessing failed: %s", e)
+        print(f"[ERROR] Preprocessing failed: {e}")
+        sys.exit(1)
+
+    planner = build_planner()
+    session = VideoSession(cleaned_segments, planner, engine=None, max_concurrency=MAX_CONCURRENCY)
+    plans = session.plan(questions)
+    for number, plan in enumerate(plans, 1):
+        print(f"\n--- Execution plan, question {number}: {plan.question or 'summary'} ---")
+        print(plan.describe())
+    if args.dry_run:
+        logging.info("Dry run requested; skipping LLM calls.")
+        return
+
+    session.engine = build_engine(require_api_key())
+    print(f"\n--- Answering {len(questions)} questions in one pass over the transcript, "
+          f"up to {MAX_CONCURRENCY} chunk(s) at a time ---")
+    answers = session.answer_plans(plans, on_progress=print_progress)
+    for number, (plan, answer) in enumerate(zip(plans, answers), 1):
+        print(f"\n=== ANSWER {number}: {plan.question or 'summary'} ===\n")
+        print(answer)
 
 def main():
+    args = parse_args()
+    setup_logging()
     try:
         url = input("Paste YouTube URL: ").strip()
-        question = input("Enter your question (leave blank for summary): ").strip()
+        questions = [question.strip() for question in args.questions] if args.questions else \
+            [input("Enter your question (leave blank for summary): ").strip()]
+        question = questions[0]
 
-        load_dotenv()
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            logging.error("GEMINI_API_KEY not found — set it in .env or environment.")
-            print("[ERROR] GEMINI_API_KEY not found.")
-            sys.exit(1)
-        
-        logging.info(f"Processing video at: {url}")
+        logging.info("Processing video at: %s", url)
 
         # Step 1: Retrieve Transcript
-        retriever = TranscriptRetriever(url)
+        retriever = TranscriptRetriever(url, cache=TranscriptCache())
         try:
-            raw_transcript = retriever.fetch_transcript(url)
-            logging.info(f"Transcript successfully retrieved. Length: {len(raw_transcript)} characters.")
-        except Exception as e:
-            logging.error(f"Could not retrieve transcript: {e}")
-            print(f"[ERROR] Could not retrieve transcript: {e}")
-            sys.exit(1)
-
-        # Step 2: Preprocess (clean & chunk)
-        preprocessor = Preprocessor()
+            # Every metrics span of this run is labelled with the video
+            bind(video_id=retriever.fetch_uid_yt(url))
+        except InvalidYouTubeURLError:
+            pass
         try:
-            cleaned_transcript = preprocessor.clean_transcript(raw_transcript)
-            chunk_size = determine_chunk_size(cleaned_transcript)
-            logging.info(f"Dynamic chunk size determined: {chunk_size}")
-            chunks = preprocessor.chunk_transcript(cleaned_transcript, chunk_size=chunk_size)
-            logging.info(f"Transcript split into {len(chunks)} chunk(s).")
+            # Segments keep each caption's timing, so chunks can be traced back to the video
+            raw_segments = retriever.fetch_segments(url)
+            logging.info("Transcript successfully retrieved. Segments: %d | Length: %d characters.",
+                         len(raw_segments), len(raw_segments.text))
         except Exception as e:
-            logging.error(f"Preprocessing failed: {e}")
-            print(f"[ERROR] Preprocessing failed: {e}")
+            logging.error("Could not retrieve transcript: %s", e)
+            print(f"[ERROR] Could not retrieve transcript: {e}")
             sys.exit(1)
-        
-        engine = QAEngine(api_key=api_key)
 
-        if is_broad_question(question):
+        if len(questions) > 1:
             try:
-                logging.info("Triggering map-reduce summarization for broad question.")
-                chunk_answers = []
-                prompt_for_chunk = question.strip() or "Give a concise summary of this transcript section."
-                for idx, chunk in enumerate(chunks, 1):
-                    print(f"\n--- Processing chunk {idx}/{len(chunks)} ---")
-                    ans = engine.answer_question(chunk, prompt_for_chunk)
-                    chunk_answers.append(ans)
-                # Map step complete; reduce for single answer
-                combined_answers = "\n\n".join(chunk_answers)
-                reduce_prompt = (
-                    f"Given these answers or explanations to the question '{question.strip() or 'Summarize the video'}' "
-                    f"about a video's transcript, combine all information into a single, clear, non-redundant answer. "
-                    f"Highlight all main points, remove repetitions, and provide a comprehensive response as if answering a user in one go.\n\n"
-                    f"{combined_answers}"
-                )
-                summary = engine.summarize_transcript(reduce_prompt)
-                print("\n=== UNIFIED FINAL ANSWER ===\n")
-                print(summary)
+                run_session(args, raw_segments, questions)
             except Exception as e:
-                logging.error(f"Unified summarization failed: {e}")
-                print(f"[ERROR] Unified summarization failed: {e}")
+                logging.error("Answering failed: %s", e)
+                print(f"[ERROR] Answering failed: {e}")
+            return
+
+        planner = build_planner()
+        preprocessor = Preprocessor()
+        pipeline = build_pipeline(planner, preprocessor)
+        pipelined = PIPELINE and not args.dry_run and pipeline.applies(raw_segments, question)
+        if pipelined:
+            # Steps 2-3 run inside the pipeline: chunks go to the LLM while the rest is still being cleaned and chunked
+            print("\n--- Execution plan ---")
+            print("Strategy: pipelined (clean, chunk, map and reduce overlap; chunks are answered as they are produced)")
         else:
-            answers = []
-            logging.info("Triggering per-chunk Q&A mode.")
-            for idx, chunk in enumerate(chunks, 1):
-                try:
-                    print(f"\n--- Processing chunk {idx}/{len(chunks)} ---")
-                    ans = engine.answer_question(chunk, question)
-                    answers.append(ans)
-                except Exception as e:
-                    logging.warning(f"Q&A failed for chunk {idx}: {e}")
-                    answers.append(f"[ERROR] Chunk {idx} failed: {e}")
-            print("\n=== RELEVANT ANSWERS ===\n")
-            for idx, ans in enumerate(answers, 1):
-                print(f"Chunk {idx}: {ans}")
+            # Step 2: Preprocess (clean)
+            try:
+                cleaned_segments = preprocessor.clean_segments(raw_segments)
+            except Exception as e:
+                logging.error("Preprocessing failed: %s", e)
+                print(f"[ERROR] Preprocessing failed: {e}")
+                sys.exit(1)
+
+            # Step 3: Plan (single-shot / map-reduce / hierarchical) and chunk accordingly
+            plan = planner.plan(cleaned_segments, question)
+            print("\n--- Execution plan ---")
+            print(plan.describe())
+            if args.dry_run:
+                logging.info("Dry run requested; skipping LLM calls.")
+                return
+
+        # Step 4: Execute the plan
+        engine = build_engine(require_api_key())
+        try:
+            if pipelined:
+                print(f"\n--- Processing chunks as they are produced, up to {MAX_CONCURRENCY} at a time ---")
+                stream = pipeline.stream(raw_segments, engine, question, on_progress=print_progress)
+            else:
+                if plan.map_calls > 1:
+                    print(f"\n--- Processing {plan.map_calls} chunk(s), up to {MAX_CONCURRENCY} at a time ---")
+                stream = planner.execute_stream(plan, engine, max_concurrency=MAX_CONCURRENCY,
+                                                on_progress=print_progress)
+            header_printed = False
+            # The final answer is printed as the model writes it
+            for piece in stream:
+                if not header_printed:
+                    print("\n=== UNIFIED FINAL ANSWER ===\n" if pipelined or plan.broad else "\n=== ANSWER ===\n")
+                    header_printed = True
+                print(piece, end="", flush=True)
+            print()
+        except Exception as e:
+            logging.error("Answering failed: %s", e)
+            print(f"[ERROR] Answering failed: {e}")
 
         logging.info("Pipeline execution completed.")
         
@@ -112,9 +211,12 @@ def main():
         print("\n[INFO] Exiting on user request.")
         logging.info("Execution interrupted by user.")
     except Exception as e:
-        logging.error(f"Pipeline crashed: {e}", exc_info=True)
+        logging.error("Pipeline crashed: %s", e, exc_info=True)
         print(f"\n[CRITICAL ERROR] {e}")
         sys.exit(2)
+    finally:
+        if args.metrics_out:
+            registry.write(args.metrics_out)
 
 if __name__ == "__main__":
     main()
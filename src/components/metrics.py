@@ -0,0 +1,331 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logger import logging
+from components import rate_limiter
+
+# Latency buckets (seconds) for span histograms: from cache hits to long reduce calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# How many finished spans are kept for the JSON export
+RECENT_SPANS = int(os.getenv("METRICS_RECENT_SPANS", "1000"))
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def prometheus(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            lines.extend(f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(self.values.items()))
+        return lines
+
+    def as_dict(self):
+        with self.lock:
+            return [{"labels": dict(key), "value": value} for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # label key -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            state = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def prometheus(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, state in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {state[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {round(state[-2], 6)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {state[-1]}")
+        return lines
+
+    def as_dict(self):
+        with self.lock:
+            return [
+                {"labels": dict(key), "count": state[-1], "sum": round(state[-2], 6),
+                 "buckets": dict(zip(map(str, self.buckets), state))}
+                for key, state in sorted(self.values.items())
+            ]
+
+
+class Span:
+    """
+    One timed pipeline step. Attributes (video_id, chunk_index, chars, tokens, attempts, cache_hit, ...)
+    can be added while it runs with set(); child spans inherit the trace attributes of their parent.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "duration", "status")
+
+    def __init__(self, name, trace_id, span_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def incr(self, name, value=1):
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": round(self.start, 6), "duration_ms": round((self.duration or 0) * 1000, 3),
+            "status": self.status, "attributes": dict(self.attributes),
+        }
+
+
+class _NoSpan:
+    # Returned by current_span() outside any span, so instrumentation never needs an if
+    def set(self, **attributes):
+        return self
+
+    def incr(self, name, value=1):
+        pass
+
+
+NO_SPAN = _NoSpan()
+_current_span = contextvars.ContextVar("current_span", default=None)
+# Attributes every span of the current trace gets (e.g. video_id)
+_trace_attributes = contextvars.ContextVar("trace_attributes", default={})
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, histograms and a ring buffer of recent spans.
+    Exported as Prometheus text (to_prometheus, write, serve) or JSON (to_json, write to *.json).
+    """
+
+    def __init__(self, recent_spans=RECENT_SPANS):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.spans = deque(maxlen=recent_spans)
+        self.ids = itertools.count(1)
+        self.span_seconds = self.histogram("pipeline_span_seconds", "Duration of pipeline spans.")
+        self.spans_total = self.counter("pipeline_spans_total", "Finished pipeline spans by status.")
+        self.input_tokens = self.counter("llm_input_tokens_total", "Estimated prompt tokens sent to the LLM.")
+        self.output_tokens = self.counter("llm_output_tokens_total", "Estimated tokens returned by the LLM.")
+        self.input_chars = self.counter("pipeline_input_chars_total", "Characters entering a pipeline span.")
+        self.output_chars = self.counter("pipeline_output_chars_total", "Characters leaving a pipeline span.")
+        self.cache_hits = self.counter("pipeline_cache_hits_total", "Spans served from a cache.")
+        self.attempts = self.counter("llm_attempts_total", "LLM call attempts, retries included.")
+
+    def counter(self, name, help_text):
+        with self.lock:
+            return self.metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            return self.metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def _finish(self, span):
+        attributes = span.attributes
+        self.span_seconds.observe(span.duration, span=span.name)
+        self.spans_total.inc(span=span.name, status=span.status)
+        for counter, key in ((self.input_tokens, "input_tokens"), (self.output_tokens, "output_tokens"),
+                             (self.input_chars, "input_chars"), (self.output_chars, "output_chars"),
+                             (self.attempts, "attempts")):
+            # Token counters measure spend, and a cache hit spends nothing
+            if attributes.get(key) and not (key.endswith("_tokens") and attributes.get("cache_hit")):
+                counter.inc(attributes[key], span=span.name)
+        if attributes.get("cache_hit"):
+            self.cache_hits.inc(span=span.name)
+        self.spans.append(span.as_dict())
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.extend(metric.prometheus())
+        # Limiter / retry counters live in rate_limiter; export them next to the span metrics
+        for name, value in sorted(rate_limiter.metrics().items()):
+            lines.append(f"# TYPE qa_{name}_total counter")
+            lines.append(f"qa_{name}_total {round(value, 6)}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self, spans=True):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        data = {
+            "counters": {m.name: m.as_dict() for m in metrics if isinstance(m, Counter)},
+            "histograms": {m.name: m.as_dict() for m in metrics if isinstance(m, Histogram)},
+            "rate_limiter": rate_limiter.metrics(),
+        }
+        if spans:
+            data["spans"] = list(self.spans)
+        return data
+
+    def write(self, path):
+        """
+        Writes the metrics to path: JSON for *.json, Prometheus text format otherwise.
+        """
+        content = json.dumps(self.to_json(), indent=2) if path.endswith(".json") else self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        logging.info("Metrics written to %s", path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves /metrics (Prometheus text) and /metrics.json from a daemon thread. Returns the server.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.to_json()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+        logging.info("Metrics exporter listening on http://%s:%s/metrics", host, server.server_port)
+        return server
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                with metric.lock:
+                    metric.values.clear()
+        self.spans.clear()
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the block as a span named name; yields the Span so the block can add attributes.
+    Exceptions mark the span as "error" and propagate.
+    """
+    parent = _current_span.get()
+    attrs = dict(_trace_attributes.get())
+    attrs.update(attributes)
+    new_span = Span(name, parent.trace_id if parent else next(registry.ids), next(registry.ids),
+                    parent.span_id if parent else None, attrs)
+    token = _current_span.set(new_span)
+    start = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException:
+        new_span.status = "error"
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        registry._finish(new_span)
+
+
+@contextmanager
+def trace(**attributes):
+    """
+    Adds attributes (e.g. video_id) to every span started inside the block, including in worker threads
+    started with copy_context().
+    """
+    merged = dict(_trace_attributes.get())
+    merged.update(attributes)
+    token = _trace_attributes.set(merged)
+    try:
+        yield
+    finally:
+        _trace_attributes.reset(token)
+
+
+def record_span(name, duration, **attributes):
+    """
+    Records an already timed span (for steps that cannot wrap a with block, e.g. streaming generators).
+    """
+    parent = _current_span.get()
+    attrs = dict(_trace_attributes.get())
+    attrs.update(attributes)
+    finished = Span(name, parent.trace_id if parent else next(registry.ids), next(registry.ids),
+                    parent.span_id if parent else None, attrs)
+    finished.start -= duration
+    finished.duration = duration
+    finished.status = attrs.pop("status", "ok")
+    registry._finish(finished)
+
+
+def bind(**attributes):
+    """
+    Like trace, but for the rest of the current context (scripts that handle one video per process).
+    """
+    merged = dict(_trace_attributes.get())
+    merged.update(attributes)
+    _trace_attributes.set(merged)
+
+
+def current_span():
+    return _current_span.get() or NO_SPAN
+
+
+def submit_in_context(pool, fn, *args, **kwargs):
+    """
+    pool.submit that carries the current span and trace attributes into the worker thread.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,299 @@
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from logger import logging
+from exception import CustomException
+from components.chunker import TokenChunker
+from components.metrics import span, submit_in_context
+from components.planner import SKIPPED_CALLS, SUMMARY_CHUNK_PROMPT, build_reduce_prompt, is_broad_question
+from components.segments import SegmentStore
+
+PIPELINED = "pipelined"
+# Sentinel that tells a map worker the producer has no more chunks
+_DONE = object()
+# How often blocked queue operations look at the stop flag (seconds)
+_POLL_SECONDS = 0.1
+
+
+class StreamingPipeline:
+    """
+    Answers broad questions (summaries) over long transcripts with overlapping stages instead of one after another:
+    - a producer thread cleans (with a preprocessor) and chunks the transcript, putting each chunk on a bounded queue
+      as soon as it is complete; when max_concurrency workers are busy and the queue is full, it waits (backpressure);
+    - map workers answer chunks as they come off the queue; a chunk that nearly duplicates an earlier one (planner
+      dedup_threshold) reuses that chunk's answer, and compression (planner compress_ratio) runs in the worker;
+    - answers are merged as they complete: every reduce_fan_in of them, in arrival order, go into one reduce call while
+      later chunks are still being answered; the partial answers left at the end are sorted back into transcript order
+      and merged by the final (streamed) reduce.
+    End-to-end time then approaches the slowest map call plus the final reduce instead of the sum of the stages.
+    Specific questions (BM25 needs every chunk), transcripts short enough for one call and a max_calls budget
+    need the whole plan first; those run through the planner's staged execute_stream.
+    """
+
+    def __init__(self, planner, max_concurrency=4, queue_size=None, preprocessor=None):
+        self.planner = planner
+        self.max_concurrency = max(1, max_concurrency)
+        # Chunks waiting for a free map worker
+        self.queue_size = queue_size or 2 * self.max_concurrency
+        # Set when the transcript still has to be cleaned (raw segments); cleaned transcripts are chunked as they are
+        self.preprocessor = preprocessor
+
+    def applies(self, transcript, question=""):
+        """
+        True when stream pipelines the stages for this transcript (text or SegmentStore) and question.
+        The size is that of the transcript as given: with a preprocessor that is the raw text, an upper bound of the
+        cleaned size (cleaning only removes text). A transcript that only fits one call once cleaned is then
+        pipelined; cleaning it up front to find out would hold up the stage the pipeline overlaps.
+        """
+        planner = self.planner
+        text = transcript.text if isinstance(transcript, SegmentStore) else transcript
+        return (is_broad_question(question or "") and not planner.max_calls
+                and planner.count_tokens(text) > planner.single_shot_limit)
+
+    def run(self, transcript, engine, question="", on_progress=None):
+        """
+        Returns the final answer text; see stream.
+        """
+        return "".join(self.stream(transcript, engine, question, on_progress))
+
+    def stream(self, transcript, engine, question="", on_progress=None):
+        """
+        Answers question over transcript (text or SegmentStore) with engine and yields the final answer piece by
+        piece. on_progress(done, total) is called in the caller's thread as chunks are answered; total is an
+        estimate (above done) until the last chunk has been produced.
+        """
+        question = question or ""
+        if not self.applies(transcript, question):
+            planner = self.planner
+            plan = planner.plan(self._clean(transcript), question)
+            yield from planner.execute_stream(plan, engine, max_concurrency=self.max_concurrency,
+                                              on_progress=on_progress)
+            return
+        try:
+            partials = self._map_and_merge(transcript, engine, question, on_progress)
+        except CustomException:
+            raise
+        except Exception as e:
+            logging.error("Exception in pipelined map-reduce: %s", e)
+            raise CustomException(e)
+        with span("reduce", answers=len(partials)):
+            # Inner tree levels (if the leftovers still exceed the fan-in) run inside the span, the last merge streams
+            final = self.planner.reduce_stream(partials, question, engine, max_concurrency=self.max_concurrency)
+            first = next(final, None)
+        if first is not None:
+            yield first
+            yield from final
+
+    def _clean(self, transcript):
+        if self.preprocessor is None:
+            return transcript
+        if isinstance(transcript, SegmentStore):
+            return self.preprocessor.clean_segments(transcript)
+        return self.preprocessor.clean_transcript(transcript)
+
+    def _pieces(self, transcript):
+        # Text pieces in transcript order, so cleaning and chunking start before the whole text is processed
+        if isinstance(transcript, SegmentStore):
+            texts = (transcript.segment_text(i) for i in range(len(transcript)))
+        else:
+            texts = iter([transcript])
+        if self.preprocessor is not None:
+            return self.preprocessor.iter_clean(texts)
+        return (text if i == 0 else " " + text for i, text in enumerate(texts))
+
+    def _chunk_tokens(self):
+        return min(self.planner.chunk_tokens, self.planner.usable_context)
+
+    def _produce(self, transcript, chunks, events, stop):
+        """
+        Producer thread: puts (chunk index, text) of every chunk to map on chunks and reports every chunk, mapped or
+        near-duplicate, as a ("chunk", index, representative) event.
+        """
+        planner = self.planner
+        chunk_tokens = self._chunk_tokens()
+        deduper = planner.deduper
+        # Chunks are deduplicated one by one as they are produced. Unlike the staged plan, cuts are not aligned to
+        # repeated passages: that needs the whole text first, and cleaning, chunking and mapping would not overlap
+        chunker = TokenChunker(max_tokens=chunk_tokens, overlap_tokens=min(planner.overlap_tokens, chunk_tokens - 1),
+                               tokenizer=planner.tokenizer)
+        mapped, signatures = [], []
+        count = 0
+        try:
+            for count, chunk in enumerate(chunker.iter_chunks(self._pieces(transcript)), 1):
+                index = count - 1
+                representative = None
+                if deduper is not None:
+                    signature = deduper.signature(chunk.text)
+                    match = deduper.match(signature, np.array(signatures, dtype=np.uint64))
+                    if match is None:
+                        signatures.append(signature)
+                        mapped.append(index)
+                    else:
+                        representative = mapped[match]
+                events.put(("chunk", index, representative))
+                if representative is None and not self._put(chunks, (index, chunk.text), stop):
+                    return
+            events.put(("produced", count))
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            for _ in range(self.max_concurrency):
+                if not self._put(chunks, _DONE, stop):
+                    break
+
+    @staticmethod
+    def _put(chunks, item, stop):
+        # Blocks while the queue is full (backpressure); gives up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _map_worker(self, engine, question, chunks, events, stop):
+        compressor = self.planner.compressor
+        count_tokens = self.planner.count_tokens
+        while not stop.is_set():
+            try:
+                item = chunks.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            index, text = item
+            try:
+                before = after = count_tokens(text)
+                if compressor is not None:
+                    text = compressor.compress(text)
+                    after = count_tokens(text)
+                events.put(("answer", index, engine.answer_question(text, question, chunk_index=index),
+                            before, after))
+            except Exception as e:
+                events.put(("error", e))
+
+    def _merge(self, engine, question, level, items, events):
+        # items are (first chunk index, answer, tokens); merged in transcript order
+        try:
+            items = sorted(items, key=lambda item: item[0])
+            merged = engine.summarize_transcript(build_reduce_prompt(question, [item[1] for item in items]))
+            events.put(("merged", level + 1, items[0][0], merged))
+        except Exception as e:
+            events.put(("error", e))
+
+    @staticmethod
+    def _next_event(events, posters):
+        # Waits for the next event, but not for ever: workers that ended without reporting (cancelled, or a bug)
+        # would otherwise leave the coordinator blocked
+        while True:
+            try:
+                return events.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                # Events are put before their thread finishes, so once all are done an empty queue stays empty
+                if all(poster.done() for poster in posters) and events.empty():
+                    raise CustomException("Pipeline threads stopped before every chunk was answered.")
+
+    def _ready_group(self, items):
+        # Size of the next early merge: the first reduce_fan_in arrivals, or fewer once they reach reduce_max_tokens
+        tokens = 0
+        for size, item in enumerate(items, 1):
+            tokens += item[2]
+            if size >= self.planner.reduce_fan_in or (size > 1 and tokens >= self.planner.reduce_max_tokens):
+                return size
+        return None
+
+    def _map_and_merge(self, transcript, engine, question, on_progress):
+        """
+        Runs the producer, map workers and early merges; returns the partial answers left, in transcript order.
+        """
+        planner = self.planner
+        map_question = question.strip() or SUMMARY_CHUNK_PROMPT
+        text = transcript.text if isinstance(transcript, SegmentStore) else transcript
+        estimated_chunks = max(1, math.ceil(planner.count_tokens(text) / self._chunk_tokens()))
+        chunks = queue.Queue(maxsize=self.queue_size)
+        events = queue.Queue()
+        stop = threading.Event()
+        answers = {}    # chunk index -> answer
+        waiting = {}    # representative chunk index -> near-duplicate chunk indexes still waiting for its answer
+        levels = [[]]   # per merge level: (first chunk index, answer, tokens) in arrival order
+        produced = None
+        mapped = answered = merging = early_merges = 0
+        tokens_before = tokens_after = 0
+        start_time = time.perf_counter()
+        workers = ThreadPoolExecutor(max_workers=self.max_concurrency + 1, thread_name_prefix="pipeline-map")
+        reducers = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="pipeline-reduce")
+        try:
+            with span("pipeline", strategy=PIPELINED, chunk_tokens=self._chunk_tokens()) as s:
+                submit_in_context(workers, self._produce, transcript, chunks, events, stop)
+                # Map workers and merges: once all of them have exited, nothing is left to answer the chunks
+                # (workers only exit on their own after the producer has finished)
+                posters = [submit_in_context(workers, self._map_worker, engine, map_question, chunks, events, stop)
+                           for _ in range(self.max_concurrency)]
+
+                def add(level, key, answer):
+                    while len(levels) <= level:
+                        levels.append([])
+                    levels[level].append((key, answer, planner.count_tokens(answer)))
+
+                while produced is None or answered < mapped or merging:
+                    event = self._next_event(events, posters)
+                    kind = event[0]
+                    if kind == "error":
+                        raise event[1]
+                    if kind == "chunk":
+                        _, index, representative = event
+                        if representative is None:
+                            mapped += 1
+                        elif representative in answers:
+                            answers[index] = answers[representative]
+                            add(0, index, answers[index])
+                        else:
+                            waiting.setdefault(representative, []).append(index)
+                    elif kind == "produced":
+                        produced = event[1]
+                    elif kind == "answer":
+                        _, index, answer, before, after = event
+                        answered += 1
+                        tokens_before += before
+                        tokens_after += after
+                        for idx in [index] + waiting.pop(index, []):
+                            answers[idx] = answer
+                            add(0, idx, answer)
+                        if on_progress is not None:
+                            on_progress(answered, mapped if produced is not None else max(estimated_chunks, mapped + 1))
+                    elif kind == "merged":
+                        _, level, key, answer = event
+                        merging -= 1
+                        add(level, key, answer)
+                    # Merge full groups now, except the one merge that would take every answer: that is the final
+                    # reduce, which is streamed
+                    for level, items in enumerate(levels):
+                        size = self._ready_group(items)
+                        while size is not None:
+                            finished = produced is not None and answered == mapped and not merging
+                            if finished and size == sum(len(group) for group in levels):
+                                break
+                            group, levels[level] = items[:size], items[size:]
+                            items = levels[level]
+                            merging += 1
+                            early_merges += 1
+                            posters.append(submit_in_context(reducers, self._merge, engine, question, level, group,
+                                                             events))
+                            size = self._ready_group(items)
+                partials = sorted((item for items in levels for item in items), key=lambda item: item[0])
+                s.set(chunks=produced, map_calls=mapped, dedup_skipped=produced - mapped, early_merges=early_merges)
+                if planner.compressor is not None:
+                    s.set(tokens_before=tokens_before, tokens_after=tokens_after)
+        finally:
+            stop.set()
+            workers.shutdown(wait=False, cancel_futures=True)
+            reducers.shutdown(wait=False, cancel_futures=True)
+        if produced > mapped:
+            SKIPPED_CALLS.inc(produced - mapped, reason="near_duplicate")
+        logging.info("Pipelined map-reduce | Chunks: %s | Map calls: %s | Early merges: %s | Left for final reduce: %s"
+                     " | Time: %.2fs", produced, mapped, early_merges, len(partials), time.perf_counter() - start_time)
+        return [item[1] for item in partials]
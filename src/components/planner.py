@@ -0,0 +1,485 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List
+from logger import logging
+from exception import CustomException
+from components.chunker import TokenChunker, estimate_tokens
+from components.bm25_index import BM25Index
+from components.segments import SegmentStore, format_timestamp
+from components.metrics import registry, span
+from components.dedup import MinHashDeduper, repeat_starts
+from components.compressor import ExtractiveCompressor, TEXTRANK
+from components.qa_engine import DEFAULT_MODEL, FALLBACK_RESPONSES
+
+SINGLE_SHOT = "single_shot"
+MAP_REDUCE = "map_reduce"
+HIERARCHICAL = "hierarchical"
+
+# Input context windows (tokens) of the models we run; unknown models get the conservative default
+MODEL_CONTEXT_TOKENS = {
+    "gemini-2.5-pro": 1_048_576,
+    "gemini-2.5-flash": 1_048_576,
+    "gemini-2.5-flash-lite": 1_048_576,
+    "gemini-2.0-flash": 1_048_576,
+    "gemini-2.0-flash-lite": 1_048_576,
+}
+DEFAULT_CONTEXT_TOKENS = 32_000
+
+SUMMARY_CHUNK_PROMPT = "Give a concise summary of this transcript section."
+# Wrapper text QAEngine adds around every chunk/question, counted per call in estimates
+PROMPT_OVERHEAD_TOKENS = 40
+
+SKIPPED_CALLS = registry.counter("llm_calls_skipped_total", "Map calls not made because another chunk's answer was reused.")
+
+
+def is_broad_question(question: str) -> bool:
+    if not question.strip():
+        return True
+    broad_keywords = [
+        "summary", "summarize", "main idea", "what is this video about", "overview",
+        "overall", "topic", "objective", "agenda", "explain the video", "what happened",
+        "components", "describe", "main points", "highlights", "structure", "key points"
+    ]
+    q_lower = question.lower()
+    return any(kw in q_lower for kw in broad_keywords)
+
+
+def build_reduce_prompt(question, answers):
+    """
+    Prompt that merges partial answers (from chunks or lower reduce levels) into one.
+    """
+    combined_answers = "\n\n".join(answers)
+    return (
+        f"Given these answers or explanations to the question '{question.strip() or 'Summarize the video'}' "
+        f"about a video's transcript, combine all information into a single, clear, non-redundant answer. "
+        f"Highlight all main points, remove repetitions, ignore parts that say the transcript does not cover the question, "
+        f"and provide a comprehensive response as if answering a user in one go.\n\n"
+        f"{combined_answers}"
+    )
+
+
+def count_fallbacks(answers):
+    """
+    Number of answers that are the engine's fallback text instead of a model response.
+    """
+    return sum(answer.strip() in FALLBACK_RESPONSES for answer in answers)
+
+
+@dataclass
+class ExecutionPlan:
+    """
+    What the planner decided to do for one transcript/question, plus its cost estimate.
+    """
+    strategy: str
+    question: str
+    broad: bool
+    chunks: List[str]
+    selected: List[int]
+    transcript_tokens: int
+    map_calls: int
+    reduce_calls: int
+    reduce_levels: int
+    estimated_input_tokens: int
+    notes: List[str] = field(default_factory=list)
+    # (start, end) seconds per chunk, when the plan was made from a SegmentStore
+    chunk_times: List[tuple] = field(default_factory=list)
+    # Selected chunk -> earlier selected chunk it nearly duplicates; such chunks reuse that chunk's answer
+    duplicate_of: Dict[int, int] = field(default_factory=dict)
+    # Map answers that came back as the engine's fallback text (API down, circuit open); set when the plan runs
+    fallback_answers: int = 0
+
+    @property
+    def estimated_calls(self):
+        return self.map_calls + self.reduce_calls
+
+    @property
+    def map_chunks(self):
+        """
+        Selected chunks that are actually sent to the LLM (near-duplicates left out).
+        """
+        return [idx for idx in self.selected if idx not in self.duplicate_of]
+
+    def fan_out(self, answers):
+        """
+        Expands the answers for map_chunks to one answer per selected chunk, in selected order.
+        """
+        by_chunk = dict(zip(self.map_chunks, answers))
+        return [by_chunk[self.duplicate_of.get(idx, idx)] for idx in self.selected]
+
+    def describe(self):
+        lines = [
+            f"Strategy: {self.strategy}",
+            f"Question type: {'broad' if self.broad else 'specific'}",
+            f"Transcript tokens (est.): {self.transcript_tokens}",
+            f"Chunks: {len(self.chunks)} (sent to LLM: {len(self.map_chunks)})",
+            f"LLM calls (est.): {self.estimated_calls} = {self.map_calls} map + {self.reduce_calls} reduce"
+            f" over {self.reduce_levels} level(s)",
+            f"Input tokens (est.): {self.estimated_input_tokens}",
+        ]
+        lines.extend(f"Note: {note}" for note in self.notes)
+        return "\n".join(lines)
+
+
+class ExecutionPlanner:
+    """
+    Picks how to answer a question over a transcript:
+    - single_shot: whole transcript in one call, when it fits both the model context and the latency budget.
+      That call gives the final answer, so like the reduce calls it goes to the reduce model.
+    - map_reduce: answer per chunk (all chunks for broad questions, BM25 top-k for specific ones), then one reduce.
+    - hierarchical: same map step, but more partial answers than reduce_fan_in, so they are tree-reduced:
+      groups of reduce_fan_in answers are merged in parallel, level by level.
+    max_calls is the cost budget; when the map step would exceed it, chunks are made larger (up to the context limit).
+    With dedup_threshold set, selected chunks that are near-duplicates of an earlier one (MinHash similarity at or
+    above the threshold) are not mapped; they reuse the earlier chunk's answer.
+    With compress_ratio set, chunks mapped for broad questions (summaries) are first cut down locally to their most
+    informative sentences (ExtractiveCompressor); chunks for specific questions are never compressed.
+    Chunks are sized for model_name (the map model); single-shot and reduce prompts for reduce_model_name
+    (default: the map model).
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, context_tokens=None, single_shot_max_tokens=100_000,
+                 chunk_tokens=4000, overlap_tokens=0, top_k=3, reduce_fan_in=8, max_calls=None,
+                 answer_tokens=400, tokenizer=None, reduce_max_tokens=60_000, chunk_memo_entries=8,
+                 dedup_threshold=None, compress_ratio=None, compress_method=TEXTRANK, reduce_model_name=None):
+        self.model_name = model_name
+        self.context_tokens = context_tokens or MODEL_CONTEXT_TOKENS.get(model_name, DEFAULT_CONTEXT_TOKENS)
+        # Leave headroom for the prompt wrapper and the model's answer
+        self.usable_context = int(self.context_tokens * 0.8)
+        self.reduce_model_name = reduce_model_name or model_name
+        self.reduce_usable_context = self.usable_context if self.reduce_model_name == model_name else \
+            int(MODEL_CONTEXT_TOKENS.get(self.reduce_model_name, DEFAULT_CONTEXT_TOKENS) * 0.8)
+        self.single_shot_max_tokens = single_shot_max_tokens
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.top_k = top_k
+        self.reduce_fan_in = max(2, reduce_fan_in)
+        # Upper bound on the partial-answer tokens merged by one reduce call
+        self.reduce_max_tokens = min(reduce_max_tokens, self.reduce_usable_context)
+        self.max_calls = max_calls
+        self.answer_tokens = answer_tokens
+        self.tokenizer = tokenizer
+        self.count_tokens = tokenizer or estimate_tokens
+        # Recently chunked transcripts, so another question on the same video skips re-chunking
+        self.chunk_memo_entries = chunk_memo_entries
+        self._chunk_memo = OrderedDict()
+        self._chunk_memo_lock = threading.Lock()
+        self.deduper = MinHashDeduper(threshold=dedup_threshold) if dedup_threshold else None
+        self.compressor = ExtractiveCompressor(ratio=compress_ratio, method=compress_method) \
+            if compress_ratio and compress_ratio < 1 else None
+
+    @property
+    def single_shot_limit(self):
+        # Largest transcript (tokens) answered in one call: latency budget and the reduce model's context
+        return min(self.single_shot_max_tokens, self.reduce_usable_context)
+
+    def plan(self, transcript, question=""):
+        """
+        Builds an ExecutionPlan for the cleaned transcript (text or SegmentStore) and question. Makes no LLM calls.
+        """
+        try:
+            question = question or ""
+            broad = is_broad_question(question)
+            store = transcript if isinstance(transcript, SegmentStore) else None
+            if store is not None:
+                transcript = store.text
+            transcript_tokens = self.count_tokens(transcript)
+            notes = []
+
+            if transcript_tokens <= self.single_shot_limit:
+                plan = ExecutionPlan(
+                    strategy=SINGLE_SHOT, question=question, broad=broad, chunks=[transcript], selected=[0],
+                    transcript_tokens=transcript_tokens, map_calls=1, reduce_calls=0, reduce_levels=0,
+                    estimated_input_tokens=transcript_tokens + PROMPT_OVERHEAD_TOKENS, notes=notes,
+                    chunk_times=[store.time_span(0, len(transcript))] if store is not None else [],
+                )
+                logging.info("Planner chose %s | Tokens: %s", SINGLE_SHOT, transcript_tokens)
+                return plan
+
+            chunk_tokens = min(self.chunk_tokens, self.usable_context)
+            if self.max_calls and broad:
+                # Cost budget: map calls + at least one reduce must fit into max_calls
+                chunk_tokens = max(chunk_tokens, math.ceil(transcript_tokens / max(1, self.max_calls - 1)))
+                chunk_tokens = min(chunk_tokens, self.usable_context)
+            chunk_objs = self._chunk(store or transcript, chunk_tokens)
+            # Sentence packing leaves some slack per chunk, so grow the budget until the plan fits
+            while (self.max_calls and broad and chunk_tokens < self.usable_context
+                   and len(chunk_objs) + self.reduce_shape(len(chunk_objs))[0] > self.max_calls):
+                chunk_tokens = min(int(chunk_tokens * 1.25) + 1, self.usable_context)
+                chunk_objs = self._chunk(store or transcript, chunk_tokens)
+            if chunk_tokens != self.chunk_tokens:
+                notes.append(f"chunk size set to {chunk_tokens} tokens (configured {self.chunk_tokens})")
+            chunks = [chunk.text for chunk in chunk_objs]
+
+            if broad:
+                selected = list(range(len(chunks)))
+            else:
+                selected = BM25Index(chunks).top_k(question, k=self.top_k)
+                if store is not None:
+                    spans = [f"{idx + 1} ({format_timestamp(chunk_objs[idx].start_time)}-"
+                             f"{format_timestamp(chunk_objs[idx].end_time)})" for idx in selected]
+                    notes.append(f"BM25 selected chunks [{', '.join(spans)}]")
+                else:
+                    notes.append(f"BM25 selected chunks {[idx + 1 for idx in selected]}")
+
+            duplicate_of = self._find_duplicates(chunks, selected)
+            if duplicate_of:
+                notes.append(f"{len(duplicate_of)} near-duplicate chunk(s) reuse an earlier chunk's answer: "
+                             + ", ".join(f"{idx + 1}->{rep + 1}" for idx, rep in sorted(duplicate_of.items())))
+            mapped = [idx for idx in selected if idx not in duplicate_of]
+            if broad and self.compressor is not None:
+                chunks = self._compress(chunks, mapped, notes)
+            map_calls = len(mapped)
+            # Duplicates get their answer fanned back out, so the reduce still merges one answer per selected chunk
+            reduce_calls, reduce_levels = self.reduce_shape(len(selected))
+            map_tokens = sum(self.count_tokens(chunks[idx]) if self.compressor is not None and broad
+                             else chunk_objs[idx].tokens for idx in mapped) + map_calls * PROMPT_OVERHEAD_TOKENS
+            reduce_tokens = (len(selected) + reduce_calls - 1) * self.answer_tokens \
+                + reduce_calls * PROMPT_OVERHEAD_TOKENS if reduce_calls else 0
+            strategy = HIERARCHICAL if reduce_levels > 1 else MAP_REDUCE
+            plan = ExecutionPlan(
+                strategy=strategy, question=question, broad=broad, chunks=chunks, selected=selected,
+                transcript_tokens=transcript_tokens, map_calls=map_calls, reduce_calls=reduce_calls,
+                reduce_levels=reduce_levels, estimated_input_tokens=map_tokens + reduce_tokens, notes=notes,
+                chunk_times=[(chunk.start_time, chunk.end_time) for chunk in chunk_objs] if store is not None else [],
+                duplicate_of=duplicate_of,
+            )
+            logging.info("Planner chose %s | Tokens: %s | Calls: %s", strategy, transcript_tokens, plan.estimated_calls)
+            return plan
+        except CustomException:
+            raise
+        except Exception as e:
+            logging.error("Exception during planning: %s", e)
+            raise CustomException(e)
+
+    def _find_duplicates(self, chunks, selected):
+        if self.deduper is None or len(selected) < 2:
+            return {}
+        with span("dedup", chunks=len(selected)) as s:
+            representatives = self.deduper.duplicate_of([chunks[idx] for idx in selected])
+            duplicate_of = {selected[pos]: selected[rep] for pos, rep in enumerate(representatives) if rep != pos}
+            s.set(duplicates=len(duplicate_of))
+        return duplicate_of
+
+    def _chunk(self, transcript, chunk_tokens):
+        is_store = isinstance(transcript, SegmentStore)
+        text = transcript.text if is_store else transcript
+        key = (is_store, len(transcript) if is_store else 0, len(text), hash(text), chunk_tokens)
+        with span("chunk", input_chars=len(text), chunk_tokens=chunk_tokens, cache_hit=False) as s:
+            with self._chunk_memo_lock:
+                chunks = self._chunk_memo.get(key)
+                if chunks is not None:
+                    self._chunk_memo.move_to_end(key)
+                    logging.info("Chunk cache hit | Chunks: %s", len(chunks))
+                    s.set(cache_hit=True)
+            if chunks is None:
+                chunks = self._chunk_uncached(transcript, chunk_tokens)
+                if self.chunk_memo_entries:
+                    with self._chunk_memo_lock:
+                        self._chunk_memo[key] = chunks
+                        while len(self._chunk_memo) > self.chunk_memo_entries:
+                            self._chunk_memo.popitem(last=False)
+            s.set(chunks=len(chunks), tokens=sum(chunk.tokens for chunk in chunks))
+        return list(chunks)
+
+    def _compress(self, chunks, mapped, notes):
+        chunks = list(chunks)
+        before = sum(self.count_tokens(chunks[idx]) for idx in mapped)
+        with span("compress", chunks=len(mapped), tokens_before=before, method=self.compressor.method) as s:
+            for idx, text in zip(mapped, self.compressor.compress_many([chunks[idx] for idx in mapped])):
+                chunks[idx] = text
+            after = sum(self.count_tokens(chunks[idx]) for idx in mapped)
+            s.set(tokens_after=after)
+        notes.append(f"chunks compressed locally ({self.compressor.method}, ratio {self.compressor.ratio}): "
+                     f"{before} -> {after} tokens")
+        return chunks
+
+    def _repeat_starts(self, transcript, chunk_tokens):
+        # With dedup on, chunks are cut where long repeated passages begin, so their repeats chunk identically
+        # (and are skipped) instead of straddling chunk boundaries at a different offset each time
+        if self.deduper is None:
+            return None
+        text = transcript.text if isinstance(transcript, SegmentStore) else transcript
+        return repeat_starts(text, min_run_tokens=chunk_tokens // 2, count_tokens=self.count_tokens)
+
+    def _chunk_uncached(self, transcript, chunk_tokens):
+        chunker = TokenChunker(max_tokens=chunk_tokens, overlap_tokens=min(self.overlap_tokens, chunk_tokens - 1),
+                               tokenizer=self.tokenizer, cut_before=self._repeat_starts(transcript, chunk_tokens))
+        if isinstance(transcript, SegmentStore):
+            return chunker.chunk_segments(transcript)
+        return chunker.chunk(transcript)
+
+    def reduce_shape(self, n_answers):
+        """
+        Returns (reduce calls, reduce levels) needed to merge n_answers with the configured fan-in.
+        """
+        calls = levels = 0
+        while n_answers > 1:
+            groups = math.ceil(n_answers / self.reduce_fan_in)
+            # A trailing group of one answer is passed up as-is, without an LLM call
+            calls += groups - (1 if n_answers % self.reduce_fan_in == 1 else 0)
+            levels += 1
+            n_answers = groups
+        return calls, levels
+
+    def dry_run(self, transcript, question=""):
+        """
+        Returns the human readable plan (strategy, estimated calls and tokens) without executing it.
+        """
+        return self.plan(transcript, question).describe()
+
+    def execute(self, plan, engine, max_concurrency=4, on_progress=None):
+        """
+        Runs a plan with a QAEngine and returns the final answer text.
+        """
+        if plan.strategy == SINGLE_SHOT:
+            return engine.answer_question(plan.chunks[0], plan.question.strip() or "Summarize the video.", final=True)
+        answers = self._map(plan, engine, max_concurrency, on_progress)
+        with span("reduce", answers=len(answers)):
+            return self.reduce(answers, plan.question, engine, max_concurrency=max_concurrency)
+
+    def execute_stream(self, plan, engine, max_concurrency=4, on_progress=None):
+        """
+        Streaming execute: the map step and inner reduce levels run as usual, then the
+        final answer (single-shot call or last reduce) is yielded piece by piece.
+        """
+        if plan.strategy == SINGLE_SHOT:
+            yield from engine.stream_answer(plan.chunks[0], plan.question.strip() or "Summarize the video.", final=True)
+            return
+        answers = self._map(plan, engine, max_concurrency, on_progress)
+        with span("reduce", answers=len(answers)):
+            answers = self._reduce_until_one_group(answers, plan.question, engine, max_concurrency)
+        if len(answers) == 1:
+            yield answers[0]
+            return
+        yield from engine.stream_summary(build_reduce_prompt(plan.question, answers))
+
+    def _map(self, plan, engine, max_concurrency, on_progress):
+        map_question = plan.question.strip() or SUMMARY_CHUNK_PROMPT
+        mapped = plan.map_chunks
+        with span("map", chunks=len(mapped), strategy=plan.strategy, dedup_skipped=len(plan.duplicate_of)):
+            answers = engine.answer_many([plan.chunks[idx] for idx in mapped], map_question,
+                                         max_concurrency=max_concurrency, on_progress=on_progress,
+                                         chunk_indexes=mapped)
+        self._record_skipped(plan)
+        plan.fallback_answers = count_fallbacks(answers)
+        return plan.fan_out(answers)
+
+    @staticmethod
+    def _record_skipped(plan):
+        if plan.duplicate_of:
+            SKIPPED_CALLS.inc(len(plan.duplicate_of), reason="near_duplicate")
+            logging.info("Map step skipped %s near-duplicate chunk call(s)", len(plan.duplicate_of))
+
+    def group_answers(self, answers):
+        """
+        Splits answers into consecutive groups of at most reduce_fan_in answers and reduce_max_tokens tokens.
+        """
+        groups = []
+        current = []
+        current_tokens = 0
+        for answer in answers:
+            tokens = self.count_tokens(answer)
+            if current and (len(current) >= self.reduce_fan_in or current_tokens + tokens > self.reduce_max_tokens):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(answer)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _level_groups(self, answers):
+        groups = self.group_answers(answers)
+        if len(answers) > 1 and (len(groups) == 1 or len(groups) == len(answers)):
+            # Token bound would not shrink this level further; merge by count alone
+            groups = [answers[i:i + self.reduce_fan_in] for i in range(0, len(answers), self.reduce_fan_in)]
+        return groups
+
+    def _reduce_level(self, level, answers, question, engine, max_concurrency):
+        groups = self._level_groups(answers)
+        start_time = time.perf_counter()
+        merged = iter(engine.summarize_many(
+            [build_reduce_prompt(question, group) for group in groups if len(group) > 1],
+            max_concurrency=max_concurrency,
+        ))
+        # A group of one answer is passed up unchanged, no LLM call needed
+        next_answers = [group[0] if len(group) == 1 else next(merged) for group in groups]
+        duration = time.perf_counter() - start_time
+        logging.info("Reduce level %s: %s answer(s) -> %s | Time: %.2fs", level, len(answers), len(next_answers), duration)
+        return next_answers
+
+    def _reduce_until_one_group(self, answers, question, engine, max_concurrency):
+        # Runs inner tree levels until the remaining answers fit into a single (final) reduce call
+        answers = list(answers)
+        level = 0
+        while len(answers) > 1 and len(self._level_groups(answers)) > 1:
+            level += 1
+            answers = self._reduce_level(level, answers, question, engine, max_concurrency)
+        return answers
+
+    def reduce(self, answers, question, engine, max_concurrency=4):
+        """
+        Tree reduce: merges groups of partial answers in parallel, level by level, until one answer remains.
+        Every reduce prompt holds at most reduce_fan_in answers, so it stays bounded however long the video is.
+        """
+        answers = list(answers)
+        level = 0
+        total_start = time.perf_counter()
+        while len(answers) > 1:
+            level += 1
+            answers = self._reduce_level(level, answers, question, engine, max_concurrency)
+        if level:
+            logging.info("Tree reduce finished | Depth: %s | Fan-in: %s | Time: %.2fs",
+                         level, self.reduce_fan_in, time.perf_counter() - total_start)
+        return answers[0] if answers else ""
+
+    def reduce_stream(self, answers, question, engine, max_concurrency=4):
+        """
+        Same as reduce, but the last merge is yielded piece by piece as the model writes it.
+        """
+        answers = self._reduce_until_one_group(answers, question, engine, max_concurrency)
+        if len(answers) == 1:
+            yield answers[0]
+        elif answers:
+            yield from engine.stream_summary(build_reduce_prompt(question, answers))
+
+    async def execute_async(self, plan, engine, max_concurrency=64, on_progress=None):
+        """
+        asyncio version of execute: map and tree reduce run on the event loop through the engine's async API.
+        Cancelling the awaiting task cancels all chunk and reduce calls still in flight.
+        """
+        if plan.strategy == SINGLE_SHOT:
+            return await engine.answer_question_async(plan.chunks[0], plan.question.strip() or "Summarize the video.",
+                                                      final=True)
+        map_question = plan.question.strip() or SUMMARY_CHUNK_PROMPT
+        mapped = plan.map_chunks
+        with span("map", chunks=len(mapped), strategy=plan.strategy, dedup_skipped=len(plan.duplicate_of)):
+            answers = await engine.answer_many_async([plan.chunks[idx] for idx in mapped], map_question,
+                                                     max_concurrency=max_concurrency, on_progress=on_progress,
+                                                     chunk_indexes=mapped)
+        self._record_skipped(plan)
+        plan.fallback_answers = count_fallbacks(answers)
+        answers = plan.fan_out(answers)
+        with span("reduce", answers=len(answers)):
+            return await self.reduce_async(answers, plan.question, engine, max_concurrency=max_concurrency)
+
+    async def reduce_async(self, answers, question, engine, max_concurrency=64):
+        """
+        asyncio version of reduce, with the same grouping per level.
+        """
+        answers = list(answers)
+        level = 0
+        while len(answers) > 1:
+            level += 1
+            groups = self._level_groups(answers)
+            merged = iter(await engine.summarize_many_async(
+                [build_reduce_prompt(question, group) for group in groups if len(group) > 1],
+                max_concurrency=max_concurrency,
+            ))
+            answers = [group[0] if len(group) == 1 else next(merged) for group in groups]
+        if level:
+            logging.info("Async tree reduce finished | Depth: %s | Fan-in: %s", level, self.reduce_fan_in)
+        return answers[0] if answers else ""
@@ -1,6 +1,11 @@
 import re
 from logger import logging
 from exception import CustomException
+from components.segments import SegmentStore
+from components.metrics import span
+
+# Chars cleaned per step by the streaming cleaner; a single pattern match must be shorter than this
+CLEAN_WINDOW = 8192
 
 class Preprocessor:
     """
@@ -15,7 +20,73 @@ class Preprocessor:
             r"\[.*?\]",                 # [Music], [Applause], etc.
             r"\d{1,2}:\d{2}(?::\d{2})?",# 00:01 or 00:01:02 timestamps
         ]
-    
+        # Compiled once and applied one after another, as separate passes: removing one match can create another
+        # ("1[Music]2:30" -> "12:30"), and the later passes must see that text
+        self.remove_regexes = [re.compile(pattern) for pattern in self.remove_patterns]
+
+    @staticmethod
+    def _clean_window(regex, buffer, start, cut):
+        """
+        Removes regex matches from buffer[start:cut]. Returns (cleaned text, position actually reached);
+        the position moves back to the start of a match that crosses cut so it is handled next time.
+        """
+        parts = []
+        pos = start
+        # Look at most one window past cut, so a window without matches never scans the whole buffer
+        for match in regex.finditer(buffer, start, min(len(buffer), cut + CLEAN_WINDOW)):
+            if match.end() <= cut:
+                parts.append(buffer[pos:match.start()])
+                pos = match.end()
+            elif match.start() == pos:
+                # The match starts right here; take it whole so the window always makes progress
+                pos = cut = match.end()
+                break
+            else:
+                if match.start() < cut:
+                    cut = match.start()
+                break
+        parts.append(buffer[pos:cut])
+        return "".join(parts), cut
+
+    def _strip_stream(self, regex, pieces, window):
+        # One removal pass over a stream of text pieces, window by window; yields the text left (whitespace as is)
+        buffer = ""
+        base = 0  # everything before base in buffer has already been cleaned
+        for piece in pieces:
+            # Only the unprocessed tail is copied when a piece is appended
+            buffer = buffer[base:] + piece
+            base = 0
+            while len(buffer) - base >= 2 * window:
+                cleaned, base = self._clean_window(regex, buffer, base, base + window)
+                yield cleaned
+        cleaned, _ = self._clean_window(regex, buffer, base, len(buffer))
+        yield cleaned
+
+    def iter_clean(self, segments, window=CLEAN_WINDOW):
+        """
+        Streaming cleaner: consumes transcript segments (joined with single spaces) and yields cleaned,
+        whitespace-normalised text pieces as soon as they are final. "".join() of the pieces equals
+        clean_transcript(" ".join(segments)) as long as no single match is longer than window chars.
+        """
+        pieces = (segment if i == 0 else " " + segment for i, segment in enumerate(segments))
+        # The passes are chained generators, so each sees the previous one's output, as in clean_transcript
+        for regex in self.remove_regexes:
+            pieces = self._strip_stream(regex, pieces, window)
+        pending_word = ""  # trailing partial word, may continue in the next piece
+        emitted = False
+        for text in pieces:
+            text = pending_word + text
+            words = text.split()
+            pending_word = ""
+            if words and not text[-1].isspace():
+                pending_word = words.pop()
+            if words:
+                out = " ".join(words)
+                yield " " + out if emitted else out
+                emitted = True
+        if pending_word:
+            yield " " + pending_word if emitted else pending_word
+
     def clean_transcript(self, text):
         """
         Cleans transcript text.
@@ -27,20 +98,130 @@ class Preprocessor:
                 raise CustomException("Input must be a string for cleaning transcript.")
             
             original_length = len(text)
-            logging.info(f"Starting transcript cleaning. Original length: {original_length} chars.")
+            logging.info("Starting transcript cleaning. Original length: %s chars.", original_length)
 
-            for pattern in self.remove_patterns:
-                text = re.sub(pattern, "", text)
-            text = ' '.join(text.split())
+            with span("clean", input_chars=original_length) as s:
+                for regex in self.remove_regexes:
+                    text = regex.sub("", text)
+                text = " ".join(text.split())
+                s.set(output_chars=len(text))
 
             cleaned_length = len(text)
-            logging.info(f"Transcript cleaned. Cleaned length: {cleaned_length} chars. Chars removed: {original_length - cleaned_length}.")
+            logging.info("Transcript cleaned. Cleaned length: %s chars. Chars removed: %s.", cleaned_length, original_length - cleaned_length)
 
             return text
         except Exception as e:
-            logging.error(f"Exception during clean_transcript: {e}")
+            logging.error("Exception during clean_transcript: %s", e)
+            raise CustomException(e)
+
+    def clean_segments(self, store):
+        """
+        Cleans a SegmentStore and returns a new store with the same timings. Patterns are matched on the
+        joined text, so an annotation split across captions ("[Mus" | "ic]") is removed too, and the store's
+        text equals clean_transcript(store.text). Segments left empty (e.g. only "[Music]") are dropped.
+        """
+        try:
+            if not isinstance(store, SegmentStore):
+                logging.error("Input to clean_segments is not a SegmentStore.")
+                raise CustomException("Input must be a SegmentStore for cleaning segments.")
+
+            with span("clean", input_chars=len(store.text), segments=len(store)) as s:
+                kept = self._segment_remainders(store)
+                texts, starts, durations = [], [], []
+                for i, remainder in enumerate(kept):
+                    text = " ".join(remainder.split())
+                    if text:
+                        texts.append(text)
+                        starts.append(store.starts[i])
+                        durations.append(store.durations[i])
+                cleaned = SegmentStore(texts, starts, durations)
+                s.set(output_chars=len(cleaned.text))
+            logging.info("Segments cleaned. Segments kept: %s/%s | Length: %s -> %s chars.",
+                         len(cleaned), len(store), len(store.text), len(cleaned.text))
+            return cleaned
+        except CustomException:
+            raise
+        except Exception as e:
+            logging.error("Exception during clean_segments: %s", e)
             raise CustomException(e)
 
+    def _segment_remainders(self, store):
+        """
+        Per segment, its text minus what the removal passes take out of the joined buffer (whitespace not
+        normalised). When a removed span also covers the separator, the word cut by it continues the previous segment's last word,
+        as in the joined text, so it is moved there.
+        """
+        text = store.text
+        matches = self._removed_spans(text)
+        remainders = []
+        j = 0
+        last = None      # index of the last segment with text left
+        abuts = False    # only removed text lies between the end of remainders[last] and this segment
+        for i in range(len(store)):
+            start = store.offsets[i]
+            end = start + len(store.segment_text(i))
+            parts, pos, separator_removed = [], start, False
+            while j < len(matches) and matches[j][0] <= end:
+                match_start, match_end = matches[j]
+                if match_start > pos:
+                    parts.append(text[pos:match_start])
+                pos = max(pos, match_end)
+                if match_end > end:
+                    # The match runs over the separator into the next segment
+                    separator_removed = True
+                    break
+                j += 1
+            if pos < end:
+                parts.append(text[pos:end])
+            remainder = "".join(parts)
+            if abuts and last is not None and remainder and not remainder[0].isspace():
+                head = next((k for k, char in enumerate(remainder) if char.isspace()), len(remainder))
+                remainders[last] += remainder[:head]
+                remainder = remainder[head:]
+            remainders.append(remainder)
+            if remainder:
+                last = i
+            # A segment with nothing left passes the adjacency on; one with text starts it afresh
+            abuts = separator_removed and (bool(parts) or abuts)
+        return remainders
+
+    def _removed_spans(self, text):
+        """
+        (start, end) spans of text that the removal passes take out, merged and in order. Each pass runs on what
+        the previous passes left, like clean_transcript; kept holds the (start, end) spans still left.
+        """
+        kept = [(0, len(text))]
+        for regex in self.remove_regexes:
+            current = "".join(text[start:end] for start, end in kept)
+            matches = [match.span() for match in regex.finditer(current) if match.end() > match.start()]
+            if not matches:
+                continue
+            left, offset, j = [], 0, 0  # offset: where the kept span begins in current
+            for start, end in kept:
+                length = end - start
+                pos = 0
+                while j < len(matches) and matches[j][0] < offset + length:
+                    match_start, match_end = matches[j]
+                    if match_start - offset > pos:
+                        left.append((start + pos, start + match_start - offset))
+                    pos = max(pos, min(match_end - offset, length))
+                    if match_end > offset + length:
+                        # The match goes on into the next kept span
+                        break
+                    j += 1
+                if pos < length:
+                    left.append((start + pos, end))
+                offset += length
+            kept = left
+        removed, pos = [], 0
+        for start, end in kept:
+            if start > pos:
+                removed.append((pos, start))
+            pos = end
+        if pos < len(text):
+            removed.append((pos, len(text)))
+        return removed
+
     def chunk_transcript(self, text, chunk_size=1000):
         """
         Splits text into chunks of approximately chunk_size characters.
@@ -73,8 +254,8 @@ class Preprocessor:
                     chunks.append(chunk)
                 start = end
 
-            logging.info(f"Transcript split into {len(chunks)} chunks with approx. {chunk_size} chars per chunk.")
+            logging.info("Transcript split into %s chunks with approx. %s chars per chunk.", len(chunks), chunk_size)
             return chunks
         except Exception as e:
-            logging.error(f"Exception during chunk_transcript: {e}")
+            logging.error("Exception during chunk_transcript: %s", e)
             raise CustomException(e)
@@ -1,71 +1,505 @@
+import asyncio
+import json
+import threading
 import time
-import google.generativeai as genai  
 import os
-#from google import genai
-from exception import CustomException,LLM_APIError 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from exception import LLM_APIError,CircuitOpenError
 from logger import logging
-from dotenv import load_dotenv
+from components.chunker import CHARS_PER_TOKEN, estimate_tokens
+from components.llm_backend import DEFAULT_MODEL, create_backend
+from components.metrics import current_span, record_span, registry, span, submit_in_context
+from components.rate_limiter import (
+    RetryPolicy, classify_error, get_shared_breaker, get_shared_limiter, record,
+)
 
-# Load environment variables from .env file
-load_dotenv()
+QA_FALLBACK = "My bad, I cant process your request at this time, try again."
+SUMMARY_FALLBACK = "Summary unavailable due to system error."
+FALLBACK_RESPONSES = (QA_FALLBACK, SUMMARY_FALLBACK)
+# Wrapper text of a batched request, counted against the batch token budget
+BATCH_OVERHEAD_TOKENS = 80
 
-# Get API key from environment variable
-api_key = os.getenv('GEMINI_API_KEY')
+REQUESTS_SAVED = registry.counter("llm_requests_saved_total",
+                                  "LLM requests not made because several jobs were answered by one batched request.")
+
+
+def build_batch_prompt(jobs):
+    """
+    One prompt for several (transcript_chunk, question) jobs with ids j0, j1, ... in job order; a chunk shared
+    by several jobs (e.g. many questions on one short video) is included once. Asks for a JSON object of answers.
+    """
+    chunk_ids = {}
+    chunk_lines, job_lines = [], []
+    for job_id, (chunk, question) in enumerate(jobs):
+        if chunk not in chunk_ids:
+            chunk_ids[chunk] = f"c{len(chunk_ids)}"
+            chunk_lines.append(f"[{chunk_ids[chunk]}] {chunk}")
+        job_lines.append(f'"j{job_id}" (about chunk {chunk_ids[chunk]}): {question}')
+    return (
+        "Below are chunks of a YouTube video's transcript and several independent questions, each about one chunk. "
+        "Answer every question as thoroughly and accurately as possible, using only the chunk it is about.\n"
+        "Reply with only a JSON object that maps every question id to its answer as a string, "
+        'e.g. {"j0": "...", "j1": "..."}, and no other text.\n\n'
+        "Transcript chunks:\n" + "\n\n".join(chunk_lines) + "\n\nQuestions:\n" + "\n".join(job_lines)
+    )
+
+
+def parse_batch_answers(text, n_jobs):
+    """
+    Returns {job position: answer} from a batched response. Answers that are missing, empty or not strings are
+    left out (those jobs are asked again one by one); a code fence or text around the JSON object is ignored.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    answers = {}
+    for position in range(n_jobs):
+        answer = data.get(f"j{position}")
+        if isinstance(answer, str) and answer.strip() and answer.strip() not in FALLBACK_RESPONSES:
+            answers[position] = answer.strip()
+    return answers
 
 
 class QAEngine:
     """
     QAEngine integrates with an LLM API to provide Q&A and summarization over transcript chunks,
-    with robust logging and exponential backoff for error resilience.
+    with robust logging and error resilience:
+    - every call goes through a RateLimiter (requests and tokens per minute) and a CircuitBreaker,
+      both shared process-wide unless given explicitly;
+    - failed calls are retried with decorrelated jitter, honouring retry-after hints, and
+      non-retryable errors (bad request, auth) are not retried at all;
+    - questions over transcript chunks (the map step) and merges of partial answers (the reduce step)
+      can go to different models, e.g. a lite model per chunk and a stronger one for the final answer.
+    Models are LLMBackend objects or specs for create_backend (Gemini model name or http:// URL);
+    by default they come from QA_MAP_MODEL / QA_REDUCE_MODEL, read when the engine is created.
+    With batch_max_tokens set, answer_jobs / answer_many pack jobs whose chunk has at most batch_job_max_tokens
+    tokens into shared requests (up to batch_max_tokens and batch_max_jobs each) that answer in JSON; jobs the
+    response does not answer properly are asked again one by one.
     """
-    def __init__(self, api_key, max_retries=3, base_delay=2):
+    def __init__(self, api_key=None, max_retries=3, base_delay=2, cache=None, model_name=None,
+                 limiter=None, breaker=None, max_delay=60, reduce_model_name=None, backend=None,
+                 reduce_backend=None, batch_max_tokens=None, batch_job_max_tokens=2000, batch_max_jobs=8):
         self.max_retries = max_retries
         self.base_delay = base_delay
-        genai.configure(api_key=api_key)
-        try:
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        except Exception as e:
-            logging.error(f"Failed to initialize Gemini model: {e}")
-            raise CustomException(f"Model initialization failed: {e}")
+        self.retry_policy = RetryPolicy(base_delay=base_delay, max_delay=max_delay)
+        self.limiter = limiter or get_shared_limiter()
+        self.breaker = breaker or get_shared_breaker()
+        # Optional ResponseCache (or anything with get(model, prompt) / set(model, prompt, text))
+        self.cache = cache
+        self.backend = create_backend(backend or model_name or os.getenv("QA_MAP_MODEL") or DEFAULT_MODEL, api_key)
+        reduce_backend = reduce_backend or reduce_model_name or os.getenv("QA_REDUCE_MODEL")
+        if reduce_backend and reduce_backend not in (self.backend, self.backend.name):
+            self.reduce_backend = create_backend(reduce_backend, api_key)
+        else:
+            self.reduce_backend = self.backend
+        logging.info("QAEngine models | Map: %s | Reduce: %s", self.backend.name, self.reduce_backend.name)
+        self.batch_max_tokens = batch_max_tokens
+        self.batch_job_max_tokens = batch_job_max_tokens
+        self.batch_max_jobs = max(2, batch_max_jobs)
+        # requests: batched requests sent, jobs: jobs they answered, fallbacks: jobs asked again one by one
+        self.batch_stats = {"requests": 0, "jobs": 0, "fallbacks": 0, "requests_saved": 0}
+        self._batch_lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        return self.backend.name
 
+    @property
+    def model(self):
+        # The genai.GenerativeModel-like object behind the map backend (GenerativeModelBackend only)
+        return self.backend.model
 
+    @model.setter
+    def model(self, model):
+        # Swaps the underlying model (tests, offline benchmarks); a shared map/reduce backend gets it for both
+        self.backend.model = model
 
 
-    def _call_llm_api(self, prompt):
-        # Helper to call Gemini and return text, raise for API errors
+
+
+    def _call_llm_api(self, prompt, backend=None, use_cache=True):
+        # Helper to call the model and return text, raise for API errors
+        backend = backend or self.backend
+        use_cache = use_cache and self.cache is not None
+        if use_cache:
+            cached = self.cache.get(backend.name, prompt)
+            if cached is not None:
+                logging.info("LLM response cache hit | Prompt length: %s", len(prompt))
+                current_span().set(cache_hit=True)
+                return cached
+        self._before_call(prompt)
         try:
-            response = self.model.generate_content(prompt)
-            if hasattr(response, "text"):
-                return response.text
-            return response.candidates[0]['content']['parts'][0]['text']  # fallback for other model, dig into the nested structure of the raw API response object:
+            text = backend.generate(prompt)
         except Exception as e:
-            logging.error(f"Gemini API Exception: {e}")
-            raise LLM_APIError
+            logging.error("LLM API Exception (%s): %s", backend.name, e)
+            self._after_failure(e)
+            raise LLM_APIError(e) from e
+        self.breaker.record_success()
+        # Only real model output reaches this point; failures and fallback strings are never cached
+        if use_cache and text not in FALLBACK_RESPONSES:
+            self.cache.set(backend.name, prompt, text)
+        return text
+
 
 
 
 
+    def _before_call(self, prompt):
+        # Fail fast while the circuit is open, otherwise wait for our share of the quota
+        self.breaker.before_call()
+        self.limiter.acquire(estimate_tokens(prompt))
 
-    def answer_question(self, transcript_chunk, question):
+    def _after_failure(self, error):
+        retryable, retry_after = classify_error(error)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # The API answered (e.g. 400/403), so it is up; this also ends a half-open trial
+            self.breaker.record_success()
+        if retry_after:
+            # Quota exceeded: hold back every caller in the process, not just this one
+            record("rate_limited")
+            self.limiter.pause(retry_after)
+
+    def _next_delay(self, error, attempt, delay):
         """
-        Answer a user question using a transcript chunk & QA prompt.
-        Handles retries, logs inputs/outputs/errors, returns answer string or fallback.
+        Returns how long to sleep before the next attempt, or None if the error should not be retried.
         """
-        prompt = f"""Given this transcript chunk from a YouTube video: {transcript_chunk} ,Answer this question as thoroughly and accurately as possible :{question}"""
-        logging.info(f"Attempting QA for question: '{question[:60]}...' | Chunk length: {len(transcript_chunk)}")
+        retryable, _ = classify_error(error)
+        if not retryable:
+            if not isinstance(error, CircuitOpenError):
+                record("non_retryable")
+            return None
+        if attempt >= self.max_retries:
+            return None
+        record("retries")
+        # A retry-after hint is already enforced by the shared limiter pause; this only adds jitter
+        return self.retry_policy.next_delay(delay)
+
+    def _with_retry(self, call, label, fallback):
+        """
+        Runs call() with the retry policy; returns its stripped text or fallback once retries are used up.
+        """
+        delay = None
         for attempt in range(1, self.max_retries + 1):
+            current_span().incr("attempts")
             try:
                 start_time = time.perf_counter()
-                answer = self._call_llm_api(prompt)
+                text = call()
+                duration = time.perf_counter() - start_time
+                logging.info("%s success (attempt %s) | Time: %.2fs | Length: %s", label, attempt, duration, len(text))
+                return text.strip()
+            except Exception as e:
+                delay = self._next_delay(e, attempt, delay)
+                if delay is None:
+                    logging.warning("%s attempt %s failed: %s. Not retrying.", label, attempt, e)
+                    break
+                logging.warning("%s attempt %s failed: %s. Retrying in %.2fs...", label, attempt, e, delay)
+                time.sleep(delay)
+        logging.error("QAEngine: Giving up on %s. Returning fallback.", label)
+        return fallback
+
+    def _traced_call(self, span_name, prompt, label, fallback, backend=None, use_cache=True, **attributes):
+        # One span per logical LLM call (all attempts), carrying model, sizes, token estimates and cache status
+        backend = backend or self.backend
+        with span(span_name, model=backend.name, input_chars=len(prompt), input_tokens=estimate_tokens(prompt),
+                  cache_hit=False, **attributes) as s:
+            text = self._with_retry(lambda: self._call_llm_api(prompt, backend, use_cache), label, fallback)
+            s.set(output_chars=len(text), output_tokens=estimate_tokens(text), fallback=text == fallback)
+            if text == fallback:
+                s.status = "fallback"
+            return text
+
+    def _stream_llm_api(self, prompt, backend=None):
+        # Streaming twin of _call_llm_api: yields text pieces as the model produces them
+        backend = backend or self.backend
+        if self.cache is not None:
+            cached = self.cache.get(backend.name, prompt)
+            if cached is not None:
+                logging.info("LLM response cache hit (stream) | Prompt length: %s", len(prompt))
+                yield cached
+                return
+        self._before_call(prompt)
+        pieces = []
+        try:
+            for text in backend.stream(prompt):
+                pieces.append(text)
+                yield text
+        except Exception as e:
+            logging.error("LLM API Exception (%s, stream): %s", backend.name, e)
+            self._after_failure(e)
+            raise LLM_APIError(e) from e
+        except BaseException:
+            # Closed before the end (the reader stopped, GeneratorExit) or interrupted: a half-open trial proved
+            # nothing, and leaving it marked as running would reject every later call
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        text = "".join(pieces)
+        if self.cache is not None and text and text not in FALLBACK_RESPONSES:
+            self.cache.set(backend.name, prompt, text)
+
+    def _stream_with_retry(self, prompt, label, fallback, backend=None):
+        # Retries only while nothing has been shown yet; once text is out, a failure ends the stream
+        delay = None
+        stream_start = time.perf_counter()
+        for attempt in range(1, self.max_retries + 1):
+            start_time = time.perf_counter()
+            first_piece_at = None
+            emitted = 0
+            try:
+                for piece in self._stream_llm_api(prompt, backend):
+                    if first_piece_at is None:
+                        first_piece_at = time.perf_counter() - start_time
+                        logging.info("%s stream first output (attempt %s) | Time to first output: %.2fs", label, attempt, first_piece_at)
+                    emitted += len(piece)
+                    yield piece
                 duration = time.perf_counter() - start_time
-                logging.info(f"QA success (attempt {attempt}) | Time: {duration:.2f}s | Answer length: {len(answer)}")
-                return answer.strip()
+                logging.info("%s stream success (attempt %s) | Time: %.2fs | Length: %s", label, attempt, duration, emitted)
+                record_span("stream_call", time.perf_counter() - stream_start, label=label, attempts=attempt,
+                            input_chars=len(prompt), input_tokens=estimate_tokens(prompt), output_chars=emitted,
+                            output_tokens=emitted // CHARS_PER_TOKEN, first_output_seconds=round(first_piece_at or duration, 4))
+                return
             except Exception as e:
-                wait = self.base_delay * (2 ** (attempt - 1))
-                logging.warning(f"QA attempt {attempt} failed: {e}. Retrying in {wait}s...")
-                time.sleep(wait)
-        logging.error("QAEngine: Max retries exceeded for QA. Returning fallback answer.")
-        return "My bad, I cant process your request at this time, try again."
+                if emitted:
+                    logging.error("%s stream broke after %s chars: %s", label, emitted, e)
+                    return
+                delay = self._next_delay(e, attempt, delay)
+                if delay is None:
+                    logging.warning("%s stream attempt %s failed: %s. Not retrying.", label, attempt, e)
+                    break
+                logging.warning("%s stream attempt %s failed: %s. Retrying in %.2fs...", label, attempt, e, delay)
+                time.sleep(delay)
+        logging.error("QAEngine: Giving up on %s stream. Returning fallback.", label)
+        record_span("stream_call", time.perf_counter() - stream_start, label=label, attempts=attempt,
+                    input_chars=len(prompt), status="fallback")
+        yield fallback
+
+    @staticmethod
+    def _qa_prompt(transcript_chunk, question):
+        return f"""Given this transcript chunk from a YouTube video: {transcript_chunk} ,Answer this question as thoroughly and accurately as possible :{question}"""
+
+    @staticmethod
+    def _summary_prompt(transcript_or_chunks):
+        if isinstance(transcript_or_chunks, list): 
+            input_text = " ".join(transcript_or_chunks)
+        else:
+            input_text = transcript_or_chunks
+        prompt = f"""Summarize the following YouTube transcript. Keep it concise, covering main topics, speakers, and key facts.Transcript: {input_text}  """
+        return input_text, prompt
+
+
+
+
+
+    def _qa_backend(self, final):
+        # A final answer (single-shot: the whole transcript, no reduce after it) goes to the reduce model
+        return self.reduce_backend if final else self.backend
+
+    def answer_question(self, transcript_chunk, question, chunk_index=None, final=False):
+        """
+        Answer a user question using a transcript chunk & QA prompt.
+        Handles retries, logs inputs/outputs/errors, returns answer string or fallback.
+        final=True: the answer is the final one (single-shot plans), so it is asked of the reduce model.
+        """
+        prompt = self._qa_prompt(transcript_chunk, question)
+        logging.info("Attempting QA for question: '%s...' | Chunk length: %s", question[:60], len(transcript_chunk))
+        return self._traced_call("map_call", prompt, "QA", QA_FALLBACK, self._qa_backend(final),
+                                 chunk_index=chunk_index)
+
+
+
+
+
+    def answer_many(self, transcript_chunks, question, max_concurrency=4, on_progress=None, chunk_indexes=None):
+        """
+        Map step: answer the same question over many transcript chunks concurrently.
+        Each chunk goes through answer_question (same retries and fallback), results keep chunk order.
+        on_progress(done, total) is called as each chunk finishes.
+        chunk_indexes (positions of the chunks in the transcript) only label the map_call spans.
+        """
+        chunks = list(transcript_chunks)
+        if not chunks:
+            return []
+        if self.batch_max_tokens:
+            return self.answer_jobs([(chunk, question) for chunk in chunks], max_concurrency=max_concurrency,
+                                    on_progress=on_progress, chunk_indexes=chunk_indexes)
+        chunk_indexes = list(chunk_indexes) if chunk_indexes is not None else list(range(len(chunks)))
+        workers = max(1, min(max_concurrency, len(chunks)))
+        logging.info("Answering %s chunk(s) with concurrency %s", len(chunks), workers)
+        start_time = time.perf_counter()
+        answers = [None] * len(chunks)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa-map") as pool:
+            futures = {submit_in_context(pool, self.answer_question, chunk, question, chunk_indexes[idx]): idx
+                       for idx, chunk in enumerate(chunks)}
+            # Callbacks run in the caller's thread, so UIs (e.g. Streamlit) can update from them
+            for done, future in enumerate(as_completed(futures), 1):
+                answers[futures[future]] = future.result()
+                if on_progress is not None:
+                    on_progress(done, len(chunks))
+        duration = time.perf_counter() - start_time
+        logging.info("Map step finished | Chunks: %s | Time: %.2fs", len(chunks), duration)
+        return answers
+
+
+
+
+
+
+    def _pack_jobs(self, jobs, positions):
+        """
+        Splits the small jobs at positions into consecutive groups that fit one batched request.
+        """
+        groups, current, chunks, tokens = [], [], set(), BATCH_OVERHEAD_TOKENS
+        for position in positions:
+            chunk, question = jobs[position]
+            # A chunk already in the group costs nothing more; its question does
+            cost = estimate_tokens(question) + (0 if chunk in chunks else estimate_tokens(chunk))
+            if current and (len(current) >= self.batch_max_jobs or tokens + cost > self.batch_max_tokens):
+                groups.append(current)
+                current, chunks, tokens = [], set(), BATCH_OVERHEAD_TOKENS
+                cost = estimate_tokens(question) + estimate_tokens(chunk)
+            current.append(position)
+            chunks.add(chunk)
+            tokens += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    def _answer_batched(self, jobs, final=False):
+        """
+        Asks one request for all jobs; returns {job position: answer} for the jobs it answered properly.
+        """
+        backend = self._qa_backend(final)
+        prompt = build_batch_prompt(jobs)
+        logging.info("Attempting batched QA | Jobs: %s | Prompt length: %s", len(jobs), len(prompt))
+        # Answers are cached per job below, so the packed prompt itself is not
+        text = self._traced_call("batch_call", prompt, "Batch QA", QA_FALLBACK, backend, use_cache=False,
+                                 jobs=len(jobs))
+        answers = parse_batch_answers(text, len(jobs)) if text != QA_FALLBACK else {}
+        if self.cache is not None:
+            for position, answer in answers.items():
+                self.cache.set(backend.name, self._qa_prompt(*jobs[position]), answer)
+        saved = len(answers) - 1
+        with self._batch_lock:
+            self.batch_stats["requests"] += 1
+            self.batch_stats["jobs"] += len(answers)
+            self.batch_stats["fallbacks"] += len(jobs) - len(answers)
+            self.batch_stats["requests_saved"] += saved
+        if saved > 0:
+            REQUESTS_SAVED.inc(saved)
+        if len(answers) < len(jobs):
+            logging.warning("Batched request answered %s of %s job(s); asking the rest one by one",
+                            len(answers), len(jobs))
+        return answers
+
+    def answer_questions(self, transcript_chunk, questions, chunk_index=None, final=False):
+        """
+        Answers several questions about one chunk with a single request (JSON keyed by question; the chunk is sent
+        once). Questions already cached are not asked again; questions the response leaves unanswered are asked
+        one by one. Returns the answers in question order. final: as in answer_question.
+        """
+        questions = list(questions)
+        answers = [None] * len(questions)
+        pending = []
+        for position, question in enumerate(questions):
+            cached = self.cache.get(self._qa_backend(final).name, self._qa_prompt(transcript_chunk, question)) \
+                if self.cache is not None else None
+            if cached is not None:
+                answers[position] = cached
+            else:
+                pending.append(position)
+        if len(pending) > 1:
+            result = self._answer_batched([(transcript_chunk, questions[position]) for position in pending], final)
+            for offset, position in enumerate(pending):
+                answers[position] = result.get(offset)
+        for position in pending:
+            if answers[position] is None:
+                answers[position] = self.answer_question(transcript_chunk, questions[position], chunk_index, final)
+        return answers
+
+    def answer_jobs(self, jobs, max_concurrency=4, on_progress=None, chunk_indexes=None):
+        """
+        Answers (transcript_chunk, question) jobs concurrently, results keep job order.
+        Jobs with small chunks are packed into batched requests when batch_max_tokens is set; jobs a batched
+        response leaves unanswered, and all other jobs, go through answer_question.
+        on_progress(done, total) is called as jobs finish; chunk_indexes only label the map_call spans.
+        """
+        jobs = [(chunk, question) for chunk, question in jobs]
+        if not jobs:
+            return []
+        chunk_indexes = list(chunk_indexes) if chunk_indexes is not None else list(range(len(jobs)))
+        answers = [None] * len(jobs)
+        small = []
+        for position, (chunk, question) in enumerate(jobs):
+            if not self.batch_max_tokens or estimate_tokens(chunk) > self.batch_job_max_tokens:
+                continue
+            cached = self.cache.get(self.backend.name, self._qa_prompt(chunk, question)) \
+                if self.cache is not None else None
+            if cached is not None:
+                answers[position] = cached
+            else:
+                small.append(position)
+        groups = [group for group in self._pack_jobs(jobs, small) if len(group) > 1] if len(small) > 1 else []
+        batched = {position for group in groups for position in group}
+        singles = [position for position in range(len(jobs)) if answers[position] is None and position not in batched]
+        done = len(jobs) - len(batched) - len(singles)
+        logging.info("Answering %s job(s) | Batched requests: %s (%s jobs) | Single calls: %s | Cached: %s",
+                     len(jobs), len(groups), len(batched), len(singles), done)
+        start_time = time.perf_counter()
+        workers = max(1, min(max_concurrency, len(groups) + len(singles)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa-map") as pool:
+
+            def ask(position):
+                chunk, question = jobs[position]
+                return submit_in_context(pool, self.answer_question, chunk, question, chunk_indexes[position])
+
+            pending = {ask(position): [position] for position in singles}
+            for group in groups:
+                pending[submit_in_context(pool, self._answer_batched, [jobs[position] for position in group])] = group
+            if done and on_progress is not None:
+                on_progress(done, len(jobs))
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                # Callbacks run in the caller's thread, so UIs (e.g. Streamlit) can update from them
+                for future in finished:
+                    positions = pending.pop(future)
+                    result = future.result()
+                    if isinstance(result, dict):
+                        for offset, position in enumerate(positions):
+                            if offset in result:
+                                answers[position] = result[offset]
+                            else:
+                                pending[ask(position)] = [position]
+                        answered = len(result)
+                    else:
+                        answers[positions[0]] = result
+                        answered = 1
+                    if answered:
+                        done += answered
+                        if on_progress is not None:
+                            on_progress(done, len(jobs))
+        logging.info("Jobs finished | Jobs: %s | Time: %.2fs", len(jobs), time.perf_counter() - start_time)
+        return answers
+
+    def summarize_many(self, inputs, max_concurrency=4):
+        """
+        Runs summarize_transcript over several inputs concurrently, results keep input order.
+        Used by the tree reduce to merge all groups of one level at the same time.
+        """
+        inputs = list(inputs)
+        if not inputs:
+            return []
+        workers = max(1, min(max_concurrency, len(inputs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa-reduce") as pool:
+            futures = [submit_in_context(pool, self.summarize_transcript, item) for item in inputs]
+            return [future.result() for future in futures]
 
 
 
@@ -77,22 +511,145 @@ class QAEngine:
         Summarize an entire transcript or list of chunks.
         Handles retries, logs steps, returns summary string or fallback.
         """
-        if isinstance(transcript_or_chunks, list): 
-            input_text = " ".join(transcript_or_chunks)
-        else:
-            input_text = transcript_or_chunks
-        prompt = f"""Summarize the following YouTube transcript. Keep it concise, covering main topics, speakers, and key facts.Transcript: {input_text}  """
-        logging.info(f"Attempting summarization | Input length: {len(input_text)}")
+        input_text, prompt = self._summary_prompt(transcript_or_chunks)
+        logging.info("Attempting summarization | Input length: %s", len(input_text))
+        return self._traced_call("summarize_call", prompt, "Summarization", SUMMARY_FALLBACK, self.reduce_backend)
+
+
+
+
+
+
+    def stream_answer(self, transcript_chunk, question, final=False):
+        """
+        Streaming answer_question: yields the answer text piece by piece as the model writes it.
+        """
+        logging.info("Streaming QA for question: '%s...' | Chunk length: %s", question[:60], len(transcript_chunk))
+        yield from self._stream_with_retry(self._qa_prompt(transcript_chunk, question), "QA", QA_FALLBACK,
+                                           self._qa_backend(final))
+
+    def stream_summary(self, transcript_or_chunks):
+        """
+        Streaming summarize_transcript: yields the summary text piece by piece as the model writes it.
+        """
+        input_text, prompt = self._summary_prompt(transcript_or_chunks)
+        logging.info("Streaming summarization | Input length: %s", len(input_text))
+        yield from self._stream_with_retry(prompt, "Summarization", SUMMARY_FALLBACK, self.reduce_backend)
+
+
+
+
+
+
+    # --- asyncio API: same prompts, cache, limiter, breaker and retry policy, no thread per call ---
+
+    async def _call_llm_api_async(self, prompt, backend=None):
+        # Async twin of _call_llm_api on the backend's generate_async
+        backend = backend or self.backend
+        if self.cache is not None:
+            # Cache lookups may touch SQLite, so they run off the event loop
+            cached = await asyncio.to_thread(self.cache.get, backend.name, prompt)
+            if cached is not None:
+                logging.info("LLM response cache hit (async) | Prompt length: %s", len(prompt))
+                current_span().set(cache_hit=True)
+                return cached
+        self.breaker.before_call()
+        try:
+            await self.limiter.acquire_async(estimate_tokens(prompt))
+            text = await backend.generate_async(prompt)
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
+        except Exception as e:
+            logging.error("LLM API Exception (%s, async): %s", backend.name, e)
+            self._after_failure(e)
+            raise LLM_APIError(e) from e
+        self.breaker.record_success()
+        if self.cache is not None and text not in FALLBACK_RESPONSES:
+            await asyncio.to_thread(self.cache.set, backend.name, prompt, text)
+        return text
+
+    async def _with_retry_async(self, prompt, label, fallback, backend=None):
+        # Cancellation (asyncio.CancelledError) is not an Exception, so it is never retried or swallowed
+        delay = None
         for attempt in range(1, self.max_retries + 1):
+            current_span().incr("attempts")
             try:
                 start_time = time.perf_counter()
-                summary = self._call_llm_api(prompt)
+                text = await self._call_llm_api_async(prompt, backend)
                 duration = time.perf_counter() - start_time
-                logging.info(f"Summarization success (attempt {attempt}) | Time: {duration:.2f}s | Summary length: {len(summary)}")
-                return summary.strip()
+                logging.info("%s success (async, attempt %s) | Time: %.2fs | Length: %s", label, attempt, duration, len(text))
+                return text.strip()
             except Exception as e:
-                wait = self.base_delay * (2 ** (attempt - 1))
-                logging.warning(f"Summarization attempt {attempt} failed: {e}. Retrying in {wait}s...")
-                time.sleep(wait)
-        logging.error("QAEngine: Max retries exceeded for summarization. Returning fallback summary.")
-        return "Summary unavailable due to system error."
+                delay = self._next_delay(e, attempt, delay)
+                if delay is None:
+                    logging.warning("%s attempt %s failed (async): %s. Not retrying.", label, attempt, e)
+                    break
+                logging.warning("%s attempt %s failed (async): %s. Retrying in %.2fs...", label, attempt, e, delay)
+                await asyncio.sleep(delay)
+        logging.error("QAEngine: Giving up on %s (async). Returning fallback.", label)
+        return fallback
+
+    async def _traced_call_async(self, span_name, prompt, label, fallback, backend=None, **attributes):
+        backend = backend or self.backend
+        with span(span_name, model=backend.name, input_chars=len(prompt), input_tokens=estimate_tokens(prompt),
+                  cache_hit=False, **attributes) as s:
+            text = await self._with_retry_async(prompt, label, fallback, backend)
+            s.set(output_chars=len(text), output_tokens=estimate_tokens(text), fallback=text == fallback)
+            if text == fallback:
+                s.status = "fallback"
+            return text
+
+    async def answer_question_async(self, transcript_chunk, question, chunk_index=None, final=False):
+        """
+        Async answer_question: same retries and fallback, waits without blocking the event loop.
+        """
+        logging.info("Attempting async QA for question: '%s...' | Chunk length: %s", question[:60], len(transcript_chunk))
+        return await self._traced_call_async("map_call", self._qa_prompt(transcript_chunk, question), "QA", QA_FALLBACK,
+                                             self._qa_backend(final), chunk_index=chunk_index)
+
+    async def summarize_transcript_async(self, transcript_or_chunks):
+        """
+        Async summarize_transcript.
+        """
+        input_text, prompt = self._summary_prompt(transcript_or_chunks)
+        logging.info("Attempting async summarization | Input length: %s", len(input_text))
+        return await self._traced_call_async("summarize_call", prompt, "Summarization", SUMMARY_FALLBACK,
+                                             self.reduce_backend)
+
+    async def answer_many_async(self, transcript_chunks, question, max_concurrency=64, on_progress=None,
+                                chunk_indexes=None):
+        """
+        Async map step: answers all chunks on the current event loop, at most max_concurrency in flight.
+        Results keep chunk order. Cancelling the caller cancels every chunk call still running.
+        """
+        chunks = list(transcript_chunks)
+        chunk_indexes = list(chunk_indexes) if chunk_indexes is not None else list(range(len(chunks)))
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        done = 0
+
+        async def answer(chunk, chunk_index):
+            nonlocal done
+            async with semaphore:
+                result = await self.answer_question_async(chunk, question, chunk_index)
+            done += 1
+            if on_progress is not None:
+                on_progress(done, len(chunks))
+            return result
+
+        start_time = time.perf_counter()
+        answers = await asyncio.gather(*(answer(chunk, idx) for chunk, idx in zip(chunks, chunk_indexes)))
+        logging.info("Async map step finished | Chunks: %s | Time: %.2fs", len(chunks), time.perf_counter() - start_time)
+        return list(answers)
+
+    async def summarize_many_async(self, inputs, max_concurrency=64):
+        """
+        Async summarize_many, results keep input order.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def summarize(item):
+            async with semaphore:
+                return await self.summarize_transcript_async(item)
+
+        return list(await asyncio.gather(*(summarize(item) for item in inputs)))
@@ -0,0 +1,274 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from logger import logging
+from exception import CircuitOpenError
+
+# Process-wide Gemini quota; defaults sit below the paid-tier limits of gemini-2.5-flash
+REQUESTS_PER_MINUTE = int(os.getenv("QA_REQUESTS_PER_MINUTE", "600"))
+TOKENS_PER_MINUTE = int(os.getenv("QA_TOKENS_PER_MINUTE", "1000000"))
+# Circuit breaker: consecutive failures that open it and seconds before a trial call is let through
+BREAKER_FAILURES = int(os.getenv("QA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("QA_BREAKER_RESET_SECONDS", "30"))
+
+# HTTP statuses worth retrying: timeouts, quota and server side errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Client errors that will fail the same way every time
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 409, 412, 413}
+RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+(?:\.\d+)?)"),  # google.rpc.RetryInfo in 429 details
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),    # "Please retry in 23.4s."
+]
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "limiter_waits": 0,
+    "limiter_wait_seconds": 0.0,
+    "retries": 0,
+    "rate_limited": 0,
+    "non_retryable": 0,
+    "circuit_rejections": 0,
+    "circuit_opens": 0,
+}
+
+
+def record(name, value=1):
+    with _metrics_lock:
+        _metrics[name] += value
+
+
+def metrics():
+    """
+    Snapshot of the limiter / retry counters shared by every QAEngine in this process.
+    """
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def _status_code(error):
+    # google.api_core errors expose the HTTP status as .code; requests-style errors via .response
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retry_after(error):
+    # requests-style errors carry headers on .response, urllib's HTTPError on the error itself
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    value = header.get("Retry-After") if hasattr(header, "get") else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    message = str(error)
+    for pattern in RETRY_AFTER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def classify_error(error):
+    """
+    Returns (retryable, retry_after seconds or None) for an exception raised by an LLM call.
+    Wrapped errors (LLM_APIError from ...) are classified by their cause.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False, None
+    while error.__cause__ is not None and _status_code(error) is None:
+        error = error.__cause__
+    status = _status_code(error)
+    if status in NON_RETRYABLE_STATUS:
+        return False, None
+    # Unknown errors (network resets, SDK hiccups) are treated as transient
+    return True, _retry_after(error) if status in (None, *RETRYABLE_STATUS) else None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute, holding at most capacity.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """
+        Takes amount tokens (going into debt if needed) and returns how long the caller must wait.
+        """
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Requests/min and tokens/min limits shared by all callers, plus a common pause after a 429.
+    Waits are reserved up front, so concurrent callers queue behind each other instead of all
+    retrying at the same moment.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until one request with the given token count may be sent. Returns the seconds waited.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=0):
+        """
+        Same as acquire, but waits with asyncio.sleep so the event loop keeps running.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def reserve(self, tokens=0):
+        """
+        Books one request with the given token count and returns how long the caller has to wait before sending it.
+        """
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self.lock:
+            wait = max(wait, self.paused_until - time.monotonic())
+        if wait > 0:
+            record("limiter_waits")
+            record("limiter_wait_seconds", wait)
+            logging.info("Rate limiter: waiting %.2fs before the next LLM call", wait)
+        return max(wait, 0.0)
+
+    def pause(self, seconds):
+        """
+        Holds every caller back for seconds (the server's retry-after hint after a 429).
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_seconds;
+    then one trial call is allowed (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError if calls are currently rejected.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at >= self.reset_seconds and not self.trial_running:
+                self.trial_running = True
+                return
+        record("circuit_rejections")
+        raise CircuitOpenError("LLM API circuit is open after repeated failures; failing fast.")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release_trial(self):
+        # A half-open trial call that was cancelled proved nothing; let the next caller try
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    logging.error("Circuit breaker opened after %s consecutive LLM failures", self.failures)
+                    record("circuit_opens")
+                self.opened_at = time.monotonic()
+                self.trial_running = False
+
+
+class RetryPolicy:
+    """
+    Decorrelated jitter backoff: each delay is random between base_delay and 3x the previous one,
+    capped at max_delay, so concurrent callers spread out instead of retrying in lockstep.
+    """
+
+    def __init__(self, base_delay=2, max_delay=60):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def next_delay(self, previous=None):
+        previous = previous or self.base_delay
+        return min(self.max_delay, random.uniform(self.base_delay, previous * 3))
+
+
+_shared_lock = threading.Lock()
+_shared = {}
+
+
+def get_shared_limiter():
+    with _shared_lock:
+        if "limiter" not in _shared:
+            _shared["limiter"] = RateLimiter()
+        return _shared["limiter"]
+
+
+def get_shared_breaker():
+    with _shared_lock:
+        if "breaker" not in _shared:
+            _shared["breaker"] = CircuitBreaker()
+        return _shared["breaker"]
+
+
+def reset_shared():
+    """
+    Drops the shared limiter/breaker and zeroes the counters (tests, long-lived workers after config changes).
+    """
+    with _shared_lock:
+        _shared.clear()
+    with _metrics_lock:
+        for name in _metrics:
+            _metrics[name] = 0.0 if isinstance(_metrics[name], float) else 0
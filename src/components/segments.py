@@ -0,0 +1,143 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from logger import logging
+from exception import CustomException
+
+# Segment texts are joined with this separator in the shared text buffer
+SEPARATOR = " "
+
+
+def format_timestamp(seconds):
+    """
+    Formats seconds as M:SS, or H:MM:SS for times past the first hour.
+    """
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+class SegmentView:
+    """
+    A contiguous range of segments [lo, hi) of a SegmentStore.
+    Holds only indexes into the store; the text is sliced from the shared buffer when asked for.
+    """
+
+    __slots__ = ("store", "lo", "hi")
+
+    def __init__(self, store, lo, hi):
+        self.store = store
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    @property
+    def char_start(self):
+        return self.store.offsets[self.lo]
+
+    @property
+    def char_end(self):
+        # offsets[hi] points past the separator that follows segment hi - 1
+        return max(self.char_start, self.store.offsets[self.hi] - len(SEPARATOR))
+
+    @property
+    def start_time(self):
+        return self.store.starts[self.lo] if self.hi > self.lo else None
+
+    @property
+    def end_time(self):
+        return self.store.end_time(self.hi - 1) if self.hi > self.lo else None
+
+    @property
+    def text(self):
+        return self.store.text[self.char_start:self.char_end]
+
+    def __repr__(self):
+        return f"SegmentView(segments={self.lo}:{self.hi}, time={self.start_time}-{self.end_time})"
+
+
+class SegmentStore:
+    """
+    Columnar, read-only store of timestamped transcript segments.
+    - start and duration are kept in float arrays (8 bytes per value instead of a dict per entry).
+    - All segment texts live in one string buffer, joined with single spaces; offsets[i] is where
+      segment i begins and offsets[len] is the end sentinel. text therefore equals the old
+      " ".join(entry['text'] ...) transcript.
+    - Time and character lookups are binary searches, so slicing a long video is O(log n).
+    """
+
+    def __init__(self, texts=(), starts=(), durations=()):
+        texts = list(texts)
+        self.starts = array("d", starts)
+        self.durations = array("d", durations)
+        if not (len(texts) == len(self.starts) == len(self.durations)):
+            raise CustomException("SegmentStore needs one start and one duration per segment text.")
+        self.text = SEPARATOR.join(texts)
+        self.offsets = array("q", [0])
+        position = 0
+        for text in texts:
+            position += len(text) + len(SEPARATOR)
+            self.offsets.append(position)
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Builds a store from transcript entries ({'text', 'start', 'duration'} dicts), ordered by start time.
+        """
+        entries = list(entries)
+        if any(entries[i]['start'] > entries[i + 1]['start'] for i in range(len(entries) - 1)):
+            logging.warning("Transcript entries were not ordered by start time; sorting them.")
+            entries.sort(key=lambda entry: entry['start'])
+        return cls(
+            (entry.get('text', '') for entry in entries),
+            (float(entry.get('start', 0.0)) for entry in entries),
+            (float(entry.get('duration', 0.0)) for entry in entries),
+        )
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment_text(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1] - len(SEPARATOR)]
+
+    def end_time(self, index):
+        return self.starts[index] + self.durations[index]
+
+    def entries(self):
+        """
+        Yields the segments back as {'text', 'start', 'duration'} dicts.
+        """
+        for i in range(len(self)):
+            yield {'text': self.segment_text(i), 'start': self.starts[i], 'duration': self.durations[i]}
+
+    def view(self, lo=0, hi=None):
+        return SegmentView(self, lo, len(self) if hi is None else hi)
+
+    def slice_time(self, start_seconds, end_seconds):
+        """
+        Returns a view of the segments that overlap [start_seconds, end_seconds).
+        """
+        lo = bisect_right(self.starts, start_seconds) - 1
+        if lo < 0 or self.end_time(lo) <= start_seconds:
+            lo += 1
+        hi = max(lo, bisect_left(self.starts, end_seconds))
+        return SegmentView(self, lo, hi)
+
+    def segment_at_offset(self, char_offset):
+        """
+        Index of the segment containing the character at char_offset of text (a separator counts
+        towards the segment before it).
+        """
+        return min(max(bisect_right(self.offsets, char_offset) - 1, 0), len(self) - 1)
+
+    def time_span(self, char_start, char_end):
+        """
+        Maps a [char_start, char_end) range of text to its (start, end) time in seconds.
+        """
+        if not len(self):
+            return None, None
+        first = self.segment_at_offset(char_start)
+        last = self.segment_at_offset(max(char_start, char_end - 1))
+        return self.starts[first], self.end_time(last)
@@ -0,0 +1,403 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+# Before the logger and component imports, which read LOG_* / QA_* / SERVICE_* at import time
+load_dotenv()
+from logger import logging, setup_logging
+from exception import InvalidYouTubeURLError, ServiceUnavailableError
+from components.transcript_retriever import TranscriptRetriever
+from components.cache import TranscriptCache
+from components.preprocessor import Preprocessor
+from components.pipeline import StreamingPipeline
+from components.main import MAX_CONCURRENCY, build_engine, build_planner, require_api_key
+from components.metrics import registry, span, trace
+
+# Address the service listens on
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+# Videos answered at the same time, and jobs waiting for a worker before new ones are refused with 503
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "2"))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "16"))
+# On SIGTERM / Ctrl+C: how long queued and running jobs get to finish before the workers are stopped
+SERVICE_DRAIN_SECONDS = float(os.getenv("SERVICE_DRAIN_SECONDS", "30"))
+# How long finished jobs can still be polled
+SERVICE_JOB_TTL_SECONDS = float(os.getenv("SERVICE_JOB_TTL_SECONDS", "600"))
+
+QUEUED, RUNNING, DONE, ERROR = "queued", "running", "done", "error"
+# How often idle workers look at the stop flag (seconds)
+_POLL_SECONDS = 0.1
+
+REQUESTS = registry.counter("service_requests_total", "Jobs submitted to the service, by result.")
+
+
+class Job:
+    """
+    One (video, question) execution. The answer is appended piece by piece as the final reduce streams it,
+    so any number of clients can follow it; every client of a coalesced request reads the same job.
+    """
+
+    def __init__(self, job_id, video_id, url, question):
+        self.job_id = job_id
+        self.video_id = video_id
+        self.url = url
+        self.question = question
+        self.status = QUEUED
+        self.pieces = []
+        self.error = None
+        self.progress = (0, 0)
+        # Requests served by this job, the first one included
+        self.requests = 1
+        self.created = time.time()
+        self.finished_at = None
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, ERROR)
+
+    def _update(self, **changes):
+        with self.condition:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.condition.notify_all()
+
+    def append(self, piece):
+        with self.condition:
+            self.pieces.append(piece)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        self._update(status=ERROR if error else DONE, error=error, finished_at=time.time())
+
+    def follow(self, timeout=None):
+        """
+        Yields the answer pieces as they arrive until the job is finished; raises TimeoutError when nothing
+        happens for timeout seconds.
+        """
+        position = 0
+        while True:
+            with self.condition:
+                if not self.condition.wait_for(lambda: len(self.pieces) > position or self.finished, timeout):
+                    raise TimeoutError(f"Job {self.job_id} sent nothing for {timeout}s")
+                pieces = self.pieces[position:]
+                finished = self.finished
+            position += len(pieces)
+            yield from pieces
+            if finished:
+                return
+
+    def as_dict(self):
+        with self.condition:
+            done, total = self.progress
+            data = {"job_id": self.job_id, "video_id": self.video_id, "question": self.question,
+                    "status": self.status, "requests": self.requests,
+                    "progress": {"chunks_done": done, "chunks_total": total}, "answer": "".join(self.pieces)}
+            if self.error:
+                data["error"] = self.error
+            if self.finished_at:
+                data["seconds"] = round(self.finished_at - self.created, 3)
+        return data
+
+
+class SummaryService:
+    """
+    Headless summarization / QA service: a bounded job queue in front of a pool of worker threads.
+    - Each job fetches the transcript (through the transcript cache, prefetched while the job is queued) and runs it through the StreamingPipeline
+      (the planner's staged execution when pipelining does not apply), appending the answer as it streams.
+    - Singleflight: while a job for a video ID and question is queued or running, submitting the same pair again
+      returns that job instead of starting a second execution; finished answers are served again from the
+      engine's response cache.
+    - A full queue or a draining service refuses new jobs (ServiceUnavailableError), so load is shed at the door
+      instead of piling up; shutdown drains queued and running jobs for a bounded time.
+    """
+
+    def __init__(self, planner, engine, transcript_cache=None, source=None, workers=2, queue_size=16,
+                 map_concurrency=4, job_ttl=600):
+        self.planner = planner
+        self.engine = engine
+        # One retriever (one pooled connection session) for every job; source is YouTube by default,
+        # FakeTranscriptSource in load tests
+        self.retriever = TranscriptRetriever(cache=transcript_cache, source=source)
+        self.workers = max(1, workers)
+        self.pipeline = StreamingPipeline(planner, max_concurrency=map_concurrency, preprocessor=Preprocessor())
+        self.job_ttl = job_ttl
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.jobs = {}
+        # (video_id, question) -> the queued or running job answering it
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.running = 0
+        self.draining = False
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"service-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def ready(self):
+        """
+        True while the service takes new jobs (running, not draining, queue not full).
+        """
+        return bool(self._threads) and not self.draining and not self.queue.full()
+
+    @staticmethod
+    def resolve(url=None, video_id=None):
+        """
+        Returns (video_id, url) for a YouTube URL or a bare video ID; raises InvalidYouTubeURLError.
+        """
+        if not url and video_id:
+            url = f"https://www.youtube.com/watch?v={video_id}"
+        if not url or not TranscriptRetriever.is_valid_youtube_url(url):
+            raise InvalidYouTubeURLError("Not a valid YouTube URL")
+        return TranscriptRetriever(url).fetch_uid_yt(url), url
+
+    def submit(self, url=None, video_id=None, question=""):
+        """
+        Returns (job, coalesced): the job answering question about the video, and whether it was already
+        in flight. Raises InvalidYouTubeURLError or ServiceUnavailableError.
+        """
+        video_id, url = self.resolve(url, video_id)
+        question = (question or "").strip()
+        key = (video_id, question)
+        with self.lock:
+            self._expire()
+            job = self.inflight.get(key)
+            if job is not None:
+                with job.condition:
+                    job.requests += 1
+                REQUESTS.inc(result="coalesced")
+                return job, True
+            if self.draining:
+                REQUESTS.inc(result="rejected")
+                raise ServiceUnavailableError("Service is shutting down")
+            job = Job(str(next(self.ids)), video_id, url, question)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                REQUESTS.inc(result="rejected")
+                raise ServiceUnavailableError(f"Job queue is full ({self.queue.maxsize} waiting)")
+            self.jobs[job.job_id] = job
+            self.inflight[key] = job
+        # The transcript downloads while the job waits for a worker
+        self.retriever.prefetch([url])
+        REQUESTS.inc(result="accepted")
+        logging.info("Service: job %s queued for video %s", job.job_id, video_id)
+        return job, False
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _expire(self):
+        # Called with self.lock held
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            with self.lock:
+                self.running += 1
+            try:
+                self.run(job)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.inflight.pop((job.video_id, job.question), None)
+                self.queue.task_done()
+
+    def run(self, job):
+        """
+        Executes a job in the calling thread; errors are recorded on the job.
+        """
+        job._update(status=RUNNING)
+        # Spans of this job (retrieve, clean, chunk, map, reduce) are labelled with its video
+        with trace(video_id=job.video_id):
+            try:
+                with span("job"):
+                    raw_segments = self.retriever.fetch_segments(job.url)
+                    progress = lambda done, total: job._update(progress=(done, total))
+                    for piece in self.pipeline.stream(raw_segments, self.engine, job.question, on_progress=progress):
+                        job.append(piece)
+                job.finish()
+                logging.info("Service: job %s done (%s request(s))", job.job_id, job.requests)
+            except Exception as e:
+                logging.warning("Service: job %s for video %s failed: %s", job.job_id, job.video_id, e)
+                job.finish(error=f"{type(e).__name__}: {e}")
+
+    def shutdown(self, drain_seconds=30):
+        """
+        Refuses new jobs, waits up to drain_seconds for queued and running jobs, then stops the workers.
+        Returns True when everything finished in time.
+        """
+        self.draining = True
+        deadline = time.monotonic() + drain_seconds
+        busy = True
+        while time.monotonic() < deadline:
+            with self.lock:
+                busy = self.running or not self.queue.empty()
+            if not busy:
+                break
+            time.sleep(_POLL_SECONDS)
+        drained = not busy
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()) + _POLL_SECONDS)
+        # Jobs nobody got to are finished as errors, so clients waiting on them return
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            job.finish(error="ServiceUnavailableError: service shut down before the job ran")
+            with self.lock:
+                self.inflight.pop((job.video_id, job.question), None)
+        self.retriever.close()
+        logging.info("Service stopped (%s)", "drained" if drained else f"drain timed out after {drain_seconds}s")
+        return drained
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once; the default listen backlog of 5 resets connections under load
+    request_queue_size = 128
+
+
+def make_server(service, host="127.0.0.1", port=8080):
+    """
+    HTTP front end of a SummaryService (not started; call serve_forever):
+    - POST /jobs {"url" or "video_id", "question"} -> 202 {"job_id", "status", "coalesced"}; 503 when full
+    - GET /jobs/<id> -> status, progress and the answer so far; GET /jobs/<id>/stream -> the answer as text
+    - GET /healthz (process alive), GET /readyz (taking jobs), GET /metrics (Prometheus text)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, headers=None):
+            payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "text/plain; version=0.0.4" if isinstance(body, str)
+                             else "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/jobs":
+                self.send_error(404)
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                job, coalesced = service.submit(request.get("url"), request.get("video_id"),
+                                                request.get("question", ""))
+            except (ValueError, AttributeError, InvalidYouTubeURLError) as e:
+                self._send(400, {"error": f"Bad request: {e}"})
+                return
+            except ServiceUnavailableError as e:
+                self._send(503, {"error": str(e.args[0])}, {"Retry-After": "1"})
+                return
+            self._send(202, {"job_id": job.job_id, "status": job.status, "coalesced": coalesced},
+                       {"Location": f"/jobs/{job.job_id}"})
+
+        def do_GET(self):
+            path = urlparse(self.path).path.rstrip("/")
+            if path == "/healthz":
+                self._send(200, {"status": "ok"})
+            elif path == "/readyz":
+                ready = service.ready
+                self._send(200 if ready else 503, {"ready": ready, "draining": service.draining,
+                                                    "queued": service.queue.qsize(), "running": service.running})
+            elif path == "/metrics":
+                self._send(200, registry.to_prometheus())
+            elif path.startswith("/jobs/"):
+                job_id, _, action = path[len("/jobs/"):].partition("/")
+                job = service.get(job_id)
+                if job is None or action not in ("", "stream"):
+                    self.send_error(404)
+                elif action == "stream":
+                    self._stream(job)
+                else:
+                    self._send(200, job.as_dict())
+            else:
+                self.send_error(404)
+
+        def _stream(self, job):
+            # HTTP/1.0 response without Content-Length: the answer ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.end_headers()
+            try:
+                for piece in job.follow():
+                    self.wfile.write(piece.encode("utf-8"))
+                    self.wfile.flush()
+                if job.status == ERROR:
+                    self.wfile.write(f"\n[ERROR] {job.error}\n".encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                logging.info("Service: client stopped following job %s", job.job_id)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ServiceHTTPServer((host, port), Handler)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service that summarizes / answers questions about videos.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=SERVICE_WORKERS, help="Videos answered at the same time.")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE,
+                        help="Jobs waiting for a worker before new ones get 503.")
+    parser.add_argument("--drain-seconds", type=float, default=SERVICE_DRAIN_SECONDS,
+                        help="On shutdown, how long running and queued jobs get to finish.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    service = SummaryService(build_planner(), build_engine(require_api_key()), transcript_cache=TranscriptCache(),
+                             workers=args.workers, queue_size=args.queue_size, map_concurrency=MAX_CONCURRENCY,
+                             job_ttl=SERVICE_JOB_TTL_SECONDS).start()
+    server = make_server(service, args.host, args.port)
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            return
+        stopping.set()
+        logging.info("Signal %s received; draining for up to %ss", signum, args.drain_seconds)
+        print(f"\n[INFO] Shutting down, finishing running jobs (up to {args.drain_seconds}s)...", flush=True)
+        # serve_forever keeps answering polls while the workers drain; shutdown() must not run in its thread
+        threading.Thread(target=lambda: (service.shutdown(args.drain_seconds), server.shutdown()),
+                         name="service-shutdown").start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Summary service listening on http://{args.host}:{server.server_port} (Ctrl+C to stop)", flush=True)
+    logging.info("Summary service listening on %s:%d with %d worker(s)", args.host, server.server_port, args.workers)
+    server.serve_forever()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
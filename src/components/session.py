@@ -0,0 +1,110 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logger import logging
+from exception import CustomException
+from components.metrics import span, submit_in_context
+from components.planner import SINGLE_SHOT, SUMMARY_CHUNK_PROMPT
+
+
+class VideoSession:
+    """
+    One cleaned transcript, many questions. ask plans every question, then makes a single map pass:
+    - each chunk any question needs is sent once, with all the questions that need it (QAEngine.answer_questions
+      asks them in one request and gets the answers back keyed by question);
+    - the answers are then split per question and each question runs its own reduce, all reduces in parallel.
+    N questions over C chunks thus cost about C + N LLM calls instead of N x (C + 1). Questions answered
+    single-shot share one call on the whole transcript and need no reduce.
+    """
+
+    def __init__(self, transcript, planner, engine, max_concurrency=4):
+        self.transcript = transcript
+        self.planner = planner
+        self.engine = engine
+        self.max_concurrency = max(1, max_concurrency)
+
+    def plan(self, questions):
+        """
+        One ExecutionPlan per question; the planner's chunk memo chunks the transcript once for all of them.
+        """
+        return [self.planner.plan(self.transcript, question) for question in questions]
+
+    def ask(self, questions, on_progress=None):
+        """
+        Returns one answer per question, in question order; on_progress(done, total) counts answered chunks.
+        """
+        return self.answer_plans(self.plan(questions), on_progress=on_progress)
+
+    @staticmethod
+    def _map_question(plan):
+        if plan.strategy == SINGLE_SHOT:
+            return plan.question.strip() or "Summarize the video."
+        return plan.question.strip() or SUMMARY_CHUNK_PROMPT
+
+    def _map_jobs(self, plans):
+        # chunk text -> (chunk index, distinct map questions, final); chunks are matched by text, so plans that
+        # chunked differently (or compressed their chunks) simply get their own calls. Single-shot plans share
+        # the whole-transcript chunk, and their answers are final, so it goes to the reduce model
+        jobs = {}
+        for plan in plans:
+            for idx in plan.map_chunks:
+                questions = jobs.setdefault(plan.chunks[idx], (idx, [], plan.strategy == SINGLE_SHOT))[1]
+                question = self._map_question(plan)
+                if question not in questions:
+                    questions.append(question)
+        return jobs
+
+    def answer_plans(self, plans, on_progress=None):
+        """
+        Executes the plans of several questions on this transcript together; returns their answers in order.
+        """
+        plans = list(plans)
+        if not plans:
+            return []
+        try:
+            start_time = time.perf_counter()
+            jobs = self._map_jobs(plans)
+            answers = {}  # (chunk text, map question) -> answer
+            with span("map", chunks=len(jobs), questions=len(plans)):
+                workers = max(1, min(self.max_concurrency, len(jobs)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session-map") as pool:
+                    futures = {submit_in_context(pool, self.engine.answer_questions, chunk, questions, chunk_index,
+                                                 final): chunk
+                               for chunk, (chunk_index, questions, final) in jobs.items()}
+                    # Callbacks run in the caller's thread, so UIs (e.g. Streamlit) can update from them
+                    for done, future in enumerate(as_completed(futures), 1):
+                        chunk = futures[future]
+                        answers.update(((chunk, question), answer)
+                                       for question, answer in zip(jobs[chunk][1], future.result()))
+                        if on_progress is not None:
+                            on_progress(done, len(jobs))
+            separate_calls = sum(plan.estimated_calls for plan in plans)
+            with span("reduce", questions=len(plans)):
+                results = self._reduce(plans, answers)
+            logging.info("Session answered %s question(s) | Map requests: %s (separately: %s LLM calls) | Time: %.2fs",
+                         len(plans), len(jobs), separate_calls, time.perf_counter() - start_time)
+            return results
+        except CustomException:
+            raise
+        except Exception as e:
+            logging.error("Exception while answering session questions: %s", e)
+            raise CustomException(e)
+
+    def _reduce(self, plans, answers):
+        results = [None] * len(plans)
+        reduces = []
+        for position, plan in enumerate(plans):
+            question = self._map_question(plan)
+            chunk_answers = plan.fan_out([answers[(plan.chunks[idx], question)] for idx in plan.map_chunks])
+            if plan.strategy == SINGLE_SHOT:
+                results[position] = chunk_answers[0]
+            else:
+                reduces.append((position, plan, chunk_answers))
+        if reduces:
+            workers = max(1, min(self.max_concurrency, len(reduces)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session-reduce") as pool:
+                futures = {submit_in_context(pool, self.planner.reduce, chunk_answers, plan.question, self.engine,
+                                             max_concurrency=self.max_concurrency): position
+                           for position, plan, chunk_answers in reduces}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        return results
@@ -1,26 +1,178 @@
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from youtube_transcript_api import YouTubeTranscriptApi
 from logger import logging
 from exception import CustomException
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, quote
 from exception import CustomException, TranscriptNotFoundError, InvalidYouTubeURLError
+from components.segments import SegmentStore
+from components.metrics import current_span, span
 from youtube_transcript_api._errors import NoTranscriptFound, CouldNotRetrieveTranscript
 
+# Where transcripts come from: YouTube by default, or an http(s):// URL served with the HTTPTranscriptSource contract
+TRANSCRIPT_SOURCE = os.getenv("QA_TRANSCRIPT_SOURCE", "")
+# Preferred caption languages in order; with the fallback on, a video without any of them uses its first transcript
+TRANSCRIPT_LANGUAGES = [code.strip() for code in os.getenv("QA_TRANSCRIPT_LANGUAGES", "en").split(",") if code.strip()]
+TRANSCRIPT_LANGUAGE_FALLBACK = os.getenv("QA_TRANSCRIPT_LANGUAGE_FALLBACK", "1") != "0"
+# Connect and read timeout of every transcript request (seconds)
+TRANSCRIPT_TIMEOUT = float(os.getenv("QA_TRANSCRIPT_TIMEOUT", "15"))
+# Transcripts downloaded at the same time by fetch_many / prefetch
+TRANSCRIPT_FETCH_WORKERS = int(os.getenv("QA_TRANSCRIPT_FETCH_WORKERS", "4"))
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default timeout to requests sent without one (requests has no session timeout).
+    """
+
+    def __init__(self, timeout=TRANSCRIPT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(pool_size=10, timeout=TRANSCRIPT_TIMEOUT):
+    """
+    requests.Session keeping up to pool_size connections per host alive (no new TCP/TLS handshake per video),
+    with timeout applied to every request.
+    """
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(timeout=timeout, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def pick_language(available, preferred, fallback=True):
+    """
+    First language code of preferred that is available ("en" also matches "en-US"); the first available
+    one when none is and fallback is on, else None.
+    """
+    available = list(available)
+    for code in preferred:
+        if code in available:
+            return code
+        for candidate in available:
+            if candidate.split("-")[0] == code.split("-")[0]:
+                return candidate
+    return available[0] if fallback and available else None
+
+
+class YouTubeSource:
+    """
+    YouTube captions through youtube_transcript_api, over one pooled session with timeouts. Manually created
+    transcripts win over generated ones in the same language. youtube_transcript_api releases before 1.0 (static
+    get_transcript, no session) are still supported, without the pooling and the language fallback.
+    """
+
+    def __init__(self, languages=None, fallback=TRANSCRIPT_LANGUAGE_FALLBACK, session=None, timeout=TRANSCRIPT_TIMEOUT):
+        self.languages = list(languages or TRANSCRIPT_LANGUAGES)
+        self.fallback = fallback
+        self.session = session or create_session(timeout=timeout)
+        self._api = None
+
+    def get_transcript(self, video_id):
+        get_transcript = getattr(YouTubeTranscriptApi, "get_transcript", None)
+        if get_transcript is not None:
+            return get_transcript(video_id, languages=self.languages)
+        if self._api is None:
+            self._api = YouTubeTranscriptApi(http_client=self.session)
+        transcripts = self._api.list(video_id)
+        code = pick_language([transcript.language_code for transcript in transcripts], self.languages, self.fallback)
+        if code is None:
+            raise NoTranscriptFound(video_id, self.languages, transcripts)
+        return transcripts.find_transcript([code]).fetch().to_raw_data()
+
+
+class HTTPTranscriptSource:
+    """
+    Transcripts behind a minimal JSON endpoint, over one pooled session with timeouts:
+    GET url/transcripts/<video_id> -> {"languages": [codes]}, GET url/transcripts/<video_id>/<code> -> {"entries": [...]}.
+    Used with the local stand-in server (components.internalTesting.fake_transcript_server) for tests and load
+    tests, or a self-hosted caption store. A 404 raises TranscriptNotFoundError.
+    """
+
+    def __init__(self, url, languages=None, fallback=TRANSCRIPT_LANGUAGE_FALLBACK, session=None,
+                 timeout=TRANSCRIPT_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.languages = list(languages or TRANSCRIPT_LANGUAGES)
+        self.fallback = fallback
+        self.session = session or create_session(timeout=timeout)
+
+    def _get(self, path, video_id):
+        response = self.session.get(f"{self.url}/transcripts/{path}")
+        if response.status_code == 404:
+            raise TranscriptNotFoundError(f"No transcript for video {video_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def get_transcript(self, video_id):
+        video = quote(video_id, safe="")
+        code = pick_language(self._get(video, video_id).get("languages", []), self.languages, self.fallback)
+        if code is None:
+            raise TranscriptNotFoundError(f"No transcript in {', '.join(self.languages)} for video {video_id}")
+        return self._get(f"{video}/{quote(code, safe='')}", video_id)["entries"]
+
+
+def create_source(source=TRANSCRIPT_SOURCE, **kwargs):
+    """
+    Transcript source for a spec: an object with get_transcript is returned as is, an http(s):// URL gives an
+    HTTPTranscriptSource, anything else (empty) YouTube.
+    """
+    if hasattr(source, "get_transcript"):
+        return source
+    if source and source.startswith(("http://", "https://")):
+        return HTTPTranscriptSource(source, **kwargs)
+    return YouTubeSource(**kwargs)
+
+
+_default_source = None
+_default_source_lock = threading.Lock()
+
+
+def get_default_source():
+    """
+    Process-wide source (QA_TRANSCRIPT_SOURCE), so retrievers built per URL share one connection pool.
+    """
+    global _default_source
+    with _default_source_lock:
+        if _default_source is None:
+            _default_source = create_source()
+        return _default_source
+
 
 class TranscriptRetriever():
     '''
     Class to fetch the transcript of the youtube video
     '''
     
-    def __init__(self,youtube_url):
+    def __init__(self,youtube_url=None,cache=None,source=None,max_workers=TRANSCRIPT_FETCH_WORKERS):
         self.youtube_url=youtube_url
+        # Optional TranscriptCache, shared entries are keyed by video ID so every URL format hits the same one
+        self.cache=cache
+        # Anything with get_transcript(video_id) -> entries; the shared pooled YouTube source by default, fakes in benchmarks
+        self.source=source or get_default_source()
+        # Bounded pool for fetch_many / prefetch, started on first use
+        self.max_workers=max(1, max_workers)
+        self._pool=None
+        # video ID -> Future of its entries, fetched ahead of fetch_segments
+        self._pending={}
+        self._lock=threading.Lock()
 
     @staticmethod
     def is_valid_youtube_url(url):
         '''
         Checks if the URL is a valid YouTube link to prevent unnecesary API call
         '''
-        logging.info(f"Checking for valid URL->{url}")
+        logging.info("Checking for valid URL->%s", url)
         youtube_pattern = re.compile(r'^(https?://)?(www\.)?(youtube\.com|youtu\.be)/.+')
         return bool(youtube_pattern.match(url))
     
@@ -31,8 +183,8 @@ class TranscriptRetriever():
      parsed_url = urlparse(youtube_url)
      if "youtu.be" in parsed_url.netloc:
         # Short link format: youtu.be/VIDEO_ID
-        uid = parsed_url.path.lstrip("/")
-        logging.info(f"Fetched youtube url uid -> {uid}")
+        uid = parsed_url.path.lstrip("/").split("/")[0]
+        logging.info("Fetched youtube url uid -> %s", uid)
      elif "youtube.com" in parsed_url.netloc:
         if parsed_url.path == "/watch":
             # Standard format: yout     ube.com/watch?v=VIDEO_ID
@@ -40,13 +192,13 @@ class TranscriptRetriever():
             uid_list = query_params.get("v")
             if uid_list:
                 uid = uid_list[0]
-                logging.info(f"Fetched youtube url uid -> {uid}")
+                logging.info("Fetched youtube url uid -> %s", uid)
             else:
                 raise InvalidYouTubeURLError("No video ID found in query parameters.")
         elif parsed_url.path.startswith("/shorts/"):
             # Shorts format: youtube.com/shorts/VIDEO_ID
             uid = parsed_url.path.split("/shorts/")[-1].split("/")[0]
-            logging.info(f"Fetched youtube url uid -> {uid}")
+            logging.info("Fetched youtube url uid -> %s", uid)
         else:
             raise InvalidYouTubeURLError("URL does not match recognized YouTube formats.")
      else:
@@ -54,26 +206,112 @@ class TranscriptRetriever():
      return uid
 
 
-    def fetch_transcript(self, youtube_url):
+    def fetch_entries(self, uid):
         '''
-        Retrieves and returns the transcript 
+        Returns the raw transcript entries for a video ID, served from the cache when possible
+        '''
+        entries, cache_hit = self._load_entries(uid)
+        if cache_hit:
+            current_span().set(cache_hit=True)
+        return entries
+
+    def _load_entries(self, uid):
+        # (entries, served from the cache); prefetches run this in the pool, where no span is current
+        if self.cache is not None:
+            cached = self.cache.get(uid)
+            if cached is not None:
+                return cached, True
+
+        # Get transcript directly using get_transcript
+        transcript = self.source.get_transcript(uid)
+        entries = [
+            {'text': entry.get('text', ''), 'start': entry.get('start', 0.0), 'duration': entry.get('duration', 0.0)}
+            for entry in transcript
+        ]
+        if self.cache is not None:
+            self.cache.set(uid, entries)
+        return entries, False
+
+    def prefetch(self, youtube_urls):
+        '''
+        Starts downloading the transcripts of youtube_urls in the background (at most max_workers at a time);
+        fetch_segments then waits for the download instead of starting one. Invalid URLs are left to fetch_segments.
+        '''
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="transcript-fetch")
+            for youtube_url in youtube_urls:
+                try:
+                    uid = self.fetch_uid_yt(youtube_url)
+                except InvalidYouTubeURLError:
+                    continue
+                if uid not in self._pending:
+                    self._pending[uid] = self._pool.submit(self._load_entries, uid)
+
+    def fetch_many(self, youtube_urls):
+        '''
+        Fetches many transcripts concurrently (at most max_workers at a time).
+        Returns [(url, SegmentStore or None, exception or None)] in input order.
+        '''
+        youtube_urls = list(youtube_urls)
+        self.prefetch(youtube_urls)
+        results = []
+        for youtube_url in youtube_urls:
+            try:
+                results.append((youtube_url, self.fetch_segments(youtube_url), None))
+            except CustomException as e:
+                results.append((youtube_url, None, e))
+        return results
+
+    def close(self):
         '''
-        if not self.is_valid_youtube_url(self.youtube_url):
+        Cancels prefetches nobody asked for yet and stops the fetch pool.
+        '''
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._pending.clear()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fetch_segments(self, youtube_url):
+        '''
+        Retrieves the transcript as a SegmentStore, keeping each entry's start and duration
+        '''
+        if not self.is_valid_youtube_url(youtube_url):
             logging.error("Got invalid URL, Raising error Valid URL")
             raise InvalidYouTubeURLError("Not a valid YouTube URL")
         
         try:
             uid = self.fetch_uid_yt(youtube_url)
-            logging.info(f"Fetched uid ->{uid} and Fetching transcription")
-            
-            # Get transcript directly using get_transcript
-            transcript = YouTubeTranscriptApi.get_transcript(uid)
-            # Join all text entries
-            transcript_text = " ".join(entry.get('text', '') for entry in transcript)
-            return transcript_text
+            logging.info("Fetched uid ->%s and Fetching transcription", uid)
+            with self._lock:
+                pending = self._pending.pop(uid, None)
+
+            with span("retrieve", video_id=uid, cache_hit=False, prefetched=pending is not None) as s:
+                # A prefetched transcript only costs the wait for what is left of its download
+                entries, cache_hit = pending.result() if pending is not None else self._load_entries(uid)
+                s.set(cache_hit=cache_hit)
+                segments = SegmentStore.from_entries(entries)
+                s.set(segments=len(segments), output_chars=len(segments.text))
+            return segments
         except (NoTranscriptFound, CouldNotRetrieveTranscript) as ce:
-            logging.error(f"Transcript error: {ce}")
+            logging.error("Transcript error: %s", ce)
             raise TranscriptNotFoundError(ce)
+        except CustomException:
+            raise
         except Exception as e:
-            logging.error(f"Unexpected error: {e}")
-            raise CustomException(e)
\ No newline at end of file
+            logging.error("Unexpected error: %s", e)
+            raise CustomException(e)
+
+    def fetch_transcript(self, youtube_url):
+        '''
+        Retrieves and returns the transcript 
+        '''
+        # The segment buffer is already the entry texts joined with single spaces
+        return self.fetch_segments(youtube_url).text
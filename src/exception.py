@@ -26,4 +26,12 @@ class InvalidYouTubeURLError(CustomException):
 
 class LLM_APIError(CustomException):
     """Raised when an error occurs with the LLM API call."""
-    pass
\ No newline at end of file
+    pass
+
+class CircuitOpenError(LLM_APIError):
+    """Raised without calling the LLM API while the circuit breaker is open."""
+    pass
+
+class ServiceUnavailableError(CustomException):
+    """Raised when the summarization service is full or shutting down and does not take new jobs."""
+    pass
@@ -1,23 +1,135 @@
-import logging  
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import threading
 from datetime import datetime
 
-LOG_FILE = f'{datetime.now().strftime("%d_%m_%Y_%H_%M_%S")}.log'
+# Nothing here touches the filesystem at import time: modules just `from logger import logging` and log,
+# and entry points (CLI, batch, Streamlit app, benchmarks) call setup_logging() once.
+# Until then records go nowhere except warnings, which Python prints to stderr.
 
-logs_path = os.path.join(os.getcwd(), "logs")
-#makes the path to logs folder in current directory eg /apple/project/logs
-os.makedirs(logs_path, exist_ok=True)
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.getcwd(), "logs"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "json" (one object per line) or "text" (the classic format)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Size based rotation by default; set LOG_ROTATE_WHEN (e.g. "midnight", "H") for time based rotation
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
 
-LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE)
-#join the path i.e /apple/project/logs and log file i.e 16_07_2025_11_29_01.log
+TEXT_FORMAT = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s  "
 
+# LogRecord attributes that are not user supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
 
-logging.basicConfig(
-        filename=LOG_FILE_PATH,
-        format="[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s  " , # d means it is integer whereas s means it is a string  
-        level=logging.INFO,
-)
+_lock = threading.Lock()
+_state = {"listener": None, "handler": None, "path": None}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, source location, thread, message,
+    plus any `extra={...}` fields and the formatted traceback.
+    """
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                data[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() merges the traceback into the message; keep it in exc_text for JsonFormatter
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_traceback_formatter = logging.Formatter()
+
+
+def _file_handler(path, max_bytes, backup_count, when):
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backup_count,
+                                                         encoding="utf-8", delay=True)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding="utf-8", delay=True)
+
+
+def setup_logging(log_dir=None, level=None, fmt=None, max_bytes=None, backup_count=None, when=None,
+                  filename=None, console=False):
+    """
+    Routes all log records through a queue to a background thread that writes them to a rotating file.
+    Callers only pay for putting a record on the queue. Safe to call more than once; later calls are no-ops
+    until shutdown_logging(). Returns the log file path.
+    """
+    with _lock:
+        if _state["listener"] is not None:
+            return _state["path"]
+        log_dir = log_dir or LOG_DIR
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, filename or f'{datetime.now().strftime("%d_%m_%Y_%H_%M_%S")}.log')
+        fmt = fmt or LOG_FORMAT
+        formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+        handlers = [_file_handler(path, LOG_MAX_BYTES if max_bytes is None else max_bytes,
+                                  LOG_BACKUP_COUNT if backup_count is None else backup_count,
+                                  LOG_ROTATE_WHEN if when is None else when)]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        queue_handler = _QueueHandler(log_queue)
+        root = logging.getLogger()
+        root.addHandler(queue_handler)
+        root.setLevel(level or LOG_LEVEL)
+        listener.start()
+        _state.update(listener=listener, handler=queue_handler, path=path)
+    atexit.register(shutdown_logging)
+    return path
+
+
+def shutdown_logging():
+    """
+    Flushes queued records, stops the writer thread and detaches the queue handler.
+    """
+    with _lock:
+        listener, handler = _state["listener"], _state["handler"]
+        if listener is None:
+            return
+        logging.getLogger().removeHandler(handler)
+        listener.stop()
+        for target in listener.handlers:
+            target.close()
+        _state.update(listener=None, handler=None, path=None)
 
 
 if __name__=="__main__":
-    logging.info("Logging has started")
\ No newline at end of file
+    setup_logging()
+    logging.info("Logging has started")
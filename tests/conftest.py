@@ -0,0 +1,10 @@
+import pytest
+from components import rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiter():
+    # QAEngine shares one limiter/breaker per process; give every test its own
+    rate_limiter.reset_shared()
+    yield
+    rate_limiter.reset_shared()
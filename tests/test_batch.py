@@ -0,0 +1,105 @@
+import json
+from unittest.mock import patch, MagicMock
+from components.batch import BatchRunner, read_urls
+from components.cache import TranscriptCache
+from components.internalTesting.fakes import FakeTranscriptSource
+from components.metrics import registry
+from components.planner import ExecutionPlanner
+from components.qa_engine import QA_FALLBACK
+from components.transcript_retriever import TranscriptRetriever
+from youtube_transcript_api._errors import TranscriptsDisabled
+
+ENTRIES = [{'text': 'The talk covers caching and batching.', 'start': 0.0, 'duration': 2.0}]
+
+def fake_get_transcript(video_id, languages=None):
+    if video_id == "missing":
+        raise TranscriptsDisabled(video_id)
+    return ENTRIES
+
+def make_runner(tmp_path, **kwargs):
+    engine = MagicMock()
+    engine.answer_question.return_value = "summary"
+    return BatchRunner(str(tmp_path / "out.jsonl"), engine=engine,
+                       transcript_cache=TranscriptCache(path=str(tmp_path / "t.sqlite3")), **kwargs)
+
+def read_records(tmp_path):
+    return [json.loads(line) for line in open(tmp_path / "out.jsonl")]
+
+def test_read_urls_skips_blank_and_comment_lines(tmp_path):
+    path = tmp_path / "urls.txt"
+    path.write_text("# playlist\nhttps://youtu.be/a\n\nhttps://youtu.be/b\n")
+    assert read_urls(str(path)) == ["https://youtu.be/a", "https://youtu.be/b"]
+
+@patch('components.transcript_retriever.YouTubeTranscriptApi.get_transcript', create=True,
+       side_effect=fake_get_transcript)
+def test_batch_dedupes_records_failures_and_resumes(mock_get, tmp_path):
+    urls = [
+        "https://www.youtube.com/watch?v=vid1",
+        "https://youtu.be/vid1",
+        "https://youtu.be/vid2",
+        "https://youtu.be/missing",
+        "https://notyoutube.com/watch?v=x",
+    ]
+    runner = make_runner(tmp_path)
+    stats = runner.run(urls)
+    assert (stats["ok"], stats["failed"], stats["skipped"]) == (2, 2, 0)
+    records = {r["video_id"] or r["url"]: r for r in read_records(tmp_path)}
+    assert records["vid1"]["answer"] == "summary"
+    assert records["missing"]["error_type"] == "TranscriptNotFoundError"
+    assert records["https://notyoutube.com/watch?v=x"]["error_type"] == "InvalidYouTubeURLError"
+
+    # Second run: everything is checkpointed, no fetch and no LLM call happens
+    fetches = mock_get.call_count
+    rerun = make_runner(tmp_path)
+    stats = rerun.run(urls)
+    assert (stats["ok"], stats["failed"], stats["skipped"]) == (0, 0, 4)
+    assert mock_get.call_count == fetches
+    rerun.engine.answer_question.assert_not_called()
+
+@patch('components.transcript_retriever.YouTubeTranscriptApi.get_transcript', create=True,
+       side_effect=fake_get_transcript)
+def test_batch_retry_failed_runs_failures_again(mock_get, tmp_path):
+    make_runner(tmp_path).run(["https://youtu.be/missing"])
+    stats = make_runner(tmp_path, retry_failed=True).run(["https://youtu.be/missing"])
+    assert stats["failed"] == 1
+    assert len(read_records(tmp_path)) == 2
+
+def test_next_transcripts_are_prefetched_once(tmp_path):
+    source = FakeTranscriptSource()
+    fetched = []
+    get_transcript = source.get_transcript
+    source.get_transcript = lambda video_id: fetched.append(video_id) or get_transcript(video_id)
+    urls = [FakeTranscriptSource.url(minutes) for minutes in range(1, 7)]
+    registry.reset()
+    stats = make_runner(tmp_path, retriever=TranscriptRetriever(source=source), max_workers=1, prefetch=2).run(urls)
+    assert stats["ok"] == 6
+    assert sorted(fetched) == sorted(FakeTranscriptSource.video_id(minutes) for minutes in range(1, 7))
+    retrieves = [s for s in registry.spans if s["name"] == "retrieve"]
+    assert sum(s["attributes"]["prefetched"] for s in retrieves) == 5
+
+def test_unexpected_errors_fail_only_their_video(tmp_path):
+    runner = make_runner(tmp_path, retriever=TranscriptRetriever(source=FakeTranscriptSource()))
+    runner.engine.answer_question.side_effect = [ValueError("malformed response"), "summary"]
+    stats = runner.run([FakeTranscriptSource.url(1), FakeTranscriptSource.url(2)])
+    assert (stats["ok"], stats["failed"]) == (1, 1)
+    failed = [r for r in read_records(tmp_path) if r["status"] == "error"]
+    assert failed[0]["error_type"] == "ValueError" and failed[0]["error"] == "malformed response"
+
+def test_fallback_answers_are_recorded_as_failures(tmp_path):
+    urls = [FakeTranscriptSource.url(10)]
+    runner = make_runner(tmp_path, retriever=TranscriptRetriever(source=FakeTranscriptSource()))
+    runner.engine.answer_question.return_value = QA_FALLBACK
+    assert runner.run(urls)["failed"] == 1
+    assert read_records(tmp_path)[0]["error_type"] == "LLM_APIError"
+    # One chunk's map call fell back: the merged answer is incomplete, so the video is not done either
+    mapped = make_runner(tmp_path, retriever=TranscriptRetriever(source=FakeTranscriptSource()),
+                         planner=ExecutionPlanner(single_shot_max_tokens=50, chunk_tokens=200), retry_failed=True)
+    mapped.engine.answer_many.side_effect = lambda chunks, question, **kwargs: \
+        [QA_FALLBACK] + ["part"] * (len(chunks) - 1)
+    mapped.engine.summarize_many.side_effect = lambda prompts, **kwargs: ["merged"] * len(prompts)
+    mapped.engine.stream_summary.side_effect = lambda prompt: iter(["merged"])
+    mapped.engine.summarize_transcript.return_value = "merged"
+    assert mapped.run(urls)["failed"] == 1
+    # The LLM is back: a --retry-failed rerun answers the video
+    assert make_runner(tmp_path, retriever=TranscriptRetriever(source=FakeTranscriptSource()),
+                       retry_failed=True).run(urls)["ok"] == 1
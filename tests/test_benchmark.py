@@ -0,0 +1,38 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+from components.internalTesting.fakes import FakeGenerativeModel, FakeTranscriptSource
+from components.internalTesting.bench_pipeline import compare, parse_args, run_benchmark
+
+def test_fake_model_is_deterministic_and_injects_errors():
+    def outcomes(seed):
+        model = FakeGenerativeModel(latency_ms=0, error_rate=0.2, rate_limit_rate=0.1, seed=seed)
+        result = []
+        for i in range(200):
+            try:
+                result.append(model.generate_content(f"prompt {i % 3}").text)
+            except google_exceptions.ResourceExhausted:
+                result.append("429")
+            except google_exceptions.ServiceUnavailable:
+                result.append("503")
+        return result
+    first = outcomes(seed=1)
+    assert first == outcomes(seed=1)
+    assert 5 < first.count("429") < 40 and 20 < first.count("503") < 70
+
+def test_fake_transcript_source_lengths():
+    source = FakeTranscriptSource()
+    assert FakeTranscriptSource.minutes("fake-10h") == 600
+    entries = source.get_transcript(FakeTranscriptSource.video_id(10))
+    assert entries[-1]['start'] < 600 <= entries[-1]['start'] + entries[-1]['duration']
+    assert entries == source.get_transcript("fake-10m")
+
+def test_benchmark_report_and_regression_check():
+    args = parse_args(["--durations", "1,200", "--repeat", "2", "--latency-ms", "0",
+                       "--single-shot-max-tokens", "1000", "--error-rate", "0.1"])
+    report = run_benchmark(args)
+    assert report["results"]["200m"]["strategy"] != "single_shot"
+    stats = report["results"]["200m"]["stages"]["map"]
+    assert stats["count"] == 2 and stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert compare(report, report) == []
+    slower = {"results": {"200m": {"stages": {"map": dict(stats, p50_ms=stats["p50_ms"] * 2 + 10)}}}}
+    assert compare(slower, report)[0].startswith("200m map p50_ms")
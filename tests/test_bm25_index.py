@@ -0,0 +1,31 @@
+import time
+import random
+from components.bm25_index import BM25Index, tokenize
+
+CHUNKS = [
+    "The speaker introduces the course and the grading policy for the semester.",
+    "Gradient descent updates the weights using the gradient of the loss function.",
+    "We take a short break and talk about the weather and lunch plans.",
+    "Learning rate choice matters: a large learning rate makes gradient descent diverge.",
+]
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the Learning-Rate?") == ["learning", "rate"]
+
+def test_top_k_returns_relevant_chunks_in_order():
+    index = BM25Index(CHUNKS)
+    assert index.top_k("How does the learning rate affect gradient descent?", k=2) == [1, 3]
+
+def test_top_k_falls_back_to_all_chunks_without_matches():
+    index = BM25Index(CHUNKS)
+    assert index.top_k("quantum chromodynamics", k=2) == [0, 1, 2, 3]
+
+def test_build_is_fast_for_long_transcripts():
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(5000)]
+    # About 10 hours of speech (~90k words) split into 12000-char chunks
+    chunks = [" ".join(rng.choice(words) for _ in range(1800)) for _ in range(50)]
+    start = time.perf_counter()
+    index = BM25Index(chunks)
+    index.top_k("word42 word7", k=3)
+    assert time.perf_counter() - start < 1.0
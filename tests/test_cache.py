@@ -0,0 +1,55 @@
+import time
+import pytest
+from unittest.mock import patch
+from components.cache import SQLiteCache, TranscriptCache, ResponseCache
+from components.transcript_retriever import TranscriptRetriever
+
+ENTRIES = [{'text': 'hello', 'start': 0.0, 'duration': 1.5}, {'text': 'world', 'start': 1.5, 'duration': 2.0}]
+
+def test_sqlite_cache_roundtrip(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"))
+    assert cache.get("k") is None
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+def test_sqlite_cache_ttl_expiry(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"), ttl_seconds=0.05)
+    cache.set("k", "v")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+
+def test_disk_hits_keep_their_age_in_memory(tmp_path):
+    path = str(tmp_path / "llm.sqlite3")
+    ResponseCache(path=path, ttl_seconds=0.3).set("model", "prompt", "answer")
+    time.sleep(0.2)
+    reader = ResponseCache(path=path, ttl_seconds=0.3)
+    assert reader.get("model", "prompt") == "answer" and reader.stats["disk_hits"] == 1
+    time.sleep(0.2)
+    # Expired 0.3s after it was written, not 0.3s after it was read from disk
+    assert reader.get("model", "prompt") is None
+
+def test_sqlite_cache_lru_eviction(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "c.sqlite3"), max_entries=2)
+    cache.set("a", "1")
+    time.sleep(0.01)
+    cache.set("b", "2")
+    time.sleep(0.01)
+    cache.get("a")  # a becomes most recently used
+    time.sleep(0.01)
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert len(cache) == 2
+
+@pytest.mark.parametrize("urls", [[
+    "https://www.youtube.com/watch?v=abc123XYZ_-&t=1s",
+    "https://youtu.be/abc123XYZ_-?si=share",
+    "https://www.youtube.com/shorts/abc123XYZ_-",
+]])
+def test_url_formats_share_one_cache_entry(tmp_path, urls):
+    cache = TranscriptCache(path=str(tmp_path / "t.sqlite3"))
+    with patch('components.transcript_retriever.YouTubeTranscriptApi.get_transcript', create=True,
+               return_value=ENTRIES) as mock_get:
+        texts = [TranscriptRetriever(url, cache=cache).fetch_transcript(url) for url in urls]
+    assert texts == ["hello world"] * 3
+    mock_get.assert_called_once_with("abc123XYZ_-", languages=["en"])
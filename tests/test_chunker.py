@@ -0,0 +1,43 @@
+import pytest
+from components.chunker import TokenChunker, estimate_tokens
+from exception import CustomException
+
+TEXT = "Sentence one is here. Sentence two follows it! Is this sentence three? Sentence four ends."
+
+def test_chunks_respect_token_budget_and_sentence_boundaries():
+    chunker = TokenChunker(max_tokens=12)
+    chunks = chunker.chunk(TEXT)
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 12 for chunk in chunks)
+    assert all(chunk.text[-1] in ".!?" for chunk in chunks)
+
+def test_chunk_offsets_point_into_source():
+    for chunk in TokenChunker(max_tokens=12).chunk(TEXT):
+        assert TEXT[chunk.start:chunk.end] == chunk.text
+
+def test_overlap_repeats_previous_sentence():
+    chunks = TokenChunker(max_tokens=14, overlap_tokens=7).chunk(TEXT)
+    assert chunks[1].start < chunks[0].end
+
+def test_unpunctuated_text_is_split_at_spaces():
+    text = " ".join(["word"] * 200)
+    chunks = TokenChunker(max_tokens=50).chunk_texts(text)
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+def test_custom_tokenizer_is_used():
+    words = lambda text: len(text.split())
+    chunks = TokenChunker(max_tokens=4, tokenizer=words).chunk(TEXT)
+    assert all(chunk.tokens <= 4 for chunk in chunks)
+
+def test_invalid_input():
+    with pytest.raises(CustomException):
+        TokenChunker().chunk(1234)
+
+def test_iter_chunks_matches_chunk_on_streamed_pieces():
+    text = TEXT * 40
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    chunker = TokenChunker(max_tokens=30)
+    streamed = list(chunker.iter_chunks(pieces))
+    assert [c.text for c in streamed] == chunker.chunk_texts(text)
+    assert all(text[c.start:c.end] == c.text for c in streamed)
@@ -0,0 +1,39 @@
+import pytest
+from components.compressor import ExtractiveCompressor
+from components.chunker import estimate_tokens
+from components.planner import ExecutionPlanner
+from exception import CustomException
+
+LECTURE = ("Gradient descent updates the weights using the gradient of the loss. Uh yeah okay so. "
+           "The learning rate controls the step size of gradient descent. Um you know like right. "
+           "A large learning rate makes the loss diverge. Thanks for watching and subscribe. ")
+
+def test_keeps_central_sentences_in_order_within_ratio():
+    for method in ("textrank", "tfidf"):
+        compressed = ExtractiveCompressor(ratio=0.5, method=method).compress(LECTURE)
+        assert estimate_tokens(compressed) <= 0.5 * estimate_tokens(LECTURE) + 1
+        assert "Uh yeah" not in compressed and "Um you know" not in compressed
+        kept = [s.strip() + "." for s in compressed.split(".") if s.strip()]
+        assert all(sentence in LECTURE for sentence in kept)
+        assert [LECTURE.index(s) for s in kept] == sorted(LECTURE.index(s) for s in kept)
+
+def test_unpunctuated_captions_are_scored_in_windows():
+    captions = " ".join(f"word{i % 40} topic{i % 7}" for i in range(400))
+    compressed = ExtractiveCompressor(ratio=0.5).compress(captions)
+    assert 0.3 * len(captions) < len(compressed) <= 0.55 * len(captions)
+
+def test_invalid_settings():
+    with pytest.raises(CustomException):
+        ExtractiveCompressor(ratio=0)
+    with pytest.raises(CustomException):
+        ExtractiveCompressor(method="lsa")
+
+def test_planner_compresses_only_for_broad_questions():
+    transcript = LECTURE * 30
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=300, compress_ratio=0.5)
+    plain = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=300).plan(transcript, "")
+    summary = planner.plan(transcript, "")
+    assert summary.estimated_input_tokens < plain.estimated_input_tokens
+    assert all(len(a) < len(b) for a, b in zip(summary.chunks, plain.chunks))
+    specific = planner.plan(transcript, "What happens with a large learning rate?")
+    assert specific.chunks == plain.chunks
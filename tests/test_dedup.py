@@ -0,0 +1,54 @@
+from unittest.mock import MagicMock
+from components.chunker import TokenChunker, sentence_key
+from components.dedup import MinHashDeduper, repeat_starts
+from components.planner import ExecutionPlanner, SKIPPED_CALLS
+from components.metrics import registry
+
+VERSE = "we walk along the river while the city sleeps and the lights go down slowly tonight "
+CHORUS = "oh oh never let me go hold on hold on until the morning comes again my friend "
+BRIDGE = "and in the quiet hours I remember every word you told me under the falling rain "
+
+def test_similarity_estimates():
+    deduper = MinHashDeduper()
+    words = (VERSE + CHORUS + BRIDGE).split()
+    text = " ".join(words[(i * 7) % len(words)] + str(i % 50) for i in range(400))
+    assert deduper.similarity(text, text) == 1.0
+    assert deduper.similarity(text, text.replace("river", "ocean", 1)) > 0.85
+    assert deduper.similarity(text, BRIDGE * 20) < 0.1
+
+def test_duplicate_of_points_at_first_occurrence():
+    deduper = MinHashDeduper(threshold=0.8)
+    texts = [VERSE * 10, CHORUS * 10, VERSE * 10 + "yeah", BRIDGE * 10, CHORUS * 10]
+    assert deduper.duplicate_of(texts) == [0, 1, 0, 3, 1]
+    assert deduper.duplicate_of(["", ""]) == [0, 1]
+
+def test_planner_skips_near_duplicate_chunks_and_fans_answers_out():
+    registry.reset()
+    song = (VERSE * 8 + CHORUS * 8) * 6
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=80, reduce_fan_in=100, dedup_threshold=0.8)
+    plan = planner.plan(song, "")
+    baseline = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=80, reduce_fan_in=100).plan(song, "")
+    assert len(plan.selected) == len(baseline.selected)
+    assert plan.map_calls < baseline.map_calls / 2
+    assert plan.estimated_input_tokens < baseline.estimated_input_tokens
+
+    engine = MagicMock()
+    engine.answer_many.side_effect = lambda chunks, question, **kwargs: [f"answer:{chunk[:20]}" for chunk in chunks]
+    engine.summarize_many.side_effect = lambda prompts, max_concurrency=4: ["merged"] * len(prompts)
+    assert planner.execute(plan, engine) == "merged"
+    sent = engine.answer_many.call_args.args[0]
+    assert len(sent) == plan.map_calls
+    reduce_prompt = engine.summarize_many.call_args.args[0][0]
+    assert reduce_prompt.count("answer:") == len(plan.selected)
+    assert SKIPPED_CALLS.get(reason="near_duplicate") == len(plan.selected) - plan.map_calls
+
+def test_repeat_starts_align_chunks_of_a_replayed_passage():
+    sentences = [f"Sentence number {i} talks about topic {i * 7 % 13} in some detail. " for i in range(60)]
+    # The stream replays from sentence 25 on, so the replay starts in the middle of an original chunk
+    text = "".join(sentences + sentences[25:])
+    starts = repeat_starts(text, min_run_tokens=100)
+    assert starts == {sentence_key(sentences[25])}
+    plain = TokenChunker(max_tokens=200).chunk_texts(text)
+    aligned = TokenChunker(max_tokens=200, cut_before=starts).chunk_texts(text)
+    assert len(set(aligned)) < len(aligned)
+    assert len(set(plain)) == len(plain)
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import MagicMock
+from components.llm_backend import GenerativeModelBackend, HTTPBackend, LLMBackend, create_backend
+from components.internalTesting.fakes import FakeGenerativeModel
+from components.internalTesting.fake_llm_server import serve
+from components.qa_engine import QAEngine, QA_FALLBACK
+from components.planner import ExecutionPlanner, SINGLE_SHOT
+from components.rate_limiter import metrics
+from components.cache import ResponseCache
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**kwargs):
+        server = serve(FakeGenerativeModel(latency_ms=0, **kwargs))
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/generate"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+class EchoBackend(LLMBackend):
+    def __init__(self, name):
+        self.name = name
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        return f"{self.name} answer"
+
+def test_importing_engine_does_not_import_gemini_sdk(tmp_path):
+    probe = "import sys, components.qa_engine, components.planner; print('google.generativeai' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=SRC), check=True)
+    assert result.stdout.strip() == "False"
+
+def test_create_backend_specs():
+    assert isinstance(create_backend("http://localhost:8088/generate#lite"), HTTPBackend)
+    backend = create_backend("http://localhost:8088/generate#lite")
+    assert (backend.url, backend.name) == ("http://localhost:8088/generate", "lite")
+    echo = EchoBackend("x")
+    assert create_backend(echo) is echo
+
+def test_map_and_reduce_use_their_own_models():
+    lite, strong = EchoBackend("lite"), EchoBackend("strong")
+    qa = QAEngine(backend=lite, reduce_backend=strong, cache=ResponseCache(persistent=False))
+    assert qa.answer_many(["chunk one", "chunk two"], "What?") == ["lite answer", "lite answer"]
+    assert qa.summarize_transcript(["partial a", "partial b"]) == "strong answer"
+    assert len(lite.prompts) == 2 and len(strong.prompts) == 1
+    # Responses are cached per model, so the same prompt on the other tier is a miss
+    assert qa.cache.get("lite", lite.prompts[0]) == "lite answer"
+    assert qa.cache.get("strong", lite.prompts[0]) is None
+
+def test_single_shot_plans_are_answered_by_the_reduce_model():
+    lite, strong = EchoBackend("lite"), EchoBackend("strong")
+    qa = QAEngine(backend=lite, reduce_backend=strong)
+    planner = ExecutionPlanner(model_name="lite", reduce_model_name="strong")
+    plan = planner.plan("A short talk about caching.", "")
+    assert plan.strategy == SINGLE_SHOT
+    assert planner.execute(plan, qa) == "strong answer"
+    assert "".join(planner.execute_stream(plan, qa)) == "strong answer"
+    assert asyncio.run(planner.execute_async(plan, qa)) == "strong answer"
+    assert not lite.prompts
+    # A reduce model with a smaller context window lowers the single-shot limit
+    assert ExecutionPlanner(model_name="gemini-2.5-flash", reduce_model_name="local").single_shot_limit == \
+        ExecutionPlanner(model_name="local").single_shot_limit < 100_000
+
+def test_same_model_name_shares_backend():
+    backend = GenerativeModelBackend(MagicMock(), "gemini-2.5-flash")
+    qa = QAEngine(backend=backend, reduce_model_name="gemini-2.5-flash")
+    assert qa.reduce_backend is qa.backend
+
+def test_http_backend_through_engine(fake_server):
+    qa = QAEngine(model_name=fake_server(), reduce_model_name=fake_server() + "#reduce", base_delay=0)
+    answer = qa.answer_question("some transcript", "What is it about?")
+    assert answer and answer != QA_FALLBACK
+    assert qa.reduce_backend.name == "reduce"
+    assert qa.summarize_transcript("some transcript")
+
+def test_http_backend_429_pauses_limiter(fake_server):
+    qa = QAEngine(model_name=fake_server(rate_limit_rate=1.0, retry_after=0.01), max_retries=2, base_delay=0,
+                  max_delay=0)
+    assert qa.answer_question("chunk", "Q?") == QA_FALLBACK
+    assert metrics()["rate_limited"] == 2
+    assert metrics()["retries"] == 1
+
+def test_http_backend_async_and_stream(fake_server):
+    qa = QAEngine(model_name=fake_server())
+    assert asyncio.run(qa.answer_question_async("chunk", "Q?")) == qa.answer_question("chunk", "Q?")
+    assert "".join(qa.stream_answer("chunk", "Q?")) == qa.answer_question("chunk", "Q?")
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from logger import logging, setup_logging, shutdown_logging
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+@pytest.fixture(autouse=True)
+def stop_logging():
+    shutdown_logging()
+    yield
+    shutdown_logging()
+
+def test_import_does_not_touch_filesystem(tmp_path):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    env.pop("LOG_DIR", None)
+    subprocess.run([sys.executable, "-c", "import components.qa_engine, components.main, components.planner"],
+                   cwd=tmp_path, env=env, check=True)
+    assert list(tmp_path.iterdir()) == []
+
+def test_json_records_go_through_queue(tmp_path):
+    path = setup_logging(log_dir=str(tmp_path), fmt="json", filename="app.log")
+    logging.info("Chunk %d done in %.2fs", 3, 1.5, extra={"video_id": "abc"})
+    shutdown_logging()
+    records = [json.loads(line) for line in open(path, encoding="utf-8")]
+    record = records[-1]
+    assert record["message"] == "Chunk 3 done in 1.50s"
+    assert record["level"] == "INFO"
+    assert record["video_id"] == "abc"
+
+def test_exception_is_included(tmp_path):
+    path = setup_logging(log_dir=str(tmp_path), fmt="json", filename="app.log")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.exception("Failed")
+    shutdown_logging()
+    record = json.loads(open(path, encoding="utf-8").read().splitlines()[-1])
+    assert "ValueError: boom" in record["exc_info"]
+
+def test_size_rotation(tmp_path):
+    setup_logging(log_dir=str(tmp_path), fmt="text", filename="app.log", max_bytes=500, backup_count=2)
+    for i in range(100):
+        logging.info("line %d %s", i, "x" * 40)
+    shutdown_logging()
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == ["app.log", "app.log.1", "app.log.2"]
+
+def test_setup_is_idempotent(tmp_path):
+    first = setup_logging(log_dir=str(tmp_path), filename="app.log")
+    second = setup_logging(log_dir=str(tmp_path / "other"), filename="other.log")
+    assert first == second
+    handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.handlers.QueueHandler)]
+    assert len(handlers) == 1
+    assert not (tmp_path / "other").exists()
@@ -0,0 +1,65 @@
+import json
+import urllib.request
+from unittest.mock import patch, MagicMock
+import pytest
+from components.metrics import registry, span, trace, current_span
+from components.qa_engine import QAEngine
+from components.cache import ResponseCache
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+def spans_named(name):
+    return [s for s in registry.spans if s["name"] == name]
+
+def test_spans_nest_and_inherit_trace_attributes():
+    with trace(video_id="abc"):
+        with span("outer") as outer:
+            with span("inner", input_chars=10):
+                current_span().set(cache_hit=True)
+    inner, outer_dict = spans_named("inner")[0], spans_named("outer")[0]
+    assert inner["parent_id"] == outer.span_id and inner["trace_id"] == outer_dict["trace_id"]
+    assert inner["attributes"] == {"video_id": "abc", "input_chars": 10, "cache_hit": True}
+    assert registry.cache_hits.get(span="inner") == 1
+
+def test_error_spans_are_counted():
+    with pytest.raises(ValueError):
+        with span("clean"):
+            raise ValueError("boom")
+    assert registry.spans_total.get(span="clean", status="error") == 1
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_map_calls_carry_chunk_index_attempts_and_cache_status(mock_generate):
+    mock_generate.side_effect = [Exception("fail")] + [MagicMock(text="QA Answer")] * 10
+    qa = QAEngine(api_key="dummy", max_retries=2, base_delay=0, cache=ResponseCache(persistent=False))
+    with trace(video_id="vid"):
+        qa.answer_many(["chunk a", "chunk b"], "question", max_concurrency=2, chunk_indexes=[4, 7])
+        qa.answer_many(["chunk a"], "question", chunk_indexes=[4])
+    calls = spans_named("map_call")
+    assert sorted(s["attributes"]["chunk_index"] for s in calls) == [4, 4, 7]
+    assert all(s["attributes"]["video_id"] == "vid" for s in calls)
+    assert sum(s["attributes"]["attempts"] for s in calls) == 4
+    assert [s["attributes"]["cache_hit"] for s in calls].count(True) == 1
+    # Cache hits spend no tokens
+    first = calls[0]["attributes"]
+    assert registry.input_tokens.get(span="map_call") == 2 * first["input_tokens"]
+
+def test_prometheus_and_json_export(tmp_path):
+    with span("retrieve", output_chars=1234):
+        pass
+    text = registry.to_prometheus()
+    assert 'pipeline_span_seconds_count{span="retrieve"} 1' in text
+    assert 'pipeline_output_chars_total{span="retrieve"} 1234' in text
+    assert "qa_retries_total" in text
+    registry.write(str(tmp_path / "metrics.json"))
+    data = json.loads((tmp_path / "metrics.json").read_text())
+    assert data["spans"][0]["name"] == "retrieve"
+    server = registry.serve(0)
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode()
+        assert "pipeline_spans_total" in body
+    finally:
+        server.shutdown()
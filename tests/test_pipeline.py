@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from exception import CustomException
+from components.chunker import TokenChunker
+from components.pipeline import StreamingPipeline
+from components.planner import ExecutionPlanner
+from components.preprocessor import Preprocessor
+from components.segments import SegmentStore
+
+SENTENCE = "The lecture explains how gradient descent walks downhill on the loss surface. "
+
+def numbered_transcript(sentences):
+    return "".join(f"Part {i} of the lecture covers topic number {i} in some detail. " for i in range(sentences))
+
+class RecordingEngine:
+    """
+    Thread-safe fake engine: map answers name their chunk index, merges list the answers they got.
+    """
+
+    def __init__(self, map_delay=None):
+        self.map_delay = map_delay or (lambda index: 0)
+        self.lock = threading.Lock()
+        self.events = []
+        self.map_calls = []
+        self.merge_prompts = []
+
+    def _log(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def answer_question(self, chunk, question, chunk_index=None):
+        with self.lock:
+            self.map_calls.append(chunk_index)
+        time.sleep(self.map_delay(chunk_index))
+        self._log(("answered", chunk_index))
+        return f"<{chunk_index}>"
+
+    def answer_many(self, chunks, question, chunk_indexes=None, **kwargs):
+        return [self.answer_question(chunk, question, chunk_index=index) for chunk, index in zip(chunks, chunk_indexes)]
+
+    def summarize_transcript(self, prompt):
+        with self.lock:
+            self.merge_prompts.append(prompt)
+        self._log(("merged", None))
+        return "[" + " ".join(re.findall(r"<\d+>", prompt)) + "]"
+
+    def summarize_many(self, prompts, max_concurrency=4):
+        return [self.summarize_transcript(prompt) for prompt in prompts]
+
+    def stream_summary(self, prompt):
+        with self.lock:
+            self.merge_prompts.append(prompt)
+        yield "final: "
+        yield " ".join(re.findall(r"<\d+>", prompt))
+
+    def stream_answer(self, chunk, question, final=False):
+        yield "single shot" if final else "map answer"
+
+def pipeline(**planner_kwargs):
+    settings = dict(single_shot_max_tokens=100, chunk_tokens=40, reduce_fan_in=3, chunk_memo_entries=0)
+    settings.update(planner_kwargs)
+    return StreamingPipeline(ExecutionPlanner(**settings), max_concurrency=4)
+
+def test_summary_covers_every_chunk_in_transcript_order():
+    runner = pipeline()
+    engine = RecordingEngine()
+    progress = []
+    answer = runner.run(numbered_transcript(40), engine, "", on_progress=lambda done, total: progress.append((done, total)))
+    chunks = sorted(engine.map_calls)
+    assert chunks == list(range(len(chunks))) and len(chunks) > 9
+    # Every chunk's answer reaches the final merge exactly once
+    merged = [int(i) for i in re.findall(r"<(\d+)>", answer)]
+    assert answer.startswith("final: ") and sorted(merged) == chunks
+    # Every merge holds at most reduce_fan_in (partial) answers, put back in chunk order by the first chunk they cover
+    for prompt in engine.merge_prompts:
+        parts = prompt.split("\n\n")[1:]
+        firsts = [int(re.search(r"<(\d+)>", part).group(1)) for part in parts]
+        assert len(parts) <= 3 and firsts == sorted(firsts)
+    assert progress[-1] == (len(chunks), len(chunks))
+    assert all(done < total for done, total in progress[:-1])
+
+def test_merges_start_while_chunks_are_still_being_answered():
+    # Chunk 0 straggles; everything else is answered and merged before it comes back
+    engine = RecordingEngine(map_delay=lambda index: 0.3 if index == 0 else 0.0)
+    answer = pipeline().run(numbered_transcript(40), engine, "Summarize")
+    last_answer = engine.events.index(("answered", 0))
+    assert ("merged", None) in engine.events[:last_answer]
+    assert answer.startswith("final:") and "<0>" in answer
+
+def test_producer_waits_for_map_workers():
+    produced = []
+    original = TokenChunker.iter_chunks
+
+    def counting(self, pieces):
+        for chunk in original(self, pieces):
+            produced.append(chunk)
+            yield chunk
+
+    release = threading.Event()
+    engine = RecordingEngine(map_delay=lambda index: 0 if release.wait(5) else 0)
+    runner = StreamingPipeline(ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=40, chunk_memo_entries=0),
+                               max_concurrency=2, queue_size=3)
+    with patch.object(TokenChunker, "iter_chunks", counting):
+        thread = threading.Thread(target=runner.run, args=(numbered_transcript(60), engine))
+        thread.start()
+        time.sleep(0.3)
+        # 2 chunks in the workers, 3 queued, 1 held by the producer waiting for space
+        assert len(produced) <= 2 + 3 + 1
+        release.set()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert len(produced) > 6
+
+def test_near_duplicate_chunks_reuse_answers():
+    block = numbered_transcript(12)
+    engine = RecordingEngine()
+    answer = pipeline(dedup_threshold=0.85, chunk_tokens=60).run(block * 4, engine)
+    merged = re.findall(r"<\d+>", answer)
+    assert len(engine.map_calls) < len(merged)
+    assert len(set(merged)) == len(engine.map_calls)
+
+def test_dedup_does_not_wait_for_the_whole_transcript():
+    texts = [f"Part {i} of the talk covers topic {i} in depth." for i in range(400)]
+    store = SegmentStore(texts, [i * 2.0 for i in range(400)], [2.0] * 400)
+    read = []
+    segment_text = store.segment_text
+    store.segment_text = lambda i: read.append(i) or segment_text(i)
+    engine = RecordingEngine()
+    answer_question = engine.answer_question
+    read_at_first_map = []
+    engine.answer_question = lambda *args, **kwargs: (read_at_first_map.append(len(read))
+                                                      or answer_question(*args, **kwargs))
+    pipeline(dedup_threshold=0.85).run(store, engine)
+    # The first chunk was answered while most segments were still unread
+    assert min(read_at_first_map) < len(texts) / 2
+    assert len(read) == len(texts)
+
+def test_raw_segments_are_cleaned_in_the_pipeline():
+    texts = [f"[Music] Part {i} of the talk covers topic {i} in depth." for i in range(60)]
+    store = SegmentStore(texts, [i * 2.0 for i in range(60)], [2.0] * 60)
+    seen = []
+    engine = RecordingEngine()
+    engine.answer_question = lambda chunk, question, chunk_index=None: seen.append(chunk) or f"<{chunk_index}>"
+    runner = StreamingPipeline(ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=60), preprocessor=Preprocessor())
+    runner.run(store, engine)
+    assert seen and not any("[Music]" in chunk for chunk in seen)
+    assert "Part 59" in seen[-1] or any("Part 59" in chunk for chunk in seen)
+
+def test_specific_questions_and_short_transcripts_use_the_planner():
+    runner = pipeline(top_k=1)
+    engine = RecordingEngine()
+    assert not runner.applies(numbered_transcript(40), "Which part comes after part 7?")
+    runner.run(numbered_transcript(40), engine, "Which part comes after part 7?")
+    assert len(engine.map_calls) == 1
+    assert not runner.applies(SENTENCE, "")
+    assert runner.run(SENTENCE, engine) == "single shot"
+
+def test_errors_stop_the_pipeline():
+    engine = RecordingEngine()
+
+    def fail(chunk, question, chunk_index=None):
+        raise RuntimeError("backend down")
+
+    engine.answer_question = fail
+    with pytest.raises(CustomException):
+        pipeline().run(numbered_transcript(40), engine)
+
+def test_coordinator_stops_waiting_when_no_worker_is_left():
+    with patch.object(StreamingPipeline, "_map_worker", lambda self, *args: None):
+        with pytest.raises(CustomException):
+            pipeline().run(numbered_transcript(40), RecordingEngine())
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+from components.planner import (
+    ExecutionPlanner, is_broad_question, SINGLE_SHOT, MAP_REDUCE, HIERARCHICAL,
+)
+from components.segments import SegmentStore
+
+SENTENCE = "The lecture explains how gradient descent walks downhill on the loss surface. "
+OTHER = "Students then discuss lunch plans and the weather outside the hall. "
+
+def fake_engine():
+    engine = MagicMock()
+    engine.answer_question.side_effect = lambda chunk, question, **kwargs: f"answer({len(chunk)})"
+    engine.answer_many.side_effect = lambda chunks, question, **kwargs: [f"part{i}" for i in range(len(chunks))]
+    engine.summarize_transcript.side_effect = lambda prompt: "merged"
+    engine.summarize_many.side_effect = lambda prompts, max_concurrency=4: ["merged"] * len(prompts)
+    engine.stream_summary.side_effect = lambda prompt: iter(["mer", "ged"])
+    return engine
+
+def test_is_broad_question():
+    assert is_broad_question("")
+    assert is_broad_question("Give me a summary")
+    assert not is_broad_question("What learning rate was used?")
+
+def test_short_transcript_is_single_shot():
+    planner = ExecutionPlanner()
+    plan = planner.plan(SENTENCE * 20, "")
+    assert plan.strategy == SINGLE_SHOT
+    assert plan.estimated_calls == 1
+    engine = fake_engine()
+    planner.execute(plan, engine)
+    engine.answer_question.assert_called_once()
+    engine.summarize_many.assert_not_called()
+
+def test_long_transcript_uses_map_reduce():
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=200, reduce_fan_in=50)
+    plan = planner.plan(SENTENCE * 60, "")
+    assert plan.strategy == MAP_REDUCE
+    assert plan.map_calls == len(plan.chunks) > 1
+    assert plan.reduce_calls == 1
+    assert planner.execute(plan, fake_engine()) == "merged"
+
+def test_many_chunks_use_hierarchical_reduce():
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=100, reduce_fan_in=3)
+    plan = planner.plan(SENTENCE * 60, "")
+    assert plan.strategy == HIERARCHICAL
+    assert plan.reduce_levels > 1
+    engine = fake_engine()
+    assert planner.execute(plan, engine) == "merged"
+    reduce_calls = sum(len(call.args[0]) for call in engine.summarize_many.call_args_list)
+    assert reduce_calls == plan.reduce_calls
+    assert engine.summarize_many.call_count == plan.reduce_levels
+
+def test_specific_question_only_maps_relevant_chunks():
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=40, top_k=1)
+    plan = planner.plan(OTHER * 10 + SENTENCE + OTHER * 10, "What does gradient descent do?")
+    assert plan.map_calls == 1
+    assert "gradient descent" in plan.chunks[plan.selected[0]]
+
+def test_max_calls_budget_enlarges_chunks():
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=100, max_calls=4)
+    plan = planner.plan(SENTENCE * 60, "")
+    assert plan.estimated_calls <= 4
+    assert "Strategy:" in planner.dry_run(SENTENCE * 60, "")
+
+def test_tree_reduce_bounds_every_prompt_and_runs_groups_in_parallel():
+    planner = ExecutionPlanner(reduce_fan_in=4)
+    prompts_seen = []
+    def slow_merge(prompts, max_concurrency=4):
+        prompts_seen.extend(prompts)
+        time.sleep(0.1)  # one level takes one call latency, however many groups it has
+        return [f"m{i}" for i in range(len(prompts))]
+    engine = MagicMock()
+    engine.summarize_many.side_effect = slow_merge
+    start = time.perf_counter()
+    result = planner.reduce([f"answer {i}" for i in range(40)], "", engine, max_concurrency=8)
+    elapsed = time.perf_counter() - start
+    assert result == "m0"
+    # 40 -> 10 -> 3 -> 1
+    assert engine.summarize_many.call_count == 3
+    assert all(prompt.count("answer ") + prompt.count("\nm") <= 4 for prompt in prompts_seen)
+    assert elapsed < 0.5
+
+def test_execute_stream_streams_only_the_final_reduce():
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=100, reduce_fan_in=3)
+    plan = planner.plan(SENTENCE * 60, "")
+    engine = fake_engine()
+    pieces = list(planner.execute_stream(plan, engine))
+    assert pieces == ["mer", "ged"]
+    engine.stream_summary.assert_called_once()
+    # Inner levels used the non-streaming reduce, the final one was streamed
+    inner_calls = sum(len(call.args[0]) for call in engine.summarize_many.call_args_list)
+    assert inner_calls + 1 == plan.reduce_calls
+
+def test_plan_from_segments_keeps_chunk_times():
+    texts = [SENTENCE.strip() if i % 10 else OTHER.strip() for i in range(400)]
+    store = SegmentStore(texts, [i * 4.0 for i in range(400)], [4.0] * 400)
+    plan = ExecutionPlanner(single_shot_max_tokens=500, chunk_tokens=500).plan(store, "Which method walks downhill?")
+    assert len(plan.chunk_times) == len(plan.chunks)
+    assert plan.chunk_times[0][0] == 0.0 and plan.chunk_times[-1][1] == 1600.0
+    assert any("BM25 selected chunks [" in note and "-" in note for note in plan.notes)
+
+def test_execute_async_tree_reduces():
+    engine = MagicMock()
+    async def answer_many_async(chunks, question, **kwargs):
+        return [f"part{i}" for i in range(len(chunks))]
+    async def summarize_many_async(prompts, max_concurrency=64):
+        return ["merged"] * len(prompts)
+    engine.answer_many_async.side_effect = answer_many_async
+    engine.summarize_many_async.side_effect = summarize_many_async
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=40, reduce_fan_in=2)
+    plan = planner.plan(SENTENCE * 40, "")
+    assert asyncio.run(planner.execute_async(plan, engine)) == "merged"
+    assert engine.summarize_many_async.call_count == plan.reduce_levels
+
+def test_second_question_reuses_chunks():
+    planner = ExecutionPlanner(single_shot_max_tokens=100, chunk_tokens=40)
+    transcript = OTHER * 10 + SENTENCE + OTHER * 10
+    with patch.object(planner, "_chunk_uncached", wraps=planner._chunk_uncached) as chunk:
+        first = planner.plan(transcript, "What does gradient descent do?")
+        second = planner.plan(transcript, "What about lunch plans?")
+    assert chunk.call_count == 1
+    assert first.chunks == second.chunks
@@ -1,5 +1,6 @@
 import pytest
 from components.preprocessor import Preprocessor
+from components.segments import SegmentStore
 from exception import CustomException
 
 def test_clean_transcript_removes_noise():
@@ -20,3 +21,31 @@ def test_exception_on_invalid_input():
     pre = Preprocessor()
     with pytest.raises(CustomException):
         pre.clean_transcript(1234)
+
+def legacy_clean(pre, text):
+    # Multi-pass cleaner that clean_transcript used to be
+    import re
+    for pattern in pre.remove_patterns:
+        text = re.sub(pattern, "", text)
+    return ' '.join(text.split())
+
+def test_clean_transcript_matches_multi_pass_output():
+    raw = "[Music] 00:01 Hello   world! [Noise]\n 00:02:03 Bye. 1:05 [Applause] done"
+    pre = Preprocessor()
+    assert pre.clean_transcript(raw) == legacy_clean(pre, raw)
+
+def test_matches_created_by_an_earlier_removal_are_removed_too():
+    # Removing [Music] joins "1" and "2:30" into a timestamp, which the timestamp pass then removes
+    raw = "at 1[Music]2:30 ok"
+    pre = Preprocessor()
+    assert pre.clean_transcript(raw) == legacy_clean(pre, raw) == "at ok"
+    assert "".join(pre.iter_clean(["at 1[Mus", "ic]2:30 ok"], window=4)) == "at ok"
+    store = SegmentStore(["at 1[Mus", "ic]2:30 ok"], [0.0, 1.0], [1.0, 1.0])
+    assert pre.clean_segments(store).text == "at ok"
+
+def test_iter_clean_streams_segments_with_same_output():
+    segments = ["[Music]", "00:01 so today we", "talk about [inaudible", "stuff] caching 12:30", "and more"] * 200
+    pre = Preprocessor()
+    pieces = list(pre.iter_clean(segments, window=64))
+    assert len(pieces) > 1
+    assert "".join(pieces) == legacy_clean(pre, " ".join(segments))
@@ -1,7 +1,13 @@
+import asyncio
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
-from components.qa_engine import QAEngine
+from components.qa_engine import QAEngine, build_batch_prompt, parse_batch_answers
+from components.llm_backend import GenerativeModelBackend
+from components.internalTesting.fakes import FakeGenerativeModel
 from exception import LLM_APIError,CustomException
+from components.cache import ResponseCache
 @patch('google.generativeai.GenerativeModel.generate_content')
 def test_answer_question_success(mock_generate):
     mock_response = MagicMock()
@@ -25,3 +31,188 @@ def test_answer_question_fail_all(mock_generate):
     qa = QAEngine(api_key="dummy", max_retries=1, base_delay=0)
     result = qa.answer_question("chunk", "question")
     assert result.startswith("My bad")
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_answer_many_keeps_chunk_order(mock_generate):
+    def slow_generate(prompt):
+        # Later chunks finish first so ordering is not an accident of timing
+        idx = int(prompt.split("chunk-")[1].split(" ")[0])
+        time.sleep(0.05 * (5 - idx))
+        return MagicMock(text=f"answer-{idx}")
+    mock_generate.side_effect = slow_generate
+    qa = QAEngine(api_key="dummy")
+    result = qa.answer_many([f"chunk-{i} " for i in range(5)], "question", max_concurrency=5)
+    assert result == [f"answer-{i}" for i in range(5)]
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_answer_many_runs_concurrently(mock_generate):
+    def slow_generate(prompt):
+        time.sleep(0.2)
+        return MagicMock(text="QA Answer")
+    mock_generate.side_effect = slow_generate
+    qa = QAEngine(api_key="dummy")
+    start = time.perf_counter()
+    result = qa.answer_many(["chunk"] * 8, "question", max_concurrency=4)
+    elapsed = time.perf_counter() - start
+    assert result == ["QA Answer"] * 8
+    # 8 chunks at concurrency 4 -> about 2 x latency, sequential would be 8 x
+    assert elapsed < 0.2 * 8 / 2
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_answer_many_keeps_fallback(mock_generate):
+    mock_generate.side_effect = Exception("Fail")
+    qa = QAEngine(api_key="dummy", max_retries=1, base_delay=0)
+    result = qa.answer_many(["a", "b"], "question")
+    assert all(ans.startswith("My bad") for ans in result)
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_response_cache_skips_repeat_calls(mock_generate, tmp_path):
+    mock_generate.return_value = MagicMock(text="QA Answer")
+    cache = ResponseCache(path=str(tmp_path / "llm.sqlite3"))
+    qa = QAEngine(api_key="dummy", cache=cache)
+    assert qa.answer_question("chunk", "question") == "QA Answer"
+    assert qa.answer_question("chunk", "question") == "QA Answer"
+    assert mock_generate.call_count == 1
+    assert cache.stats["memory_hits"] == 1
+
+    # A fresh memory tier still finds the answer in the persistent tier
+    qa2 = QAEngine(api_key="dummy", cache=ResponseCache(path=str(tmp_path / "llm.sqlite3")))
+    assert qa2.answer_question("chunk", "question") == "QA Answer"
+    assert mock_generate.call_count == 1
+    assert qa2.cache.stats["disk_hits"] == 1
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_response_cache_never_stores_failures(mock_generate):
+    mock_generate.side_effect = Exception("Fail")
+    cache = ResponseCache(persistent=False)
+    qa = QAEngine(api_key="dummy", max_retries=1, base_delay=0, cache=cache)
+    assert qa.answer_question("chunk", "question").startswith("My bad")
+    assert qa.summarize_transcript("text").startswith("Summary unavailable")
+    assert cache.stats["writes"] == 0
+    assert len(cache._memory) == 0
+
+class FakeStreamingModel:
+    """Yields response pieces one by one, like generate_content(..., stream=True)."""
+    def __init__(self, pieces, delay=0.0, fail_first=0):
+        self.pieces = pieces
+        self.delay = delay
+        self.fail_first = fail_first
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            raise Exception("fail")
+        def gen():
+            for piece in self.pieces:
+                time.sleep(self.delay)
+                yield MagicMock(text=piece)
+        return gen()
+
+def test_stream_answer_yields_pieces_incrementally():
+    qa = QAEngine(api_key="dummy")
+    qa.model = FakeStreamingModel(["Hello ", "streaming ", "world"], delay=0.1)
+    start = time.perf_counter()
+    stream = qa.stream_answer("chunk", "question")
+    first = next(stream)
+    time_to_first = time.perf_counter() - start
+    assert first == "Hello "
+    assert time_to_first < 0.2
+    assert first + "".join(stream) == "Hello streaming world"
+
+def test_stream_summary_retries_before_output_and_caches():
+    qa = QAEngine(api_key="dummy", max_retries=2, base_delay=0, cache=ResponseCache(persistent=False))
+    qa.model = FakeStreamingModel(["Sum", "mary"], fail_first=1)
+    assert "".join(qa.stream_summary("text")) == "Summary"
+    assert "".join(qa.stream_summary("text")) == "Summary"
+    assert qa.model.calls == 2
+
+def test_stream_answer_fallback_after_retries():
+    qa = QAEngine(api_key="dummy", max_retries=1, base_delay=0)
+    qa.model = FakeStreamingModel(["x"], fail_first=5)
+    assert "".join(qa.stream_answer("chunk", "question")).startswith("My bad")
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_answer_many_reports_progress(mock_generate):
+    mock_generate.return_value = MagicMock(text="QA Answer")
+    qa = QAEngine(api_key="dummy")
+    progress = []
+    qa.answer_many(["a", "b", "c"], "question", on_progress=lambda done, total: progress.append((done, total)))
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+@patch('google.generativeai.GenerativeModel.generate_content_async')
+def test_answer_question_async_retries(mock_generate):
+    mock_generate.side_effect = [Exception("fail"), MagicMock(text="QA Answer")]
+    qa = QAEngine(api_key="dummy", max_retries=2, base_delay=0)
+    assert asyncio.run(qa.answer_question_async("chunk", "question")) == "QA Answer"
+
+@patch('google.generativeai.GenerativeModel.generate_content_async')
+def test_answer_many_async_runs_hundreds_on_one_loop(mock_generate):
+    async def slow_generate(prompt):
+        await asyncio.sleep(0.2)
+        return MagicMock(text=prompt.split("chunk-")[1].split(" ")[0])
+    mock_generate.side_effect = slow_generate
+    qa = QAEngine(api_key="dummy")
+    threads_before = threading.active_count()
+    start = time.perf_counter()
+    result = asyncio.run(qa.answer_many_async([f"chunk-{i} " for i in range(300)], "question", max_concurrency=300))
+    assert result == [str(i) for i in range(300)]
+    assert time.perf_counter() - start < 1.5
+    assert threading.active_count() <= threads_before + 1
+
+@patch('google.generativeai.GenerativeModel.generate_content_async')
+def test_cancelling_answer_many_async_stops_inflight_calls(mock_generate):
+    cancelled = []
+    async def hanging_generate(prompt):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+    mock_generate.side_effect = hanging_generate
+    qa = QAEngine(api_key="dummy")
+
+    async def run():
+        task = asyncio.create_task(qa.answer_many_async(["chunk"] * 20, "question", max_concurrency=5))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    assert time.perf_counter() - start < 1
+    # Only the 5 calls in flight had started, and all of them were cancelled
+    assert len(cancelled) == 5
+    assert mock_generate.call_count == 5
+
+def test_batch_prompt_and_parsing():
+    prompt = build_batch_prompt([("short video", "Who speaks?"), ("short video", "When?"), ("other", "Why?")])
+    # A chunk shared by several questions is sent once
+    assert prompt.count("short video") == 1 and '"j2" (about chunk c1): Why?' in prompt
+    assert parse_batch_answers('```json\n{"j0": "Alice", "j1": " ", "j2": 3}\n```', 3) == {0: "Alice"}
+    assert parse_batch_answers("Sorry, I cannot help.", 2) == {}
+
+def test_small_jobs_share_one_request_with_fallback_for_missing_answers():
+    model = FakeGenerativeModel(latency_ms=0)
+    qa = QAEngine(backend=GenerativeModelBackend(model, "fake"), batch_max_tokens=2000, batch_job_max_tokens=200,
+                  cache=ResponseCache(persistent=False))
+    jobs = [(f"chunk number {i} of a short video.", "What is said?") for i in range(5)] + [("long " * 400, "Q?")]
+    with patch.object(model, "_answer", side_effect=lambda prompt: '{"j0": "a0", "j1": "a1", "j3": "a3", "j4": ""}'
+                      if "Questions:" in prompt else "single"):
+        answers = qa.answer_jobs(jobs)
+    assert answers == ["a0", "a1", "single", "a3", "single", "single"]
+    # One batched request, the two jobs it left unanswered and the oversized job one by one
+    assert model.calls == 4
+    assert qa.batch_stats == {"requests": 1, "jobs": 3, "fallbacks": 2, "requests_saved": 2}
+    # Batched answers are cached per job, so asking a job alone later is a cache hit
+    assert qa.answer_question(*jobs[0]) == "a0" and model.calls == 4
+
+def test_batch_budget_splits_requests():
+    model = FakeGenerativeModel(latency_ms=0)
+    qa = QAEngine(backend=GenerativeModelBackend(model, "fake"), batch_max_tokens=300, batch_job_max_tokens=200,
+                  batch_max_jobs=3)
+    answers = qa.answer_many([f"chunk {i} " + "word " * 40 for i in range(7)], "Summarize")
+    assert all(answers) and len(set(answers)) == 7
+    # Groups of 3, 3 and 1; a group of one is an ordinary call
+    assert qa.batch_stats["requests"] == 2 and model.calls == 3
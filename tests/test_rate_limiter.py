@@ -0,0 +1,101 @@
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from google.api_core import exceptions as google_exceptions
+from components.internalTesting.fakes import FakeGenerativeModel
+from components.llm_backend import GenerativeModelBackend
+from components.qa_engine import QAEngine
+from components.rate_limiter import (
+    TokenBucket, RateLimiter, CircuitBreaker, RetryPolicy, classify_error, metrics,
+)
+from exception import LLM_APIError, CircuitOpenError
+
+def test_token_bucket_makes_callers_wait_once_empty():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    # 600/min = 10/s, so the third request waits about 0.1s
+    assert bucket.reserve(1) == pytest.approx(0.1, abs=0.02)
+
+def test_limiter_pause_holds_every_caller():
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=None)
+    limiter.pause(0.1)
+    start = time.perf_counter()
+    limiter.acquire()
+    assert time.perf_counter() - start >= 0.09
+    assert metrics()["limiter_waits"] == 1
+
+def test_classify_error():
+    quota = google_exceptions.ResourceExhausted("Quota exceeded. retry_delay { seconds: 7 }")
+    wrapped = LLM_APIError(quota)
+    wrapped.__cause__ = quota
+    assert classify_error(wrapped) == (True, 7.0)
+    assert classify_error(google_exceptions.InvalidArgument("bad prompt")) == (False, None)
+    assert classify_error(google_exceptions.ServiceUnavailable("down")) == (True, None)
+    assert classify_error(ConnectionResetError("reset")) == (True, None)
+
+def test_decorrelated_jitter_stays_in_bounds():
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+    delay = None
+    for _ in range(20):
+        delay = policy.next_delay(delay)
+        assert 1 <= delay <= 10
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()  # single trial call
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_non_retryable_error_is_not_retried(mock_generate):
+    mock_generate.side_effect = google_exceptions.InvalidArgument("bad prompt")
+    qa = QAEngine(api_key="dummy", max_retries=3, base_delay=0)
+    assert qa.answer_question("chunk", "question").startswith("My bad")
+    assert mock_generate.call_count == 1
+    assert metrics()["non_retryable"] == 1
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_quota_error_pauses_shared_limiter(mock_generate):
+    mock_generate.side_effect = [
+        google_exceptions.ResourceExhausted("Please retry in 0.1s."), MagicMock(text="QA Answer"),
+    ]
+    qa = QAEngine(api_key="dummy", max_retries=2, base_delay=0)
+    start = time.perf_counter()
+    assert qa.answer_question("chunk", "question") == "QA Answer"
+    assert time.perf_counter() - start >= 0.09
+    stats = metrics()
+    assert stats["rate_limited"] == 1 and stats["retries"] == 1
+
+@patch('google.generativeai.GenerativeModel.generate_content')
+def test_open_circuit_fails_fast_for_all_engines(mock_generate):
+    mock_generate.side_effect = google_exceptions.ServiceUnavailable("down")
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    QAEngine(api_key="dummy", max_retries=2, base_delay=0, breaker=breaker).answer_question("chunk", "q")
+    assert breaker.state == "open"
+    calls = mock_generate.call_count
+    other = QAEngine(api_key="dummy", max_retries=3, base_delay=0, breaker=breaker)
+    assert other.summarize_transcript("text").startswith("Summary unavailable")
+    assert mock_generate.call_count == calls
+
+def test_stream_closed_during_half_open_trial_frees_the_breaker():
+    model = FakeGenerativeModel(latency_ms=0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    qa = QAEngine(backend=GenerativeModelBackend(model, "fake"), max_retries=1, base_delay=0, breaker=breaker)
+    stream = qa.stream_summary("text")
+    next(stream)  # the half-open trial call is now streaming
+    stream.close()
+    assert breaker.state == "half_open"
+    # The next call gets to be the trial and closes the circuit
+    assert qa.summarize_transcript("other text") and breaker.state == "closed"
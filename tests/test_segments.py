@@ -0,0 +1,54 @@
+from components.segments import SegmentStore, format_timestamp
+from components.preprocessor import Preprocessor
+from components.chunker import TokenChunker
+
+ENTRIES = [
+    {'text': 'hello there', 'start': 0.0, 'duration': 2.0},
+    {'text': '[Music]', 'start': 2.0, 'duration': 3.0},
+    {'text': 'gradient descent.', 'start': 5.0, 'duration': 2.5},
+    {'text': 'learning rate', 'start': 8.0, 'duration': 2.0},
+]
+
+def test_text_matches_joined_entries():
+    store = SegmentStore.from_entries(ENTRIES)
+    assert store.text == " ".join(entry['text'] for entry in ENTRIES)
+    assert [store.segment_text(i) for i in range(len(store))] == [entry['text'] for entry in ENTRIES]
+    assert list(store.entries()) == ENTRIES
+
+def test_slice_time_returns_overlapping_segments():
+    store = SegmentStore.from_entries(ENTRIES)
+    view = store.slice_time(4.0, 8.5)
+    assert (view.lo, view.hi) == (1, 4)
+    assert view.text == "[Music] gradient descent. learning rate"
+    assert (view.start_time, view.end_time) == (2.0, 10.0)
+    # A range falling between segments is empty
+    assert len(store.slice_time(7.6, 7.9)) == 0
+
+def test_time_span_of_character_range():
+    store = SegmentStore.from_entries(ENTRIES)
+    start = store.text.index("descent")
+    assert store.time_span(start, start + len("descent. learning")) == (5.0, 10.0)
+
+def test_clean_and_chunk_segments_carry_times():
+    store = Preprocessor().clean_segments(SegmentStore.from_entries(ENTRIES))
+    assert len(store) == 3 and "[Music]" not in store.text
+    chunks = TokenChunker(max_tokens=8).chunk_segments(store)
+    assert chunks[0].text == "hello there gradient descent."
+    assert (chunks[0].start_time, chunks[0].end_time) == (0.0, 7.5)
+    assert (chunks[-1].start_time, chunks[-1].end_time) == (8.0, 10.0)
+
+def test_format_timestamp():
+    assert format_timestamp(65) == "1:05"
+    assert format_timestamp(3725.4) == "1:02:05"
+
+def test_annotations_split_across_segments_are_removed():
+    texts = ["welcome back [Mus", "ic] today we 12:45", "cover grad[App", "lause]ient descent", "[Music]"]
+    store = SegmentStore(texts, [0.0, 2.0, 4.0, 6.0, 8.0], [2.0] * 5)
+    preprocessor = Preprocessor()
+    cleaned = preprocessor.clean_segments(store)
+    assert cleaned.text == preprocessor.clean_transcript(store.text) == "welcome back today we cover gradient descent"
+    assert cleaned.text == "".join(preprocessor.iter_clean(texts))
+    # A word cut by a removed annotation stays with the segment where it starts
+    assert [cleaned.segment_text(i) for i in range(len(cleaned))] == \
+        ["welcome back", "today we", "cover gradient", "descent"]
+    assert list(cleaned.starts) == [0.0, 2.0, 4.0, 6.0]
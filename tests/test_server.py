@@ -0,0 +1,132 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from exception import InvalidYouTubeURLError, ServiceUnavailableError
+from components.internalTesting.fakes import FakeGenerativeModel, FakeTranscriptSource
+from components.llm_backend import GenerativeModelBackend
+from components.planner import ExecutionPlanner
+from components.qa_engine import QAEngine
+from components.server import SummaryService, make_server, DONE, ERROR
+
+class GatedSource(FakeTranscriptSource):
+    """
+    FakeTranscriptSource whose fetches wait for release, so jobs can be held in flight.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.fetches = []
+
+    def get_transcript(self, video_id):
+        self.fetches.append(video_id)
+        self.release.wait(5)
+        return super().get_transcript(video_id)
+
+def service(workers=1, queue_size=4, **kwargs):
+    model = FakeGenerativeModel(latency_ms=0)
+    engine = QAEngine(backend=GenerativeModelBackend(model, "fake"), max_retries=1, base_delay=0)
+    planner = ExecutionPlanner(single_shot_max_tokens=500, chunk_tokens=400, chunk_memo_entries=0)
+    source = kwargs.pop("source", None) or GatedSource()
+    return SummaryService(planner, engine, source=source, workers=workers, queue_size=queue_size,
+                          **kwargs).start(), source, model
+
+def test_concurrent_requests_for_one_video_share_one_execution():
+    svc, source, _ = service()
+    first, coalesced = svc.submit(FakeTranscriptSource.url(20), question="")
+    assert not coalesced
+    # Same video ID through another URL format and a padded question: the same job
+    second, coalesced = svc.submit(video_id="fake-20m", question="  ")
+    assert coalesced and second is first
+    other, coalesced = svc.submit(video_id="fake-20m", question="Who is speaking?")
+    assert not coalesced and other is not first
+    source.release.set()
+    answer = "".join(first.follow(timeout=5))
+    assert first.status == DONE and answer and first.requests == 2
+    # One fetch per execution: the summary job and the question job
+    list(other.follow(timeout=5))
+    assert source.fetches == ["fake-20m", "fake-20m"]
+    # Finished jobs leave the in-flight table; asking again runs a new job
+    again, coalesced = svc.submit(video_id="fake-20m")
+    assert not coalesced and again is not first and "".join(again.follow(timeout=5))
+    svc.shutdown(drain_seconds=5)
+
+def test_full_queue_and_draining_service_refuse_jobs():
+    svc, source, _ = service(queue_size=1)
+    svc.submit(video_id="fake-1m")
+    # Wait for the worker to pick it up, then fill the one queue slot
+    while svc.running == 0:
+        threading.Event().wait(0.01)
+    svc.submit(video_id="fake-2m")
+    assert not svc.ready
+    with pytest.raises(ServiceUnavailableError):
+        svc.submit(video_id="fake-3m")
+    with pytest.raises(InvalidYouTubeURLError):
+        svc.submit(url="https://example.com/watch?v=x")
+    source.release.set()
+    assert svc.shutdown(drain_seconds=5)
+    assert all(job.status == DONE for job in svc.jobs.values())
+    with pytest.raises(ServiceUnavailableError):
+        svc.submit(video_id="fake-4m")
+
+def test_shutdown_fails_jobs_that_did_not_run_in_time():
+    svc, source, _ = service(queue_size=2)
+    running, _ = svc.submit(video_id="fake-1m")
+    queued, _ = svc.submit(video_id="fake-2m")
+    assert not svc.shutdown(drain_seconds=0.2)
+    source.release.set()
+    assert queued.status == ERROR and "shut down" in queued.error
+    assert list(queued.follow(timeout=1)) == []
+
+def test_failed_jobs_record_the_error():
+    class MissingSource:
+        def get_transcript(self, video_id):
+            raise RuntimeError("no captions")
+
+    svc, _, _ = service(source=MissingSource())
+    job, _ = svc.submit(video_id="abc")
+    list(job.follow(timeout=5))
+    assert job.status == ERROR and "no captions" in job.error
+    svc.shutdown(drain_seconds=1)
+
+def test_http_api_submit_poll_stream_and_probes():
+    svc, source, _ = service(workers=2)
+    server = make_server(svc, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    def post(body):
+        request = urllib.request.Request(f"{base}/jobs", data=json.dumps(body).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+
+    try:
+        status, created = post({"video_id": "fake-5m"})
+        assert status == 202 and not created["coalesced"]
+        again = post({"url": FakeTranscriptSource.url(5)})[1]
+        assert again["job_id"] == created["job_id"] and again["coalesced"]
+        with pytest.raises(urllib.error.HTTPError) as bad:
+            post({"url": "not a url"})
+        assert bad.value.code == 400
+        source.release.set()
+        with urllib.request.urlopen(f"{base}/jobs/{created['job_id']}/stream", timeout=5) as response:
+            streamed = response.read().decode()
+        with urllib.request.urlopen(f"{base}/jobs/{created['job_id']}", timeout=5) as response:
+            job = json.loads(response.read())
+        assert job["status"] == DONE and job["answer"] == streamed and job["requests"] == 2
+        with urllib.request.urlopen(f"{base}/healthz", timeout=5) as response:
+            assert response.status == 200
+        with urllib.request.urlopen(f"{base}/readyz", timeout=5) as response:
+            assert json.loads(response.read())["ready"]
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            assert "service_requests_total" in response.read().decode()
+        svc.shutdown(drain_seconds=1)
+        with pytest.raises(urllib.error.HTTPError) as draining:
+            urllib.request.urlopen(f"{base}/readyz", timeout=5)
+        assert draining.value.code == 503
+    finally:
+        server.shutdown()
+        server.server_close()
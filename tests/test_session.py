@@ -0,0 +1,60 @@
+from components.internalTesting.fakes import FakeGenerativeModel
+from components.llm_backend import GenerativeModelBackend
+from components.planner import ExecutionPlanner
+from components.qa_engine import QAEngine, QA_FALLBACK
+from components.cache import ResponseCache
+from components.session import VideoSession
+
+TOPICS = ["gradient descent", "learning rates", "batch norm", "dropout", "attention", "tokenizers"]
+
+def transcript():
+    return "".join(f"This part is about {topic}. The speaker explains {topic} with an example about {topic}. " * 6
+                   for topic in TOPICS)
+
+def engine(**kwargs):
+    model = FakeGenerativeModel(latency_ms=0, **kwargs)
+    return QAEngine(backend=GenerativeModelBackend(model, "fake"), max_retries=1, base_delay=0), model
+
+def planner(**kwargs):
+    settings = dict(single_shot_max_tokens=100, chunk_tokens=120, top_k=2, reduce_fan_in=8, chunk_memo_entries=4)
+    settings.update(kwargs)
+    return ExecutionPlanner(**settings)
+
+QUESTIONS = ["", "What is said about dropout?", "How are tokenizers explained?", "Which example shows attention?"]
+
+def test_questions_share_one_map_pass():
+    qa, model = engine()
+    session = VideoSession(transcript(), planner(), qa)
+    plans = session.plan(QUESTIONS)
+    chunks = len(plans[0].chunks)
+    progress = []
+    answers = session.answer_plans(plans, on_progress=lambda done, total: progress.append((done, total)))
+    assert len(answers) == 4 and all(answers) and QA_FALLBACK not in answers
+    # One request per chunk (all questions that need it together), then one reduce per question
+    assert model.calls == chunks + len(QUESTIONS)
+    assert model.calls < sum(plan.estimated_calls for plan in plans)
+    assert progress[-1] == (chunks, chunks)
+
+def test_asking_again_is_served_from_the_cache():
+    qa, model = engine()
+    qa.cache = ResponseCache(persistent=False)
+    session = VideoSession(transcript(), planner(), qa)
+    first = session.ask(QUESTIONS)
+    calls = model.calls
+    # Map answers are cached per chunk and question, and the reduce prompt is the same, so nothing is called
+    assert session.ask(QUESTIONS[1:2]) == first[1:2]
+    assert model.calls == calls
+
+def test_missing_batched_answers_are_asked_one_by_one():
+    qa, model = engine(batch_miss_rate=1.0)
+    session = VideoSession(transcript(), planner(), qa)
+    answers = session.ask(QUESTIONS[:2])
+    assert all(answers) and QA_FALLBACK not in answers
+    assert qa.batch_stats["fallbacks"] > 0
+
+def test_short_transcript_answers_all_questions_in_one_call():
+    qa, model = engine()
+    session = VideoSession(transcript(), planner(single_shot_max_tokens=100_000), qa)
+    answers = session.ask(QUESTIONS)
+    assert len(set(answers)) == 4
+    assert model.calls == 1
@@ -1,6 +1,9 @@
+import time
 import pytest
-from components.transcript_retriever import TranscriptRetriever
-from exception import InvalidYouTubeURLError
+from components.transcript_retriever import TranscriptRetriever, HTTPTranscriptSource, pick_language
+from exception import CustomException, InvalidYouTubeURLError, TranscriptNotFoundError
+from components.internalTesting import fake_transcript_server
+from components.internalTesting.fakes import FakeTranscriptSource
 
 
 def test_valid_url():
@@ -15,3 +18,68 @@ def test_invalid_url():
     tr = TranscriptRetriever(url)
     with pytest.raises(InvalidYouTubeURLError):
         tr.fetch_transcript(url)
+
+def test_fetch_segments_from_fake_source_offline():
+    source = FakeTranscriptSource()
+    tr = TranscriptRetriever(FakeTranscriptSource.url(5), source=source)
+    segments = tr.fetch_segments(FakeTranscriptSource.url(5))
+    assert len(segments) == len(source.get_transcript("fake-5m"))
+    assert tr.fetch_transcript(FakeTranscriptSource.url(5)) == segments.text
+
+@pytest.fixture
+def transcript_server():
+    servers = []
+
+    def start(**kwargs):
+        server = fake_transcript_server.serve(**kwargs)
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_http_source_reuses_pooled_connections(transcript_server):
+    server, url = transcript_server(source=FakeTranscriptSource(latency_ms=20))
+    urls = [FakeTranscriptSource.url(minutes) for minutes in range(1, 13)]
+    with TranscriptRetriever(source=HTTPTranscriptSource(url), max_workers=3) as retriever:
+        results = retriever.fetch_many(urls + ["https://youtu.be/missing-1"])
+    assert [len(segments) for _, segments, _ in results[:-1]] == \
+        [len(FakeTranscriptSource().get_transcript(f"fake-{minutes}m")) for minutes in range(1, 13)]
+    assert isinstance(results[-1][2], TranscriptNotFoundError)
+    # Two requests per video over at most one kept-alive connection per fetch worker
+    assert server.requests == 2 * 13 - 1
+    assert server.connections <= 3
+
+def test_language_preference_and_fallback(transcript_server):
+    _, url = transcript_server(languages=("de", "fr-CA"))
+    video = FakeTranscriptSource.url(1)
+    assert TranscriptRetriever(source=HTTPTranscriptSource(url, languages=["fr", "de"])).fetch_segments(video)
+    assert pick_language(["de", "fr-CA"], ["fr", "de"]) == "fr-CA"
+    assert pick_language(["de"], ["en"]) == "de"
+    assert pick_language(["de"], ["en"], fallback=False) is None
+    with pytest.raises(TranscriptNotFoundError):
+        TranscriptRetriever(source=HTTPTranscriptSource(url, languages=["en"], fallback=False)).fetch_segments(video)
+
+def test_slow_transcripts_time_out(transcript_server):
+    _, url = transcript_server(source=FakeTranscriptSource(latency_ms=1000))
+    start = time.perf_counter()
+    with pytest.raises(CustomException):
+        TranscriptRetriever(source=HTTPTranscriptSource(url, timeout=0.2)).fetch_segments(FakeTranscriptSource.url(1))
+    assert time.perf_counter() - start < 0.9
+
+def test_prefetched_transcripts_download_in_the_background():
+    source = FakeTranscriptSource(latency_ms=200)
+    urls = [FakeTranscriptSource.url(minutes) for minutes in (1, 2, 3)]
+    with TranscriptRetriever(source=source, max_workers=3) as retriever:
+        retriever.prefetch(urls)
+        time.sleep(0.3)
+        start = time.perf_counter()
+        for url in urls:
+            retriever.fetch_segments(url)
+        assert time.perf_counter() - start < 0.1
+        # Consumed prefetches are fetched again next time
+        start = time.perf_counter()
+        retriever.fetch_segments(urls[0])
+        assert time.perf_counter() - start >= 0.2